@@ -0,0 +1,351 @@
+"""
+Central collector: agents push batches of feature windows, the collector
+scores them and returns one verdict per window.
+
+Only feature vectors (EXTENDED_FEATURE_NAMES) leave the desktop, never raw
+keystrokes. A request is JSON, optionally gzip-compressed
+(Content-Encoding: gzip):
+
+  POST /score_windows
+  {"profile": "user@host", "windows": [{"start": "2024-01-01 10:00:00.000000", "features": [...]}, ...]}
+
+  -> {"success": true, "verdicts": [{"start": ..., "score": -0.02, "normal": false,
+                                     "explanation": "typing_speed 41% (z=+3.2), ..."}, ...]}
+
+Agents send one window per request, so requests are not scored one by one:
+a dispatcher thread takes every request queued (across all request threads
+and profiles) as one batch. While it scores a batch the next one queues up,
+so batches grow with the load. Batches of at least POOL_MIN_ROWS windows are
+packed into tasks of up to CHUNK_SIZE rows and spread over a process pool
+(SBM_COLLECTOR_WORKERS, default one per core); smaller ones are cheaper to
+score in the dispatcher than to ship to a worker. Each worker keeps its own
+LRU of loaded models. Every window is also explained (scoring.explain), so
+agents need no local model. Verdicts are stored in
+~/Documents/collector.sqlite for a fleet-wide view.
+
+Requests share batches, so each is validated before it is queued, and a
+profile whose model fails only fails its own requests. A broken or hung
+worker pool fails the batch it was scoring and is replaced.
+
+Run:  python SBM/collector_server.py [--port 5001] [--workers N]
+"""
+from flask import Flask, request, jsonify
+import argparse
+import gzip
+import json
+import logging
+import sqlite3
+import math
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# Repository modules live one level up from this script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+import profiles
+from scoring import EXTENDED_FEATURE_NAMES
+
+logger = logging.getLogger(__name__)
+
+SCORE_WINDOWS_SECONDS = metrics.histogram("sbm_collector_request_seconds", "/score_windows request latency")
+WINDOWS_RECEIVED = metrics.counter("sbm_collector_windows_total", "Feature windows scored by the collector")
+COLLECTOR_ANOMALIES = metrics.counter("sbm_collector_anomalies_total", "Windows the collector flagged as suspicious")
+BAD_REQUESTS = metrics.counter("sbm_collector_bad_requests_total", "Malformed /score_windows requests")
+BATCH_ROWS = metrics.histogram("sbm_collector_batch_rows", "Windows per dispatched scoring batch",
+                               buckets=(1, 4, 16, 64, 256, 1024, 4096))
+
+CHUNK_SIZE = 512    # most rows in one task handed to a worker
+POOL_MIN_ROWS = 32  # smaller batches are scored in the dispatcher thread
+SCORE_TIMEOUT_SECONDS = 30
+
+app = Flask(__name__)
+
+DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "collector.sqlite")
+
+os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+def init_db():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS verdicts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile TEXT,
+            window_start TEXT,
+            features TEXT,
+            score REAL,
+            normal INTEGER,
+            received TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_profile ON verdicts (profile, window_start)")
+    conn.commit()
+    conn.close()
+
+init_db()
+
+
+def score_task(groups):
+    """
+    Worker: score and explain [(profile key, rows), ...] with each profile's
+    model. Returns one (scores, explanations) pair per group, or the
+    exception that group raised, so one profile cannot fail another's.
+    """
+    from scoring import decision_scores, explain_rows, format_explanation
+
+    results = []
+    for profile_key, rows in groups:
+        try:
+            clf = profiles.models.get(profiles.Profile.from_key(profile_key))
+            explanations = [format_explanation(items) or None for items in explain_rows(clf, rows)]
+            results.append((decision_scores(clf, rows).tolist(), explanations))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def pack(groups, target):
+    """Split and pack [(profile key, rows), ...] into tasks of about `target` rows (at most CHUNK_SIZE)."""
+    tasks, task, size = [], [], 0
+    for profile_key, rows in groups:
+        for i in range(0, len(rows), CHUNK_SIZE):
+            piece = rows[i:i + CHUNK_SIZE]
+            if task and size + len(piece) > CHUNK_SIZE:
+                tasks.append(task)
+                task, size = [], 0
+            task.append((profile_key, piece))
+            size += len(piece)
+            if size >= target:
+                tasks.append(task)
+                task, size = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+class Scorer:
+    """
+    Micro-batches concurrent score() calls and scores each batch on a
+    process pool, with tasks spread evenly over the workers.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self.requests = queue.Queue()
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def score(self, profile_key, rows):
+        """(scores, explanations) of rows, once the batch this request joined has been scored."""
+        future = Future()
+        self.requests.put((profile_key, rows, future))
+        return future.result(timeout=SCORE_TIMEOUT_SECONDS)
+
+    def _dispatch(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            rows = len(request[1])
+            while rows < CHUNK_SIZE * self.workers:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)  # score what was collected, then stop
+                    break
+                batch.append(request)
+                rows += len(request[1])
+            BATCH_ROWS.observe(rows)
+            try:
+                self._score_batch(batch, rows)
+            except Exception as e:
+                # Never let a batch kill the dispatcher: fail what it left unanswered
+                logger.error(f"Scoring a batch of {rows} windows failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if isinstance(e, BrokenProcessPool):
+                    self._restart_pool()
+
+    def _restart_pool(self):
+        """Replace a broken or hung worker pool; its running tasks are abandoned."""
+        logger.warning("Scoring pool broken or hung; starting a new one")
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def _run(self, task, pooled):
+        if pooled:
+            return self.pool.submit(score_task, task)
+        future = Future()
+        try:
+            future.set_result(score_task(task))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _score_batch(self, batch, rows):
+        groups = {}  # profile key -> [(rows, future)] of its requests
+        for profile_key, request_rows, future in batch:
+            groups.setdefault(profile_key, []).append((request_rows, future))
+        merged = [(profile_key, [row for request_rows, _ in requests for row in request_rows])
+                  for profile_key, requests in groups.items()]
+        pooled = self.pool is not None and rows >= POOL_MIN_ROWS
+        tasks = pack(merged, max(1, math.ceil(rows / self.workers)) if pooled else CHUNK_SIZE)
+        running = [(task, self._run(task, pooled)) for task in tasks]
+
+        # Reassemble each profile's scores from its pieces, then hand every
+        # request its slice
+        results = {profile_key: ([], []) for profile_key in groups}
+        failed = {}
+        restart = False
+        for task, future in running:
+            try:
+                task_results = future.result(timeout=SCORE_TIMEOUT_SECONDS)
+            except Exception as e:
+                restart = restart or isinstance(e, (BrokenProcessPool, TimeoutError))
+                task_results = [e] * len(task)
+            for (profile_key, _), result in zip(task, task_results):
+                if isinstance(result, Exception):
+                    failed[profile_key] = result
+                    continue
+                results[profile_key][0].extend(result[0])
+                results[profile_key][1].extend(result[1])
+        if restart:
+            self._restart_pool()
+        for profile_key, requests in groups.items():
+            scores, explanations = results[profile_key]
+            offset = 0
+            for request_rows, future in requests:
+                if profile_key in failed:
+                    future.set_exception(failed[profile_key])
+                else:
+                    end = offset + len(request_rows)
+                    future.set_result((scores[offset:end], explanations[offset:end]))
+                    offset = end
+
+    def shutdown(self):
+        self.requests.put(None)
+        self.dispatcher.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+scorer = None
+
+def get_scorer():
+    global scorer
+    if scorer is None:
+        scorer = Scorer(int(os.environ.get("SBM_COLLECTOR_WORKERS", "0")) or None)
+    return scorer
+
+
+def insert_verdicts(profile_key, windows, scores):
+    received = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO verdicts (profile, window_start, features, score, normal, received)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (profile_key, window.get("start"), json.dumps(window["features"]), score, int(score >= 0), received)
+        for window, score in zip(windows, scores)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def parse_rows(windows):
+    """
+    Feature rows of a request's windows. Raises ValueError unless each has
+    len(EXTENDED_FEATURE_NAMES) finite numbers: a malformed row would
+    otherwise fail every request scored in the same batch.
+    """
+    if not isinstance(windows, list):
+        raise TypeError("windows must be a list")
+    rows = []
+    for i, window in enumerate(windows):
+        features = window["features"]
+        if not isinstance(features, list) or len(features) != len(EXTENDED_FEATURE_NAMES):
+            raise ValueError(f"window {i} must have {len(EXTENDED_FEATURE_NAMES)} features")
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+                   for value in features):
+            raise ValueError(f"window {i} has a feature that is not a finite number")
+        rows.append(features)
+    return rows
+
+
+def read_payload():
+    body = request.get_data()
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.render_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app.route('/score_windows', methods=['POST'])
+def score_windows():
+    with SCORE_WINDOWS_SECONDS.time():
+        return _score_windows()
+
+def _score_windows():
+    try:
+        data = read_payload()
+        profile_key = data["profile"]
+        if not isinstance(profile_key, str):
+            raise TypeError("profile must be a string")
+        windows = data["windows"]
+        rows = parse_rows(windows)
+    except (OSError, ValueError, KeyError, TypeError, OverflowError) as e:
+        BAD_REQUESTS.inc()
+        return jsonify({"success": False, "error": f"Bad request: {e}"}), 400
+
+    if not rows:
+        return jsonify({"success": True, "verdicts": []}), 200
+
+    try:
+        scores, explanations = get_scorer().score(profile_key, rows)
+    except TimeoutError:
+        logger.error(f"Scoring timed out for {profile_key}")
+        return jsonify({"success": False, "error": "Scoring timed out"}), 503
+    except Exception as e:
+        logger.error(f"Scoring failed for {profile_key}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    try:
+        insert_verdicts(profile_key, windows, scores)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store verdicts for {profile_key}: {e}")
+
+    anomalies = sum(score < 0 for score in scores)
+    WINDOWS_RECEIVED.inc(len(scores))
+    COLLECTOR_ANOMALIES.inc(anomalies)
+    logger.debug(f"Scored {len(scores)} windows for {profile_key}, {anomalies} suspicious")
+
+    verdicts = [{"start": window.get("start"), "score": score, "normal": score >= 0, "explanation": explanation}
+                for window, score, explanation in zip(windows, scores, explanations)]
+    return jsonify({"success": True, "verdicts": verdicts}), 200
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Central scoring collector")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: one per core)")
+    args = parser.parse_args()
+    if args.workers:
+        os.environ["SBM_COLLECTOR_WORKERS"] = str(args.workers)
+
+    metrics.configure_logging()
+    metrics.start_exporters()
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -1,45 +1,28 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import sqlite3
+import logging
 import os
+import sys
 
-app = Flask(__name__)
-CORS(app)  # Enables CORS for all requests
+# metrics.py and storage.py live in the repository root, one level up from this script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+import storage
 
-# Set database path
-DB_PATH = os.path.join(os.path.expanduser("~"), "documents", "tab_activity.sqlite")
+logger = logging.getLogger(__name__)
 
-# Ensure the directory exists
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+LOG_ACTIVITY_SECONDS = metrics.histogram("sbm_log_activity_seconds", "/log_activity request latency")
+BROWSER_EVENTS = metrics.counter("sbm_browser_events_total", "Browser events stored by /log_activity")
+BROWSER_EVENTS_DROPPED = metrics.counter("sbm_browser_events_dropped_total", "Browser events that failed to store")
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS activity (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT,
-            url TEXT,
-            domain TEXT,
-            tab_id INTEGER,
-            window_id INTEGER,
-            entry_time TEXT,
-            exit_time TEXT,
-            key_pressed TEXT,
-            click_type TEXT,
-            x INTEGER,
-            y INTEGER,
-            scroll_direction TEXT,
-            scroll_distance REAL,
-            scroll_interval REAL,
-            interactive_element TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+app = Flask(__name__)
+CORS(app)  # Enables CORS for all requests
 
-init_db()
+DB_PATH = storage.BROWSER_DB_PATH
+
+def insert_activity(data):
+    """Insert one browser event (the extension's JSON payload) into the activity table."""
+    storage.insert_browser_event(data)
 
 @app.after_request
 def add_cors_headers(response):
@@ -48,34 +31,33 @@ def add_cors_headers(response):
     response.headers["Access-Control-Allow-Headers"] = "Content-Type"
     return response
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.render_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
 @app.route('/log_activity', methods=['POST'])
 def log_activity():
+    with LOG_ACTIVITY_SECONDS.time():
+        return _log_activity()
+
+def _log_activity():
     if not request.is_json:
         return jsonify({"success": False, "error": "Request must be JSON"}), 400
     
     data = request.get_json()
     
-    # Debugging output
-    print("Received:", data)
+    logger.debug(f"Received: {data}")
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO activity (action, url, domain, tab_id, window_id, entry_time, exit_time, key_pressed, click_type, x, y, scroll_direction, scroll_distance, scroll_interval, interactive_element, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data.get("action"), data.get("url"), data.get("domain"), data.get("tab_id"), data.get("window_id"),
-            data.get("entry_time"), data.get("exit_time"), data.get("key_pressed"), data.get("click_type"),
-            data.get("x"), data.get("y"), data.get("scroll_direction"), data.get("scroll_distance"), 
-            data.get("scroll_interval"), data.get("interactive_element"), data.get("timestamp")
-        ))
-        conn.commit()
-        conn.close()
+        insert_activity(data)
+        BROWSER_EVENTS.inc()
         return jsonify({"success": True}), 200
     except Exception as e:
-        print("❌ Error saving data to database:", str(e))
+        BROWSER_EVENTS_DROPPED.inc()
+        logger.error(f"Error saving data to database: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 if __name__ == '__main__':
+    metrics.configure_logging()
+    metrics.start_exporters()
     app.run(debug=True, port=5000)
@@ -1,129 +1,117 @@
 import logging
-import os
 import sqlite3
 import time
-import json
 import threading
-import sys
-import subprocess
 import platform
 from datetime import datetime, timedelta
-import ollama
 from PyQt5.QtCore import QThread, pyqtSignal
-from pynput import keyboard, mouse
-import psutil
-import model
-
-# Database: soft_activity.sqlite in the user's Documents folder
-ACTIVITY_DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_activity.sqlite")
-TRAINING_DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_training.sqlite")
-
-OUTPUT_DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "output.sqlite")
-
-def create_activity_table():
-    conn = sqlite3.connect(ACTIVITY_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS software (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT,
-            title TEXT,
-            key TEXT,
-            key_interval REAL,
-            click_type TEXT,
-            click_interval REAL,
-            position TEXT,
-            scroll_direction TEXT,
-            scroll_speed REAL,
-            scroll_interval REAL,
-            duration REAL,
-            cpu_usage REAL,
-            memory_usage REAL,
-            device_id TEXT,
-            device_type TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def create_training_table():
-    conn = sqlite3.connect(TRAINING_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS software (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT,
-            title TEXT,
-            key TEXT,
-            key_interval REAL,
-            click_type TEXT,
-            click_interval REAL,
-            position TEXT,
-            scroll_direction TEXT,
-            scroll_speed REAL,
-            scroll_interval REAL,
-            duration REAL,
-            cpu_usage REAL,
-            memory_usage REAL,
-            device_id TEXT,
-            device_type TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def create_output_table():
-    conn = sqlite3.connect(OUTPUT_DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS output_summary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            description TEXT,
-            model_output TEXT,
-            timestamp TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-create_activity_table()
-create_training_table()
-create_output_table()
+import app_identity
+import archive
+import capture
+import db_maintenance
+import drift_monitoring
+import metrics
+import profiles
+import sequence_mining
+import storage
+import telemetry
+import window_features
+from scoring import FeatureContext
+from scoring.apps import app_name
+from scoring.keystrokes import DigraphProfile, DigraphStream, digraph_profile_filename
+from scoring.markov import USER_EVENT_TYPES, MarkovChain, markov_filename
+from scoring.mouse import MouseMoveSampler
+
+# ollama and model (sklearn/joblib) are imported where they are used so that
+# importing this module stays cheap for the UI.
+
+# Per-digraph timing profile, kept next to the joblib model
+DIGRAPH_PROFILE_PATH = digraph_profile_filename(profiles.own_model_path())
+# Event-type and focused-app Markov chains, updated by log_event for USER_EVENT_TYPES
+EVENT_CHAIN_PATH = markov_filename(profiles.own_model_path(), "events")
+APP_CHAIN_PATH = markov_filename(profiles.own_model_path(), "apps")
+# Seconds between "PC Usage" samples
+TELEMETRY_SECONDS = 5
+# Re-baseline on drift at most this often
+DRIFT_RETRAIN_COOLDOWN_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+LOG_EVENT_SECONDS = metrics.histogram("sbm_log_event_seconds", "ActivityMonitor.log_event latency, including the UI signal")
+EVENTS_LOGGED = metrics.counter("sbm_events_logged_total", "Events written to the software table")
+EVENTS_DROPPED = metrics.counter("sbm_events_dropped_total", "Events lost because the insert failed")
+PENDING_KEY_PRESSES = metrics.gauge("sbm_pending_key_presses", "Key presses waiting for their release")
+OPEN_WINDOWS = metrics.gauge("sbm_open_windows", "Windows tracked as open")
+LLM_SECONDS = metrics.histogram("sbm_llm_seconds", "Ollama summary latency")
+LLM_ERRORS = metrics.counter("sbm_llm_errors_total", "Failed Ollama summary calls")
+
+def init_databases():
+    """Create the activity, training and output tables if they do not exist."""
+    storage.init_databases()
 
 class ActivityMonitor(QThread):
     log_signal = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
+        init_databases()
         self.running = True
 
         # Mark the start time (for use in the "first 10 minutes" copy)
         self.start_time = time.time()
         self.first10_copied = False
+        self.archive_warned = False
+        # Drift events from drift_monitoring; handled by retrain_after_drift
+        self.drift_lock = threading.Lock()
+        self.drifted = set()
+        self.last_drift_retrain = 0.0
+        drift_monitoring.on_drift(self.on_drift)
+        self.db_maintainer = db_maintenance.Maintainer({
+            "activity": storage.ACTIVITY_DB_PATH, "training": storage.TRAINING_DB_PATH,
+            "output": storage.OUTPUT_DB_PATH,
+        })
 
         # For keyboard events: record the press timestamp
         self.key_events = {}
+        # Live digraphs feed the per-user timing profile
+        self.digraph_stream = DigraphStream()
+        self.digraph_profile = DigraphProfile.load(DIGRAPH_PROFILE_PATH)
+        self.event_chain = MarkovChain.load(EVENT_CHAIN_PATH)
+        self.app_chain = MarkovChain.load(APP_CHAIN_PATH)
+        # log_event runs on the listener, polling and telemetry threads; the
+        # chains must see events in the order they are stored
+        self.chain_lock = threading.Lock()
+        # What the windows' extra feature families are scored against
+        self.feature_context = FeatureContext(digraphs=self.digraph_profile, patterns=sequence_mining.load(),
+                                              app_ids=storage.app_ids, event_chain=self.event_chain,
+                                              app_chain=self.app_chain)
+        window_features.use_context(self.feature_context)
 
         # For mouse click events
         self.mouse_click_start = None
 
+        # Pointer movement, downsampled into strokes
+        self.move_sampler = MouseMoveSampler()
+        self.move_lock = threading.Lock()
+
         # For scroll events: track the time of the last scroll event
         self.last_scroll_time = None
 
         # For window tracking
-        # Dictionary of window title -> { 'open_time': float, 'focus_time': float }
+        # Dictionary of window title -> { 'open_time': float, 'focus_time': float, 'app': str }
         self.open_windows = {}
         self.last_focused_window = None
+        self.last_focused_app = None
+        self.app_resolver = app_identity.AppResolver()
         self.last_focus_time = None
 
         # Identify OS (Windows vs. Linux)
         self.os = platform.system()  # "Windows" or "Linux" etc.
 
         # Listeners for keyboard and mouse
-        self.keyboard_listener = keyboard.Listener(on_press=self.on_key_press, on_release=self.on_key_release)
-        self.mouse_listener = mouse.Listener(
+        self.keyboard_listener, self.mouse_listener = capture.create_listeners(
+            on_press=self.on_key_press,
+            on_release=self.on_key_release,
             on_click=self.on_mouse_click,
             on_scroll=self.on_mouse_scroll,
             on_move=self.on_mouse_move
@@ -144,6 +132,7 @@ class ActivityMonitor(QThread):
         threads.append(threading.Thread(target=self.start_cpu_memory_monitor, daemon=True))
         threads.append(threading.Thread(target=self.log_all_apps_open, daemon=True))
         threads.append(threading.Thread(target=self.periodic_maintenance, daemon=True))
+        threads.append(threading.Thread(target=self.periodic_window_fill, daemon=True))
         threads.append(threading.Thread(target=self.periodic_summary_generation, daemon=True))
 
         for t in threads:
@@ -152,6 +141,7 @@ class ActivityMonitor(QThread):
         # Main loop: check for focus changes and closed windows every 5 seconds.
         while self.running:
             self.check_window_focus_and_closed()
+            self.flush_idle_stroke()
             time.sleep(5)
 
         # On exit, join threads if needed
@@ -166,74 +156,82 @@ class ActivityMonitor(QThread):
         kwargs can include any of:
           title, key, key_interval, click_type, click_interval, position,
           scroll_direction, scroll_speed, scroll_interval, duration,
-          cpu_usage, memory_usage, device_id, device_type
+          cpu_usage, memory_usage, device_id, device_type,
+          process_cpu, io_bytes, spawned, app
         """
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        data = {
-            "type": event_type,
-            "title": kwargs.get("title"),
-            "key": kwargs.get("key"),
-            "key_interval": kwargs.get("key_interval"),
-            "click_type": kwargs.get("click_type"),
-            "click_interval": kwargs.get("click_interval"),
-            "position": json.dumps(kwargs.get("position")) if kwargs.get("position") else None,
-            "scroll_direction": kwargs.get("scroll_direction"),
-            "scroll_speed": kwargs.get("scroll_speed"),
-            "scroll_interval": kwargs.get("scroll_interval"),
-            "duration": kwargs.get("duration"),
-            "cpu_usage": kwargs.get("cpu_usage"),
-            "memory_usage": kwargs.get("memory_usage"),
-            "device_id": kwargs.get("device_id"),
-            "device_type": kwargs.get("device_type"),
-            "timestamp": timestamp
-        }
-        conn = sqlite3.connect(ACTIVITY_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO software (
-                type, title, key, key_interval, click_type, click_interval, position, 
-                scroll_direction, scroll_speed, scroll_interval, duration, 
-                cpu_usage, memory_usage, device_id, device_type, timestamp
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data["type"], data["title"], data["key"], data["key_interval"],
-            data["click_type"], data["click_interval"], data["position"],
-            data["scroll_direction"], data["scroll_speed"], data["scroll_interval"],
-            data["duration"], data["cpu_usage"], data["memory_usage"],
-            data["device_id"], data["device_type"], data["timestamp"]
-        ))
-        conn.commit()
-        conn.close()
-        self.log_signal.emit(f"[{timestamp}] {event_type}: {kwargs}")
+        with LOG_EVENT_SECONDS.time():
+            try:
+                if event_type in USER_EVENT_TYPES:
+                    with self.chain_lock:
+                        timestamp = storage.insert_event(event_type, **kwargs)
+                        self.event_chain.observe(event_type)
+                        if event_type == "App in Focus":
+                            self.app_chain.observe(app_name(kwargs.get("app") or kwargs.get("title")))
+                else:
+                    timestamp = storage.insert_event(event_type, **kwargs)
+            except sqlite3.Error as e:
+                # Never let a failed write kill the pynput listener thread
+                EVENTS_DROPPED.inc()
+                logger.warning(f"Dropped {event_type} event: {e}")
+                return
+            EVENTS_LOGGED.inc()
+            if event_type == "Mouse Move":
+                # The UI log shows how many points a stroke has, not the points
+                kwargs = dict(kwargs, position=f"{len(kwargs.get('position') or ())} points")
+            self.log_signal.emit(f"[{timestamp}] {event_type}: {kwargs}")
 
     # ---------------- Keyboard events ----------------
     def on_key_press(self, key):
         key_str = str(key)
-        # Record the time when the key was pressed
-        self.key_events[key_str] = time.time()
+        # Record the monotonic time of the first press; auto-repeat presses
+        # of a held key do not move it
+        if key_str not in self.key_events:
+            self.key_events[key_str] = time.monotonic_ns()
+            self.digraph_stream.press(key_str, self.key_events[key_str])
+        PENDING_KEY_PRESSES.set(len(self.key_events))
     
     def on_key_release(self, key):
         key_str = str(key)
         if key_str in self.key_events:
-            press_time = self.key_events[key_str]
-            interval = time.time() - press_time
-            self.log_event("Keyboard", key=key_str, key_interval=interval)
+            release_ns = time.monotonic_ns()
+            press_ns = self.key_events[key_str]
+            interval = (release_ns - press_ns) / 1e9
+            self.log_event("Keyboard", key=key_str, key_interval=interval, press_ns=press_ns, event_ns=release_ns)
+            for pair, pp_ms, rp_ms in self.digraph_stream.release(key_str, release_ns):
+                self.digraph_profile.update(pair, pp_ms, rp_ms)
             del self.key_events[key_str]
+            PENDING_KEY_PRESSES.set(len(self.key_events))
 
     # ---------------- Mouse events ----------------
     def on_mouse_click(self, x, y, button, pressed):
         button_str = str(button)
         if pressed:
-            self.mouse_click_start = time.time()
+            self.mouse_click_start = time.monotonic_ns()
         else:
             if self.mouse_click_start:
-                interval = time.time() - self.mouse_click_start
-                self.log_event("Click", click_type=button_str, click_interval=interval, position=(x, y))
+                release_ns = time.monotonic_ns()
+                interval = (release_ns - self.mouse_click_start) / 1e9
+                self.log_event("Click", click_type=button_str, click_interval=interval, position=(x, y),
+                               press_ns=self.mouse_click_start, event_ns=release_ns)
                 self.mouse_click_start = None
 
     def on_mouse_move(self, x, y):
-        # Optionally log drag events if needed (not processed further here)
-        pass
+        with self.move_lock:
+            stroke = self.move_sampler.move(x, y, time.monotonic_ns())
+        if stroke:
+            self.log_stroke(stroke)
+
+    def flush_idle_stroke(self):
+        """Store the stroke in progress once the pointer has come to rest."""
+        with self.move_lock:
+            stroke = self.move_sampler.idle(time.monotonic_ns())
+        if stroke:
+            self.log_stroke(stroke)
+
+    def log_stroke(self, stroke):
+        points, start_ns, end_ns = stroke
+        self.log_event("Mouse Move", position=points, duration=(end_ns - start_ns) / 1e9,
+                       press_ns=start_ns, event_ns=end_ns)
 
     def on_mouse_scroll(self, x, y, dx, dy):
         current_time = time.time()
@@ -251,40 +249,19 @@ class ActivityMonitor(QThread):
 
     def get_active_window_title(self):
         """Return the title of the active window, platform-dependent."""
-        title = None
         try:
-            if self.os == "Windows":
-                import pygetwindow as gw
-                active_window = gw.getActiveWindow()
-                if active_window:
-                    title = active_window.title
-            elif self.os == "Linux":
-                result = subprocess.run(['xdotool', 'getactivewindow', 'getwindowname'],
-                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if result.returncode == 0:
-                    title = result.stdout.strip()
+            return capture.get_active_window_title()
         except Exception as e:
             self.log_signal.emit(f"Error retrieving active window: {e}")
-        return title
+            return None
 
     def get_all_window_titles(self):
         """Return a list of titles for all open windows."""
-        titles = []
         try:
-            if self.os == "Windows":
-                import pygetwindow as gw
-                windows = gw.getAllWindows()
-                titles = [w.title for w in windows if w.title]
-            elif self.os == "Linux":
-                result = subprocess.run(['wmctrl', '-l'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if result.returncode == 0:
-                    for line in result.stdout.splitlines():
-                        parts = line.split(None, 3)
-                        if len(parts) == 4:
-                            titles.append(parts[3])
+            return capture.get_all_window_titles()
         except Exception as e:
             self.log_signal.emit(f"Error retrieving all windows: {e}")
-        return titles
+            return []
 
     def log_initial_open_windows(self):
         """Log events for all currently open windows as App Open events."""
@@ -303,12 +280,16 @@ class ActivityMonitor(QThread):
         if current_active != self.last_focused_window:
             if self.last_focused_window is not None and self.last_focus_time is not None:
                 duration = now - self.last_focus_time
-                self.log_event("App in Focus", title=self.last_focused_window, duration=duration)
+                self.log_event("App in Focus", title=self.last_focused_window, app=self.last_focused_app,
+                               duration=duration)
+            # Resolved only on a focus change; repeat windows are served from the resolver's cache
+            current_app = self.app_resolver.foreground_app() if current_active else None
             self.last_focused_window = current_active
+            self.last_focused_app = current_app
             self.last_focus_time = now
             if current_active and current_active not in self.open_windows:
-                self.open_windows[current_active] = {"open_time": now, "focus_time": now}
-                self.log_event("App Open", title=current_active)
+                self.open_windows[current_active] = {"open_time": now, "focus_time": now, "app": current_app}
+                self.log_event("App Open", title=current_active, app=current_app)
 
         # Check for closed windows.
         current_titles = set(self.get_all_window_titles())
@@ -317,8 +298,9 @@ class ActivityMonitor(QThread):
             if title not in current_titles:
                 open_time = self.open_windows[title]["open_time"]
                 duration = now - open_time
-                self.log_event("App Closed", title=title, duration=duration)
+                self.log_event("App Closed", title=title, app=self.open_windows[title].get("app"), duration=duration)
                 del self.open_windows[title]
+        OPEN_WINDOWS.set(len(self.open_windows))
 
     def log_all_apps_open(self):
         """Every 10 seconds, log an event that lists all open window titles."""
@@ -329,12 +311,11 @@ class ActivityMonitor(QThread):
             time.sleep(10)
 
     def start_cpu_memory_monitor(self):
-        """Every 10 seconds, log CPU and memory usage."""
+        """Every TELEMETRY_SECONDS, log system and foreground-process usage since the last sample."""
+        sampler = telemetry.TelemetrySampler()
         while self.running:
-            cpu_usage = psutil.cpu_percent(interval=1)
-            memory_usage = psutil.virtual_memory().percent
-            self.log_event("PC Usage", cpu_usage=cpu_usage, memory_usage=memory_usage)
-            time.sleep(10)
+            time.sleep(TELEMETRY_SECONDS)
+            self.log_event("PC Usage", **sampler.sample())
 
     # ---------------- External Peripherals (Placeholder) ----------------
     def log_external_peripherals(self, device_id, device_type):
@@ -342,94 +323,46 @@ class ActivityMonitor(QThread):
 
     # ---------------- Additional Maintenance Functions ----------------
     def copy_first_10_minutes(self):
-        """Modified to ensure data persistence and proper copying"""
+        """
+        Copy the first 10 minutes of activity to the training database. Runs
+        on every maintenance pass until the 10 minutes are over; the drift
+        reference is built once, from the final copy.
+        """
+        if self.first10_copied:
+            return
         try:
             # Wait for initial data collection
             time.sleep(6)
             
-            conn_source = sqlite3.connect(ACTIVITY_DB_PATH)
-            cursor_source = conn_source.cursor()
-            
-            # Get the first record's timestamp
-            cursor_source.execute("SELECT timestamp FROM software ORDER BY timestamp ASC LIMIT 1")
-            row = cursor_source.fetchone()
-            
-            if not row:
+            first_timestamp_str = storage.first_timestamp()
+            if not first_timestamp_str:
                 self.log_signal.emit("No data found in soft_activity.sqlite to copy.")
-                conn_source.close()
                 return
 
-            first_timestamp_str = row[0]
-            try:
-                first_time = datetime.fromisoformat(first_timestamp_str)
-            except Exception:
-                first_time = datetime.strptime(first_timestamp_str, "%Y-%m-%d %H:%M:%S")
-            
+            first_time = datetime.fromisoformat(first_timestamp_str)
             cutoff_time = first_time + timedelta(minutes=10)
-            first_timestamp_formatted = first_time.strftime("%Y-%m-%d %H:%M:%S")
-            cutoff_str = cutoff_time.strftime("%Y-%m-%d %H:%M:%S")
 
             # Select rows within the first 10 minutes
-            cursor_source.execute(
-                "SELECT * FROM software WHERE timestamp >= ? AND timestamp <= ?",
-                (first_timestamp_formatted, cutoff_str)
-            )
-            rows = cursor_source.fetchall()
-            conn_source.close()
-
+            rows = storage.fetch_software_rows(first_time, cutoff_time)
             if not rows:
                 self.log_signal.emit("No data found within first 10 minutes.")
                 return
 
-            # Create and populate the training database
-            conn_dest = sqlite3.connect(TRAINING_DB_PATH)
-            cursor_dest = conn_dest.cursor()
-            
-            # Ensure the table exists
-            cursor_dest.execute("""
-                CREATE TABLE IF NOT EXISTS software (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT,
-                    title TEXT,
-                    key TEXT,
-                    key_interval REAL,
-                    click_type TEXT,
-                    click_interval REAL,
-                    position TEXT,
-                    scroll_direction TEXT,
-                    scroll_speed REAL,
-                    scroll_interval REAL,
-                    duration REAL,
-                    cpu_usage REAL,
-                    memory_usage REAL,
-                    device_id TEXT,
-                    device_type TEXT,
-                    timestamp TEXT
-                )
-            """)
-            
-            # Clear existing data if any
-            cursor_dest.execute("DELETE FROM software")
-            
-            # Insert the new data
-            for row in rows:
-                cursor_dest.execute("""
-                    INSERT INTO software (
-                        type, title, key, key_interval, click_type, click_interval, position,
-                        scroll_direction, scroll_speed, scroll_interval, duration,
-                        cpu_usage, memory_usage, device_id, device_type, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, row[1:])  # Skip the id column
-            
-            conn_dest.commit()
-            conn_dest.close()
-            
-            self.first10_copied = True
+            # Replace the training database's contents with them
+            storage.replace_software_rows(rows, storage.TRAINING_DB_PATH)
+
+            complete = datetime.now() >= cutoff_time
             self.log_signal.emit(f"Successfully copied {len(rows)} records to training database.")
             
             # Train the model after copying data
             try:
-                model.IDS.train()
+                import model
+                if complete:
+                    model.fit_scales()
+                    drift_monitoring.build_reference()
+                    self.first10_copied = True
+                else:
+                    model.IntrusionDetector().train()
                 self.log_signal.emit("Model training completed successfully.")
             except Exception as e:
                 self.log_signal.emit(f"Error training model: {str(e)}")
@@ -438,107 +371,165 @@ class ActivityMonitor(QThread):
             self.log_signal.emit(f"Error in copy_first_10_minutes: {str(e)}")
             raise
     
+    def on_drift(self, events):
+        with self.drift_lock:
+            self.drifted.update(event.feature for event in events)
+        self.log_signal.emit("Behaviour drift detected in: " + ", ".join(sorted({e.feature for e in events})))
+
+    def retrain_after_drift(self):
+        """
+        Re-baseline after drift: the forests of every scale, the autoencoder
+        and the drift reference are refitted on the stored windows of up to
+        model.TRAINING_DAYS, on a background thread.
+        """
+        with self.drift_lock:
+            if not self.drifted or time.time() - self.last_drift_retrain < DRIFT_RETRAIN_COOLDOWN_SECONDS:
+                return
+            drifted = sorted(self.drifted)
+            self.drifted.clear()
+            self.last_drift_retrain = time.time()
+        threading.Thread(target=self._retrain, args=(drifted,), daemon=True).start()
+
+    def _retrain(self, drifted):
+        import ensemble_training
+        import model
+
+        try:
+            fitted = [f"{scale}s" for scale, pipeline in model.fit_scales().items() if pipeline is not None]
+            if not fitted:
+                self.log_signal.emit(f"Too few stored windows to retrain after drift in: {', '.join(drifted)}")
+                return
+            ensemble_training.train()
+            drift_monitoring.build_reference()
+            self.log_signal.emit(f"Refitted the {', '.join(fitted)} models on up to {model.TRAINING_DAYS} days "
+                                 f"of windows after drift in: {', '.join(drifted)}")
+        except Exception as e:
+            logger.error(f"Retraining after drift failed: {e}")
+
     def cleanup_old_data(self):
         """
-        Remove any records from soft_activity.sqlite that are over 15 minutes old.
+        Remove any records from soft_activity.sqlite that are over 15 minutes old,
+        after rolling them into the Parquet archive (see archive.py).
         """
-        cutoff = datetime.now() - timedelta(minutes=15)
-        cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
-        conn = sqlite3.connect(ACTIVITY_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM software WHERE timestamp < ?", (cutoff_str,))
-        conn.commit()
-        conn.close()
+        cutoff_ms = storage.epoch_ms(datetime.now() - timedelta(minutes=15))
+        conn = storage.connect(storage.ACTIVITY_DB_PATH)
+        try:
+            max_id = archive.archive_expired(conn, cutoff_ms)
+        except archive.ArchiveUnavailable as e:
+            if not self.archive_warned:
+                logger.warning(f"Not archiving expired activity: {e}")
+                self.archive_warned = True
+            db_maintenance.delete_before(conn, "software", cutoff_ms)
+        except OSError as e:
+            # Keep the rows and try again on the next pass
+            logger.error(f"Archiving expired activity failed: {e}")
+            return
+        else:
+            if max_id is not None:
+                db_maintenance.delete_before(conn, "software", cutoff_ms, max_id)
         self.log_signal.emit("Old data (over 15 minutes) removed from soft_activity.sqlite.")
 
-    def call_ollama_model(self, summary_text, suspicious = True):
-        prompt = f"Generate a 1-2 line summary of the following text. NO INTRO OR ANYTHING JUST RETURN THE SUMMARY:\n\n{summary_text}. We made a behavioural analysis model that predicted that the user is {'' if suspicious else 'not '}suspicious. NO OTHER TEXT. DON'T MENTION TIME OR DATE. ONLY SUMMARIZE THE ACTIONS AND TRY TO PREDICT WHAT THE USER MAY BE TRYING TO DO"
+    def call_ollama_model(self, explanation, suspicious=True):
+        import ollama
+
+        prompt = (
+            "Generate a 1-2 line summary for a security log. NO INTRO OR ANYTHING JUST RETURN THE SUMMARY. "
+            f"A behavioural analysis model judged the user's last 30 seconds of keyboard, mouse and app-switching "
+            f"activity {'suspicious' if suspicious else 'normal'}. The behaviour features that drove that verdict, "
+            f"with each one's share of the decision and how many standard deviations it is from the user's usual "
+            f"behaviour, were: {explanation or 'not available'}. NO OTHER TEXT. DON'T MENTION TIME OR DATE. "
+            "EXPLAIN IN PLAIN WORDS WHAT WAS UNUSUAL AND WHAT THE USER MAY BE TRYING TO DO"
+        )
         try:
-            response = ollama.chat(model="llama3:latest", messages=[{"role": "user", "content": prompt}])
+            with LLM_SECONDS.time():
+                response = ollama.chat(model="llama3:latest", messages=[{"role": "user", "content": prompt}])
             if 'message' in response and 'content' in response['message']:
                 result = response['message']['content']
                 return result
             else:
-                logging.error("Unexpected response structure from Ollama model")
+                LLM_ERRORS.inc()
+                logger.error("Unexpected response structure from Ollama model")
                 return ""
         except KeyError as e:
-            logging.error(f"KeyError in parsing Ollama response: {e}")
+            LLM_ERRORS.inc()
+            logger.error(f"KeyError in parsing Ollama response: {e}")
             return ""
         except Exception as e:
-            logging.error(f"Error calling Ollama model: {e}")
+            LLM_ERRORS.inc()
+            logger.error(f"Error calling Ollama model: {e}")
             return ""
 
     def generate_summary_data(self):
         """
-        Every 2 minutes, this function retrieves the records from the past minute,
-        deduplicates them, generates a summary text, calls the Ollama model to produce a
-        short summary (using the behavioral data and the inference result), and saves
-        the result in the output SQLite database.
+        Score the latest window, have the Ollama model summarise the features
+        that drove the verdict (scoring/explain.py) and save the summary, the
+        verdict and the explanation in the output SQLite database.
         """
-        # Get records from the past minute
-        one_minute_ago = datetime.now() - timedelta(minutes=1)
-        one_minute_ago_str = one_minute_ago.strftime("%Y-%m-%d %H:%M:%S")
-        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        conn = sqlite3.connect(ACTIVITY_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT type, title, timestamp
-            FROM software
-            WHERE timestamp >= ? AND timestamp <= ?;
-        """, (one_minute_ago_str, now_str))
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Filter out rows with a NULL type
-        filtered = [row for row in rows if row[0] is not None]
-        
-        # Deduplicate consecutive events based on type and title
-        deduped = []
-        prev = None
-        for row in filtered:
-            if prev is None or (row[0], row[1]) != (prev[0], prev[1]):
-                deduped.append(row)
-                prev = row
-        
-        # Build summary lines (e.g. "EventType at timestamp")
-        summary_lines = [f"{event_type} at {timestamp}" for event_type, title, timestamp in deduped]
-        summary_text = "\n".join(summary_lines)
-        
-        # Run inference on the current data.
         # run_inference returns True if normal (i.e. no anomaly), False if anomaly.
+        import model
         detector = model.IntrusionDetector()
         model_result = detector.run_inference()
-        # Set suspicious flag: if model_result is True (normal), then suspicious is False.
         suspicious = not model_result
-        
+
         # Call the Ollama model to generate a 1-2 line summary.
-        ollama_summary = self.call_ollama_model(summary_text, suspicious=suspicious)
-        output_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # print(ollama_summary + "\n\n" + str(model_result) + "\n\n" + output_timestamp + "\n\n")
-        print("-----------------------------------------------")
-        print("Calculating for the next 30 seconds")
-        # Insert the summary into the output SQLite database.
-        OUTPUT_DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "output.sqlite")
-        conn_output = sqlite3.connect(OUTPUT_DB_PATH)
-        cursor_output = conn_output.cursor()
-        cursor_output.execute("""
-            INSERT INTO output_summary (description, model_output, timestamp)
-            VALUES (?, ?, ?)
-        """, (ollama_summary, str(model_result), output_timestamp))
-        conn_output.commit()
-        conn_output.close()
-        
-        # print(ollama_summary + "\n\n ADDED TO TABLE")
-        # Optionally, emit a signal or log the Ollama summary.
+        ollama_summary = self.call_ollama_model(detector.explanation, suspicious=suspicious)
+        storage.insert_summary(ollama_summary, model_result, explanation=detector.explanation)
         self.log_signal.emit(f"Ollama summary: {ollama_summary}")
-    
+
     def periodic_maintenance(self):
         while self.running:
             self.copy_first_10_minutes()
+            self.retrain_after_drift()
             self.cleanup_old_data()
+            self.db_maintainer.run()
+            self.save_digraph_profile()
+            self.save_markov_chains()
+            self.mine_sequences()
+            self.train_ensemble()
             time.sleep(60)
 
+    def periodic_window_fill(self):
+        """Materialize each window's features and score, at every scale, as it closes."""
+        while self.running:
+            try:
+                window_features.fill()
+            except Exception as e:
+                logger.error(f"Filling window_features failed: {e}")
+            time.sleep(min(window_features.WINDOW_SCALES))
+
+    def mine_sequences(self):
+        """Re-learn the habitual app workflows from the focus history once a day."""
+        try:
+            patterns = sequence_mining.mine_if_stale()
+            if patterns is not None and patterns.sessions:
+                self.feature_context.patterns = patterns
+                self.log_signal.emit("Focus patterns re-mined from the activity history.")
+        except Exception as e:
+            logger.error(f"Mining focus patterns failed: {e}")
+
+    def train_ensemble(self):
+        """Re-train the autoencoder ensembled with the forest once a day."""
+        import ensemble_training
+
+        try:
+            if ensemble_training.train_if_stale():
+                self.log_signal.emit("Autoencoder re-trained on the training windows.")
+        except Exception as e:
+            logger.error(f"Training the autoencoder failed: {e}")
+
+    def save_digraph_profile(self):
+        try:
+            self.digraph_profile.save(DIGRAPH_PROFILE_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save digraph profile: {e}")
+
+    def save_markov_chains(self):
+        try:
+            self.event_chain.save(EVENT_CHAIN_PATH)
+            self.app_chain.save(APP_CHAIN_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save Markov chains: {e}")
+
     def periodic_summary_generation(self):
         while self.running:
             self.generate_summary_data()
@@ -553,8 +544,7 @@ def view_training_database():
     Function to view the contents of the training database
     """
     try:
-        conn = sqlite3.connect(TRAINING_DB_PATH)
-        cursor = conn.cursor()
+        cursor = storage.connect(storage.TRAINING_DB_PATH).cursor()
         
         # Get all records from the software table
         cursor.execute("SELECT * FROM software")
@@ -569,8 +559,7 @@ def view_training_database():
         print("\nRecords:")
         for row in rows:
             print(row)
-            
-        conn.close()
+
         return rows
         
     except Exception as e:
@@ -579,7 +568,9 @@ def view_training_database():
 
 if __name__ == '__main__':
     # For testing purposes, run the ActivityMonitor in a console application.
-    create_activity_table()
+    metrics.configure_logging()
+    metrics.start_exporters()
+    init_databases()
     monitor = ActivityMonitor()
     monitor.start()
     try:
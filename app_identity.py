@@ -0,0 +1,72 @@
+"""
+Foreground window -> application identity.
+
+AppResolver maps the foreground window to the executable of the process
+that owns it (window id -> pid -> psutil name, normalised by
+scoring.apps.app_name), so focus events carry a stable app name next to the
+window title.
+
+Lookups are cached in an LRU keyed by window id. A window keeps its owning
+process, so a hit costs neither the pid lookup (an xdotool call on Linux)
+nor a process query. An entry is dropped once its process has exited, as
+the window id may then be reused.
+"""
+import logging
+from collections import OrderedDict
+
+import psutil
+
+import capture
+import metrics
+from scoring.apps import app_name
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 256
+
+RESOLVE_HITS = metrics.counter("sbm_app_resolve_hits_total", "Foreground app lookups served from the cache")
+RESOLVE_MISSES = metrics.counter("sbm_app_resolve_misses_total", "Foreground app lookups that queried the process")
+
+
+class AppResolver:
+    """LRU cache of window id -> (psutil.Process, app name)."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+
+    def resolve(self, window_id):
+        """App name of the process owning window_id, or None if it cannot be found."""
+        entry = self.cache.get(window_id)
+        if entry is not None:
+            proc, name = entry
+            if proc.is_running():  # also False once the pid has been reused
+                self.cache.move_to_end(window_id)
+                RESOLVE_HITS.inc()
+                return name
+            del self.cache[window_id]
+
+        RESOLVE_MISSES.inc()
+        pid = capture.get_window_pid(window_id)
+        if pid is None:
+            return None
+        try:
+            proc = psutil.Process(pid)
+            name = app_name(proc.name())
+        except psutil.Error:
+            return None
+        if not name:
+            return None
+        self.cache[window_id] = (proc, name)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return name
+
+    def foreground_app(self):
+        """App name of the foreground window, or None."""
+        try:
+            window_id = capture.get_foreground_window_id()
+            return self.resolve(window_id) if window_id is not None else None
+        except (ImportError, OSError) as e:  # no pywin32 / xdotool
+            logger.debug(f"Foreground app unavailable: {e}")
+            return None
@@ -0,0 +1,265 @@
+"""
+Columnar archive of expired activity rows.
+
+cleanup_old_data only keeps the last 15 minutes in soft_activity.sqlite.
+Before rows are deleted they are rolled into compressed Parquet files,
+partitioned by event type and hour:
+
+  <data dir>/archive/<event type>/date=2024-01-01/hour=13/part-<first id>-<last id>.parquet
+
+Every cleanup pass adds one small part file per event type and hour. Once
+an hour is closed (the expiry cutoff has passed its end), its parts are
+merged into a single file, so a day of archive is a few dozen files per
+event type rather than a few thousand.
+
+Each event type stores only its own columns, with real types (timestamp as
+timestamp[us], intervals as float64, monotonic times as int64). Readers
+prune by directory first and then read just the requested columns, so a
+training run over a week of keystrokes never touches mouse or focus data.
+
+pyarrow is optional: without it archive_expired() raises ArchiveUnavailable
+and the caller falls back to plain deletion.
+"""
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+
+import metrics
+import profiles
+from storage import EPOCH, TIMESTAMP_FORMAT
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SECONDS = metrics.histogram("sbm_archive_seconds", "Time to archive one batch of expired rows")
+HOURS_COMPACTED = metrics.counter("sbm_archive_hours_compacted_total", "Archive hours merged into one file")
+ROWS_ARCHIVED = metrics.counter("sbm_rows_archived_total", "Activity rows written to the Parquet archive")
+
+# Column types of the software table
+COLUMN_TYPES = {
+    "id": "int64", "title": "string", "key": "string", "key_interval": "float64",
+    "click_type": "string", "click_interval": "float64", "position": "string",
+    "scroll_direction": "string", "scroll_speed": "float64", "scroll_interval": "float64",
+    "duration": "float64", "cpu_usage": "float64", "memory_usage": "float64",
+    "device_id": "string", "device_type": "string", "timestamp": "timestamp",
+    "press_ns": "int64", "event_ns": "int64",
+    "process_cpu": "float64", "io_bytes": "int64", "spawned": "int64", "app": "string",
+}
+
+# Columns stored per event type (id and timestamp are always kept)
+EVENT_COLUMNS = {
+    "Keyboard": ["key", "key_interval", "press_ns", "event_ns"],
+    "Click": ["click_type", "click_interval", "position", "press_ns", "event_ns"],
+    "Mouse Move": ["position", "duration", "press_ns", "event_ns"],
+    "Scroll": ["scroll_direction", "scroll_speed", "scroll_interval"],
+    "App in Focus": ["title", "app", "duration"],
+    "App Open": ["title", "app"],
+    "App Closed": ["title", "app", "duration"],
+    "All Apps Open": ["title"],
+    "PC Usage": ["title", "duration", "cpu_usage", "memory_usage", "process_cpu", "io_bytes", "spawned"],
+    "External Peripherals": ["device_id", "device_type"],
+}
+OTHER_COLUMNS = [name for name in COLUMN_TYPES if name not in ("id", "timestamp")]
+
+# Closed hours this far before the expiry cutoff are compacted on each pass
+COMPACT_LOOKBACK_HOURS = 3
+
+
+class ArchiveUnavailable(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ArchiveUnavailable("pyarrow is not installed") from e
+    return pyarrow
+
+
+def archive_dir(profile=None):
+    return os.path.join(profiles.data_dir(profile), "archive")
+
+
+def _type_dir(root, event_type):
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9]+", "_", event_type).strip("_").lower())
+
+
+def _columns_for(event_type):
+    return ["id", "timestamp"] + EVENT_COLUMNS.get(event_type, OTHER_COLUMNS)
+
+
+def _schema(pa, columns):
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "timestamp": pa.timestamp("us")}
+    return pa.schema([(name, types[COLUMN_TYPES[name]]) for name in columns])
+
+
+def archive_expired(conn, cutoff_ms, root=None):
+    """
+    Write every software row with epoch_ms < cutoff_ms to the archive.
+    Returns the highest archived id (None if nothing was expired); the caller
+    deletes rows up to that id once this returns.
+    """
+    pa = _pyarrow()
+    root = root or archive_dir()
+    with ARCHIVE_SECONDS.time():
+        cursor = conn.cursor()
+        cursor.execute("SELECT type, MAX(id) FROM software WHERE epoch_ms < ? GROUP BY type", (cutoff_ms,))
+        types = cursor.fetchall()
+        if not types:
+            return None
+        max_id = max(type_max for _, type_max in types)
+
+        for event_type, _ in types:
+            columns = _columns_for(event_type)
+            cursor.execute(f"""
+                SELECT {", ".join(columns)} FROM software
+                WHERE type = ? AND epoch_ms < ? AND id <= ? ORDER BY id
+            """, (event_type, cutoff_ms, max_id))
+            _write_partitions(pa, root, event_type, columns, cursor.fetchall())
+        compact(EPOCH + timedelta(milliseconds=cutoff_ms), root)
+    return max_id
+
+
+def _write_partitions(pa, root, event_type, columns, rows):
+    hours = {}
+    ts_index = columns.index("timestamp")
+    for row in rows:
+        try:
+            timestamp = datetime.fromisoformat(row[ts_index])
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping {event_type} row {row[0]} with bad timestamp {row[ts_index]!r}")
+            continue
+        row = list(row)
+        row[ts_index] = timestamp
+        hours.setdefault(timestamp.replace(minute=0, second=0, microsecond=0), []).append(row)
+
+    schema = _schema(pa, columns)
+    for hour, hour_rows in hours.items():
+        directory = os.path.join(_type_dir(root, event_type), f"date={hour:%Y-%m-%d}", f"hour={hour:%H}")
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_arrays(
+            [pa.array([row[i] for row in hour_rows], type=schema.field(i).type) for i in range(len(columns))],
+            schema=schema,
+        )
+        path = os.path.join(directory, f"part-{hour_rows[0][0]}-{hour_rows[-1][0]}.parquet")
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        pa.parquet.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        ROWS_ARCHIVED.inc(len(hour_rows))
+
+
+def _hour_dirs(type_dir, start=None, end=None):
+    """(hour, directory) of one event type's hour partitions overlapping [start, end), oldest first."""
+    if not os.path.isdir(type_dir):
+        return
+    for date_dir in sorted(os.listdir(type_dir)):
+        if not date_dir.startswith("date="):
+            continue
+        for hour_dir in sorted(os.listdir(os.path.join(type_dir, date_dir))):
+            if not hour_dir.startswith("hour="):
+                continue
+            hour = datetime.strptime(f"{date_dir[5:]} {hour_dir[5:]}", "%Y-%m-%d %H")
+            if (start and hour + timedelta(hours=1) <= start) or (end and hour >= end):
+                continue
+            yield hour, os.path.join(type_dir, date_dir, hour_dir)
+
+
+def _parts(directory):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".parquet")]
+
+
+def partition_files(event_type, start=None, end=None, root=None):
+    """Parquet files of one event type whose hour overlaps [start, end)."""
+    type_dir = _type_dir(root or archive_dir(), event_type)
+    return [path for _, directory in _hour_dirs(type_dir, start, end) for path in _parts(directory)]
+
+
+def compact(before, root=None, lookback_hours=COMPACT_LOOKBACK_HOURS):
+    """
+    Merge the part files of each hour that ended by `before` (and started
+    at most lookback_hours earlier; None for the whole archive) into one
+    file. Returns the number of hours merged.
+    """
+    pa = _pyarrow()
+    root = root or archive_dir()
+    if not os.path.isdir(root):
+        return 0
+    closed = before.replace(minute=0, second=0, microsecond=0)  # hours before this one are closed
+    since = closed - timedelta(hours=lookback_hours) if lookback_hours is not None else None
+    merged = 0
+    for type_name in sorted(os.listdir(root)):
+        for _, directory in _hour_dirs(os.path.join(root, type_name), since, closed):
+            parts = _parts(directory)
+            if len(parts) > 1:
+                _merge_parts(pa, directory, parts)
+                merged += 1
+    HOURS_COMPACTED.inc(merged)
+    return merged
+
+
+def _merge_parts(pa, directory, parts):
+    # Parts written before a column was added lack it; the merged file has every column
+    columns = list(dict.fromkeys(name for path in parts for name in pa.parquet.read_schema(path).names))
+    table = pa.concat_tables(_read_partition(pa, path, columns) for path in parts).sort_by("id")
+    ids = table["id"]
+    path = os.path.join(directory, f"part-{ids[0].as_py()}-{ids[-1].as_py()}.parquet")
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+    pa.parquet.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    for part in parts:
+        if part != path:
+            os.remove(part)
+
+
+def _read_partition(pa, path, columns):
+    """One Parquet file's columns; ones added to the table after it was written come back as nulls."""
+    present = set(pa.parquet.read_schema(path).names)
+    table = pa.parquet.read_table(path, columns=[name for name in columns if name in present])
+    schema = _schema(pa, columns)
+    return pa.Table.from_arrays(
+        [table[name] if name in present else pa.nulls(len(table), schema.field(name).type) for name in columns],
+        schema=schema,
+    )
+
+
+def read_events(event_type, columns=None, start=None, end=None, root=None):
+    """
+    Load archived events of one type as a pyarrow Table, ordered by id.
+    columns defaults to all of the type's columns; start/end are datetimes
+    bounding the timestamp (start inclusive, end exclusive).
+    """
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+
+    stored = _columns_for(event_type)
+    wanted = columns or stored
+    files = partition_files(event_type, start, end, root)
+    if not files:
+        return _schema(pa, wanted).empty_table()
+
+    read_columns = list(dict.fromkeys(list(wanted) + ["id", "timestamp"]))
+    table = pa.concat_tables(_read_partition(pa, path, read_columns) for path in files)
+    mask = None
+    if start:
+        mask = pc.greater_equal(table["timestamp"], pa.scalar(start, pa.timestamp("us")))
+    if end:
+        before = pc.less(table["timestamp"], pa.scalar(end, pa.timestamp("us")))
+        mask = before if mask is None else pc.and_(mask, before)
+    if mask is not None:
+        table = table.filter(mask)
+    return table.sort_by("id").select(wanted)
+
+
+def read_rows(event_type, columns, start=None, end=None, root=None):
+    """
+    Archived events as tuples shaped like the SQLite rows the feature code
+    takes (timestamps back as TIMESTAMP_FORMAT strings).
+    """
+    table = read_events(event_type, columns, start, end, root)
+    data = table.to_pydict()
+    if "timestamp" in data:
+        data["timestamp"] = [ts.strftime(TIMESTAMP_FORMAT) if ts else None for ts in data["timestamp"]]
+    return list(zip(*(data[name] for name in columns)))
@@ -0,0 +1,137 @@
+"""
+Loopback test and throughput benchmark for the central collector.
+
+Starts SBM/collector_server.py on 127.0.0.1 in a throwaway home directory,
+pushes synthetic feature windows for many profiles from several agent
+threads through collector_client, checks that every window gets a verdict
+(with an explanation), and reports windows scored per second. By default
+each request carries one window, as a live agent sends it
+(IntrusionDetector.score_remote); --batch-size measures bulk uploads.
+
+Usage:
+    python benchmarks/collector.py [--workers 4] [--agents 8] [--profiles 100]
+                                   [--batches 200] [--batch-size 1] [--json out.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers):
+    home = tempfile.mkdtemp(prefix="sbm-collector-")
+    os.makedirs(os.path.join(home, "Documents"), exist_ok=True)
+    env = dict(os.environ, HOME=home, USERPROFILE=home, SBM_MODEL_DIR=REPO_ROOT)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "SBM", "collector_server.py"),
+         "--port", str(port), "--workers", str(workers)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"collector exited:\n{server.stderr.read().decode()[-2000:]}")
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("collector did not start within 30s")
+
+
+def run_agent(url, profile_keys, batches, batch_size, seed):
+    from collector_client import CollectorClient
+    from scoring import EXTENDED_FEATURE_NAMES
+
+    rng = np.random.default_rng(seed)
+    verdicts = 0
+    explained = 0
+    latencies = []
+    for batch in range(batches):
+        client = CollectorClient(url, profile_key=profile_keys[batch % len(profile_keys)])
+        for i in range(batch_size):
+            client.add(f"window-{batch}-{i}", rng.random(len(EXTENDED_FEATURE_NAMES)) * 10)
+        start = time.perf_counter()
+        batch_verdicts = client.flush()
+        latencies.append(time.perf_counter() - start)
+        verdicts += len(batch_verdicts)
+        explained += sum(bool(verdict.get("explanation")) for verdict in batch_verdicts)
+    return verdicts, explained, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback benchmark for SBM/collector_server.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--agents", type=int, default=8, help="Concurrent agent threads")
+    parser.add_argument("--profiles", type=int, default=100)
+    parser.add_argument("--batches", type=int, default=200, help="Requests per agent")
+    parser.add_argument("--batch-size", type=int, default=1, help="Windows per request")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(port, args.workers)
+    try:
+        profile_keys = [f"user{i}@host{i % 10}" for i in range(args.profiles)]
+        # Warm the workers' model caches
+        run_agent(url, profile_keys[:1], 1, 8, seed=0)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.agents) as pool:
+            results = list(pool.map(
+                lambda agent: run_agent(url, profile_keys[agent::args.agents], args.batches, args.batch_size, agent),
+                range(args.agents)
+            ))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    sent = args.agents * args.batches * args.batch_size
+    received = sum(verdicts for verdicts, _, _ in results)
+    explained = sum(agent_explained for _, agent_explained, _ in results)
+    latencies = sorted(latency for _, _, agent_latencies in results for latency in agent_latencies)
+    report = {
+        "workers": args.workers,
+        "agents": args.agents,
+        "windows_sent": sent,
+        "verdicts_received": received,
+        "verdicts_explained": explained,
+        "seconds": elapsed,
+        "windows_per_second": received / elapsed,
+        "request_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "request_p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+    print(f"{received}/{sent} verdicts in {elapsed:.2f}s "
+          f"({report['windows_per_second']:.0f} windows/s, {args.workers} workers, {args.agents} agents)")
+    print(f"request round trip: p50 {report['request_p50_ms']:.1f} ms, p99 {report['request_p99_ms']:.1f} ms, "
+          f"{explained} verdicts explained")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if received != sent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Offline evaluation and hyperparameter search for the IsolationForest.
+
+Builds labelled window datasets and measures how well a model trained on
+one user's benign windows separates them from intrusions:
+
+  * the benign history is split in time: the first --train-share of its
+    windows train the model, the rest form the test stream
+  * attack episodes (--episode-seconds long, non-overlapping) are written
+    over parts of the test stream, either spliced from another user's
+    history or made by perturbing the benign windows they replace
+    (typing bursts, rapid app hopping, scripted clicking, feature noise)
+
+Histories are synthetic users generated as in benchmarks/replay.py
+(preset[:rate_scale[:seed]]) or real soft_activity/soft_training SQLite
+databases (db:PATH). Window features come from the same WindowAggregate
+code the live pipeline uses, one matrix per history and window scale,
+cached on disk as .npy files keyed by their inputs.
+
+Every trial fits StandardScaler + IsolationForest on the training windows
+and scores the test stream through scoring.ScoringPipeline. It reports
+ROC-AUC (overall and per attack source), the FPR at --target-tpr, the
+FPR/TPR at the model's own threshold and the detection latency of the
+episodes. Trials run on a process pool. Grid or seeded random search
+covers n_estimators, max_samples, contamination and window scale. The
+report holds no timings, so for a given seed it is identical from run to run.
+
+Usage:
+    python benchmarks/evaluate.py                                  # full grid, synthetic users
+    python benchmarks/evaluate.py --random 20 --seed 1 --json report.json
+    python benchmarks/evaluate.py --benign db:~/Documents/soft_training.sqlite --impostor db:other.sqlite
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from replay import PRESETS, generate_stream, redirect_home, sim_time  # noqa: E402
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sbm-eval")
+
+GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_samples": [16, 64, 256, "auto"],
+    "contamination": ["auto", 0.01, 0.05],
+}
+
+# Synthetic intrusions: feature -> multiplier
+PERTURBATIONS = {
+    "typing_burst": {"typing_speed": 3.0, "dwell_time": 0.5, "flight_time": 0.4},
+    "app_hopping": {"switching_rate": 4.0, "total_transitions": 4.0, "unique_transitions": 3.0,
+                    "transition_rate": 4.0, "mean_focus_duration": 0.25, "max_focus_duration": 0.25},
+    "scripted_clicks": {"mouse_interval": 0.2, "mouse_speed": 3.0, "click_distance": 0.3},
+}
+NOISE_STD = 3.0  # the "noise" perturbation adds this many training stds to every feature
+
+
+# ---------------- Histories ----------------
+
+def parse_source(spec):
+    """'office', 'office:1.5', 'office:1.5:7' or 'db:PATH' -> a JSON-able description."""
+    if spec.startswith("db:"):
+        path = os.path.abspath(os.path.expanduser(spec[3:]))
+        stat = os.stat(path)
+        return {"kind": "db", "path": path, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+    preset, *rest = spec.split(":")
+    if preset not in PRESETS:
+        raise ValueError(f"unknown preset {preset!r}; choose from {sorted(PRESETS)} or db:PATH")
+    return {"kind": "synthetic", "preset": preset, "rate_scale": float(rest[0]) if rest else 1.0,
+            "seed": int(rest[1]) if len(rest) > 1 else 0}
+
+
+def _synthetic_windows(source, duration, scale):
+    from storage import TIMESTAMP_FORMAT
+
+    rates = {event_type: rate * source["rate_scale"] for event_type, rate in PRESETS[source["preset"]].items()
+             if event_type in ("Keyboard", "Click", "App in Focus")}
+    buckets = {}
+    for event in generate_stream(rates, duration, source["seed"]):
+        data = event["data"]
+        timestamp = sim_time(event["t"]).strftime(TIMESTAMP_FORMAT)
+        if event["type"] == "Keyboard":
+            row = (data["key"], data["key_interval"], timestamp, data["press_ns"], data["event_ns"])
+        elif event["type"] == "Click":
+            row = (data["click_type"], data["click_interval"], json.dumps(data["position"]), timestamp)
+        else:
+            row = (data["title"], data["duration"], timestamp)
+        buckets.setdefault(int(event["t"] // scale), {}).setdefault(event["type"], []).append(row)
+    return [buckets[i] for i in sorted(buckets)]
+
+
+def window_matrix(source, scale, duration, cache_dir):
+    """Feature matrix (one row per window with events, in time order) of a history, cached."""
+    from scoring import FEATURE_NAMES, WindowAggregate, feature_schema
+
+    key = json.dumps({"source": source, "scale": scale, "duration": duration,
+                      "schema": feature_schema(FEATURE_NAMES)}, sort_keys=True)
+    path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ".npy")
+    if os.path.exists(path):
+        return path
+
+    if source["kind"] == "db":
+        import storage
+        import window_features
+
+        first_ms, last_ms = storage.epoch_range(source["path"])
+        aggregates = {} if first_ms is None else window_features.aggregate(first_ms, last_ms + 1, scale,
+                                                                             source["path"])
+        rows = [aggregates[start].features(scale) for start in sorted(aggregates)]
+    else:
+        rows = [WindowAggregate.from_events(events.get("Keyboard", []), events.get("Click", []),
+                                            events.get("App in Focus", [])).features(scale)
+                for events in _synthetic_windows(source, duration, scale)]
+    matrix = np.array(rows, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, matrix)
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------------- Labelled datasets ----------------
+
+def build_dataset(benign, impostors, scale, args, seed):
+    """
+    Train rows, test rows, labels (0 benign, 1 attack), the attack source of
+    every row ("" for benign) and the episodes as (source, start, length).
+    """
+    from scoring import FEATURE_NAMES
+
+    rng = np.random.default_rng(seed)
+    split = int(len(benign) * args.train_share)
+    train, test = benign[:split], benign[split:].copy()
+    labels = np.zeros(len(test), dtype=np.int8)
+    sources = np.array([""] * len(test), dtype=object)
+    length = max(1, args.episode_seconds // scale)
+
+    kinds = [f"splice:{name}" for name, matrix in impostors.items() if len(matrix) >= length]
+    kinds += [f"perturb:{name}" for name in [*PERTURBATIONS, "noise"]]
+    # Non-overlapping slots with a benign gap of one episode between attacks
+    slots = len(test) // (2 * length)
+    episodes_wanted = args.episodes * len(kinds)
+    chosen = np.sort(rng.choice(slots, size=min(slots, episodes_wanted), replace=False)) if slots else []
+    train_std = train.std(axis=0) if len(train) else np.ones(len(FEATURE_NAMES))
+    episodes = []
+    for i, slot in enumerate(chosen):
+        kind = kinds[i % len(kinds)]
+        start = int(slot) * 2 * length + length
+        block = test[start:start + length]
+        family, name = kind.split(":", 1)
+        if family == "splice":
+            impostor = impostors[name]
+            offset = int(rng.integers(0, len(impostor) - length + 1))
+            block[:] = impostor[offset:offset + length]
+        elif name == "noise":
+            block += rng.normal(size=block.shape) * train_std * NOISE_STD
+            np.maximum(block, 0, out=block)
+        else:
+            for feature, factor in PERTURBATIONS[name].items():
+                block[:, FEATURE_NAMES.index(feature)] *= factor
+        labels[start:start + length] = 1
+        sources[start:start + length] = kind
+        episodes.append((kind, start, length))
+    return train, test, labels, sources, episodes
+
+
+# ---------------- Metrics ----------------
+
+def roc_auc(scores, labels):
+    """Area under the ROC curve of `scores` (higher = more anomalous); ties count half."""
+    positives = labels == 1
+    n_pos, n_neg = int(positives.sum()), int((~positives).sum())
+    if not n_pos or not n_neg:
+        return None
+    order = np.argsort(scores, kind="mergesort")
+    ranks = np.empty(len(scores))
+    sorted_scores = scores[order]
+    # Average rank of each run of tied scores
+    boundaries = np.flatnonzero(np.diff(sorted_scores)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(scores)]))
+    ranks[order] = np.repeat((starts + ends + 1) / 2, ends - starts)
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+def threshold_at_tpr(scores, labels, target_tpr):
+    """Highest threshold flagging (score >= threshold) at least target_tpr of the attacks."""
+    attack_scores = np.sort(scores[labels == 1])[::-1]
+    if not len(attack_scores):
+        return None
+    needed = max(1, int(np.ceil(target_tpr * len(attack_scores))))
+    return float(attack_scores[needed - 1])
+
+
+def detection_latency(flagged, episodes, scale):
+    """Seconds from each episode's start to the end of its first flagged window (None if missed)."""
+    latencies = []
+    for _, start, length in episodes:
+        hits = np.flatnonzero(flagged[start:start + length])
+        latencies.append(float((hits[0] + 1) * scale) if len(hits) else None)
+    return latencies
+
+
+def evaluate_scores(decision, labels, sources, episodes, scale, target_tpr):
+    scores = -decision  # higher = more anomalous
+    benign = labels == 0
+    report = {"auc": roc_auc(scores, labels)}
+    report["auc_by_source"] = {
+        kind: roc_auc(scores[benign | (sources == kind)], labels[benign | (sources == kind)])
+        for kind in sorted({kind for kind, _, _ in episodes})
+    }
+    threshold = threshold_at_tpr(scores, labels, target_tpr)
+    if threshold is not None:
+        report[f"fpr_at_tpr_{target_tpr:g}"] = float(np.mean(scores[benign] >= threshold))
+        latencies = detection_latency(scores >= threshold, episodes, scale)
+        detected = [latency for latency in latencies if latency is not None]
+        report["episodes_detected"] = len(detected) / len(latencies)
+        report["latency_s_median"] = float(np.median(detected)) if detected else None
+        report["latency_s_mean"] = float(np.mean(detected)) if detected else None
+    # The model's own operating point: decision_function < 0
+    flagged = decision < 0
+    report["fpr_at_model_threshold"] = float(flagged[benign].mean()) if benign.any() else None
+    report["tpr_at_model_threshold"] = float(flagged[~benign].mean()) if (~benign).any() else None
+    return report
+
+
+# ---------------- Trials ----------------
+
+def run_trial(trial, dataset_path, target_tpr, seed):
+    """Worker: fit one parameter set on a cached dataset and score its test stream."""
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    from scoring import FEATURE_NAMES, ScoringPipeline
+
+    with np.load(dataset_path, allow_pickle=False) as data:
+        train, test, labels = data["train"], data["test"], data["labels"]
+        sources = data["sources"].astype(object)
+        episodes = [(kind, int(start), int(length)) for kind, start, length
+                    in zip(data["episode_kinds"].tolist(), data["episode_starts"], data["episode_lengths"])]
+    scaler = StandardScaler().fit(train)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # max_samples larger than the training set
+        clf = IsolationForest(n_estimators=trial["n_estimators"], max_samples=trial["max_samples"],
+                              contamination=trial["contamination"], random_state=seed)
+        clf.fit(scaler.transform(train))
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, FEATURE_NAMES)
+    result = dict(trial)
+    result.update(evaluate_scores(pipeline.decision_function(test), labels, sources, episodes,
+                                  trial["scale"], target_tpr))
+    return result
+
+
+def run_shipped(model_filename, dataset_path, target_tpr):
+    """Score the shipped model on a dataset; it was trained on other data, so this is a transfer check."""
+    from scoring import load_pipeline
+
+    with np.load(dataset_path, allow_pickle=False) as data:
+        test, labels = data["test"], data["labels"]
+        sources = data["sources"].astype(object)
+        episodes = [(kind, int(start), int(length)) for kind, start, length
+                    in zip(data["episode_kinds"].tolist(), data["episode_starts"], data["episode_lengths"])]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        pipeline = load_pipeline(model_filename)
+    result = {"model": os.path.basename(model_filename), "scale": 30}
+    result.update(evaluate_scores(pipeline.decision_function(test), labels, sources, episodes, 30, target_tpr))
+    return result
+
+
+def trials(scales, random_count, seed):
+    grid = [dict(zip(GRID, values), scale=scale) for scale in scales
+            for values in itertools.product(*GRID.values())]
+    if random_count and random_count < len(grid):
+        grid = random.Random(seed).sample(grid, random_count)
+    return sorted(grid, key=trial_key)
+
+
+def trial_key(trial):
+    return (trial["scale"], trial["n_estimators"], str(trial["max_samples"]), str(trial["contamination"]))
+
+
+# ---------------- CLI ----------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate and tune the IsolationForest on labelled windows")
+    parser.add_argument("--benign", default="office", help="preset[:rate_scale[:seed]] or db:PATH")
+    parser.add_argument("--impostor", action="append",
+                        help="History spliced in as attacks (repeatable); default office:1.6:1, idle, burst")
+    parser.add_argument("--duration", type=float, default=8 * 3600, help="Seconds of each synthetic history")
+    parser.add_argument("--scales", default="5,30,300", help="Window sizes to search, in seconds")
+    parser.add_argument("--train-share", type=float, default=0.6)
+    parser.add_argument("--episodes", type=int, default=10, help="Episodes per attack source")
+    parser.add_argument("--episode-seconds", type=int, default=300)
+    parser.add_argument("--target-tpr", type=float, default=0.9)
+    parser.add_argument("--random", type=int, default=0, help="Sample this many trials instead of the full grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    cache_dir = os.path.abspath(os.path.expanduser(args.cache_dir))
+    benign_source = parse_source(args.benign)
+    impostor_sources = {spec: parse_source(spec) for spec in (args.impostor or ["office:1.6:1", "idle", "burst"])}
+    # Nothing below writes the user's databases; real histories are only read through db:PATH
+    redirect_home()
+    scales = sorted({int(s) for s in args.scales.split(",")})
+    if scales[0] <= 0:
+        parser.error("window scales must be positive")
+
+    datasets = {}
+    data_report = {}
+    work_dir = tempfile.mkdtemp(prefix="sbm-eval-")
+    for scale in scales:
+        benign = np.load(window_matrix(benign_source, scale, args.duration, cache_dir))
+        impostors = {spec: np.load(window_matrix(source, scale, args.duration / 4, cache_dir))
+                     for spec, source in impostor_sources.items()}
+        train, test, labels, sources, episodes = build_dataset(benign, impostors, scale, args, args.seed + scale)
+        if len(train) < 2 or not episodes:
+            print(f"{scale}s: not enough windows ({len(benign)}) for a labelled dataset; skipped")
+            continue
+        datasets[scale] = os.path.join(work_dir, f"dataset_{scale}s.npz")
+        np.savez(datasets[scale], train=train, test=test, labels=labels, sources=sources.astype(str),
+                 episode_kinds=np.array([kind for kind, _, _ in episodes], dtype=str),
+                 episode_starts=np.array([start for _, start, _ in episodes]),
+                 episode_lengths=np.array([length for _, _, length in episodes]))
+        data_report[scale] = {"train_windows": len(train), "test_windows": len(test),
+                              "attack_windows": int(labels.sum()), "episodes": len(episodes)}
+
+    todo = trials(sorted(datasets), args.random, args.seed)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(run_trial, trial, datasets[trial["scale"]], args.target_tpr, args.seed)
+                   for trial in todo]
+        shipped_model = os.path.join(REPO_ROOT, "intrusion_model.joblib")
+        shipped = (pool.submit(run_shipped, shipped_model, datasets[30], args.target_tpr)
+                   if 30 in datasets and os.path.exists(shipped_model) else None)
+        results = [future.result() for future in futures]
+        shipped = shipped.result() if shipped else None
+
+    ranked = sorted(results, key=lambda r: (-(r["auc"] or 0), trial_key(r)))
+    report = {
+        "config": {"benign": benign_source, "impostors": impostor_sources, "duration": args.duration,
+                   "train_share": args.train_share, "episodes": args.episodes,
+                   "episode_seconds": args.episode_seconds, "target_tpr": args.target_tpr,
+                   "random": args.random, "seed": args.seed},
+        "datasets": {str(scale): info for scale, info in data_report.items()},
+        "shipped_model": shipped,
+        "trials": sorted(results, key=trial_key),
+        "best": ranked[0] if ranked else None,
+    }
+
+    fpr_key = f"fpr_at_tpr_{args.target_tpr:g}"
+    print(f"{'scale':>5} {'trees':>5} {'samples':>7} {'contam':>6} {'auc':>6} {fpr_key:>14} "
+          f"{'latency s':>9} {'fpr@0':>6} {'tpr@0':>6}")
+    for r in ranked[:15] + ([shipped] if shipped else []):
+        latency = r.get("latency_s_median")
+        print(f"{r['scale']:>5} {r.get('n_estimators', 'ship'):>5} {str(r.get('max_samples', '-')):>7} "
+              f"{str(r.get('contamination', '-')):>6} {r['auc'] or 0:>6.3f} {r.get(fpr_key) or 0:>14.3f} "
+              f"{latency if latency is not None else float('nan'):>9.0f} "
+              f"{r['fpr_at_model_threshold']:>6.3f} {r['tpr_at_model_threshold']:>6.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compiled IsolationForest vs sklearn: bit-compatibility check and latency.
+
+Loads intrusion_model.joblib, compiles it with scoring.forest, and on random
+feature rows (spread around the scaler's mean/scale, plus NaN rows) checks
+that CompiledForest.decision_function equals sklearn's decision_function
+bit for bit. Then times single-row and batch scoring for both.
+
+Usage:
+    python benchmarks/forest.py [--model intrusion_model.joblib] [--batch 10000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def best_of(fn, repeat, number):
+    """Best mean seconds per call over `repeat` runs of `number` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled vs sklearn IsolationForest scoring")
+    parser.add_argument("--model", default=os.path.join(REPO_ROOT, "intrusion_model.joblib"))
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    import joblib
+    from scoring.detector import scaler_filename
+    from scoring.forest import CompiledForest
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # pickles from an older sklearn
+        clf = joblib.load(args.model)
+        scaler = joblib.load(scaler_filename(args.model))
+    forest = CompiledForest.from_sklearn(clf)
+
+    rng = np.random.default_rng(args.seed)
+    rows = scaler.mean_ + rng.normal(size=(args.batch, len(scaler.mean_))) * scaler.scale_ * 2
+    rows[rng.random(args.batch) < 0.01, rng.integers(len(scaler.mean_))] = np.nan
+    expected = clf.decision_function(rows)
+    actual = forest.decision_function(rows)
+    identical = bool(np.array_equal(expected, actual))
+    mismatches = int(np.sum(expected != actual))
+
+    single = rows[:1]
+    report = {
+        "trees": len(forest.roots),
+        "nodes": len(forest.value),
+        "bit_identical": identical,
+        "mismatches": mismatches,
+        "single_row_us": {
+            "sklearn": best_of(lambda: clf.decision_function(single), 5, 50) * 1e6,
+            "compiled": best_of(lambda: forest.decision_function(single), 5, 2000) * 1e6,
+        },
+        f"batch_{args.batch}_ms": {
+            "sklearn": best_of(lambda: clf.decision_function(rows), 3, 1) * 1e3,
+            "compiled": best_of(lambda: forest.decision_function(rows), 3, 3) * 1e3,
+        },
+    }
+    print(f"{report['trees']} trees, {report['nodes']} nodes; "
+          f"bit-identical to sklearn on {args.batch} rows: {identical} ({mismatches} mismatches)")
+    print(f"single row:  sklearn {report['single_row_us']['sklearn']:9.1f} us   "
+          f"compiled {report['single_row_us']['compiled']:9.1f} us")
+    batch = report[f"batch_{args.batch}_ms"]
+    print(f"{args.batch} rows: sklearn {batch['sklearn']:9.1f} ms   compiled {batch['compiled']:9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Offline replay and benchmark harness for the capture -> store -> feature -> score path.
+
+Generates (or loads) a synthetic event stream and replays it in accelerated
+time without pynput, a window manager or Qt:
+
+  * desktop events (Keyboard, Click, Scroll, App in Focus, PC Usage) go through
+    storage.insert_event, the storage half of ActivityMonitor.log_event
+  * browser events in the SBM `activity` schema go through
+    SBM/flask_server.insert_activity, the body of /log_activity
+  * every time the simulated clock crosses a 30-second boundary the window is
+    fetched, turned into features and scored exactly as run_inference does
+
+Each run happens in a throwaway home directory, so the real databases under
+~/Documents are never touched. Runs are reproducible for a given --seed.
+
+Usage:
+    python benchmarks/replay.py --suite                      # all presets
+    python benchmarks/replay.py --preset office --duration 600
+    python benchmarks/replay.py --preset burst --save-stream burst.jsonl
+    python benchmarks/replay.py --stream burst.jsonl --json report.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WINDOW_SECONDS = 30
+REPLAY_START = datetime(2024, 1, 1, 9, 0, 0)
+
+# Events per second for each stream
+PRESETS = {
+    "idle": {"Keyboard": 0.2, "Click": 0.05, "Scroll": 0.05, "App in Focus": 0.02, "PC Usage": 0.1, "browser": 0.05},
+    "office": {"Keyboard": 3.0, "Click": 0.5, "Scroll": 0.8, "App in Focus": 0.1, "PC Usage": 0.1, "browser": 1.0},
+    "burst": {"Keyboard": 12.0, "Click": 3.0, "Scroll": 5.0, "App in Focus": 0.5, "PC Usage": 0.1, "browser": 6.0},
+}
+
+APPS = ["Visual Studio Code", "Google Chrome", "Slack", "Outlook", "Terminal", "Excel", "Teams"]
+SITES = ["github.com", "mail.google.com", "docs.python.org", "stackoverflow.com", "news.ycombinator.com"]
+KEYS = [f"'{c}'" for c in "etaoinshrdlucmfwypvbgkjqxz"] + ["Key.space"] * 6 + ["Key.backspace", "Key.shift", "Key.enter", "Key.ctrl_l"]
+
+
+# ---------------- Stream generation ----------------
+
+def generate_stream(rates, duration, seed):
+    """
+    Return a time-ordered list of events:
+        {"t": seconds from start, "source": "software" | "browser", "type": str, "data": dict}
+    Each event type is an independent Poisson process at its configured rate.
+    """
+    rng = random.Random(seed)
+    events = []
+    for event_type, rate in rates.items():
+        if rate <= 0:
+            continue
+        t = rng.expovariate(rate)
+        state = {"x": 960, "y": 540, "app": rng.choice(APPS), "focus_t": 0.0, "tab": 1}
+        while t < duration:
+            events.append(make_event(rng, event_type, t, state))
+            t += rng.expovariate(rate)
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def make_event(rng, event_type, t, state):
+    if event_type == "Keyboard":
+        # Rows are stamped at release; the simulated clock doubles as the monotonic clock
+        interval = max(0.02, rng.gauss(0.11, 0.03))
+        data = {"key": rng.choice(KEYS), "key_interval": interval,
+                "press_ns": int((t - interval) * 1e9), "event_ns": int(t * 1e9)}
+    elif event_type == "Click":
+        state["x"] = min(1919, max(0, state["x"] + int(rng.gauss(0, 250))))
+        state["y"] = min(1079, max(0, state["y"] + int(rng.gauss(0, 150))))
+        interval = max(0.03, rng.gauss(0.12, 0.04))
+        data = {
+            "click_type": rng.choice(["Button.left"] * 9 + ["Button.right"]),
+            "click_interval": interval,
+            "position": [state["x"], state["y"]],
+            "press_ns": int((t - interval) * 1e9), "event_ns": int(t * 1e9),
+        }
+    elif event_type == "Scroll":
+        interval = rng.expovariate(4.0)
+        data = {
+            "scroll_direction": rng.choice(["Up", "Down", "Down"]),
+            "scroll_speed": 1 / interval if interval > 0 else 0,
+            "scroll_interval": interval,
+        }
+    elif event_type == "App in Focus":
+        data = {"title": state["app"], "duration": t - state["focus_t"]}
+        state["app"] = rng.choice([app for app in APPS if app != state["app"]])
+        state["focus_t"] = t
+    elif event_type == "PC Usage":
+        data = {"cpu_usage": round(rng.uniform(2, 60), 1), "memory_usage": round(rng.uniform(30, 80), 1)}
+    elif event_type == "browser":
+        return {"t": t, "source": "browser", "type": "browser", "data": make_browser_event(rng, t, state)}
+    else:
+        raise ValueError(f"Unknown event type: {event_type}")
+    return {"t": t, "source": "software", "type": event_type, "data": data}
+
+
+def make_browser_event(rng, t, state):
+    """Payloads shaped like the ones SBM/content.js and SBM/background.js post."""
+    site = rng.choice(SITES)
+    url = f"https://{site}/page/{rng.randint(1, 50)}"
+    action = rng.choice(["key_press"] * 6 + ["mouse_click"] * 3 + ["log_tab_switch", "save_activity"])
+    data = {"action": action, "url": url, "timestamp": sim_time(t).isoformat()}
+    if action == "key_press":
+        data["key_pressed"] = rng.choice("abcdefghijklmnopqrstuvwxyz ")
+    elif action == "mouse_click":
+        data.update({"x": rng.randint(0, 1280), "y": rng.randint(0, 800), "interactive_element": rng.choice(["A", "BUTTON", "DIV", "INPUT"])})
+    elif action == "log_tab_switch":
+        state["tab"] += 1
+        data.update({"domain": site, "tab_id": state["tab"], "window_id": 1})
+    else:
+        data.update({"entry_time": sim_time(max(0.0, t - 20)).isoformat(), "exit_time": sim_time(t).isoformat()})
+    return data
+
+
+def save_stream(events, path):
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def load_stream(path):
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def sim_time(t):
+    return REPLAY_START + timedelta(seconds=t)
+
+
+# ---------------- Replay ----------------
+
+class StageTimer:
+    """Accumulates wall-clock samples and process CPU time for one stage."""
+
+    def __init__(self):
+        self.samples = []
+        self.cpu = 0.0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self._wall)
+        self.cpu += time.process_time() - self._cpu
+        return False
+
+    def summary(self):
+        import numpy as np
+
+        if not self.samples:
+            return {"count": 0}
+        samples = np.asarray(self.samples)
+        return {
+            "count": int(samples.size),
+            "wall_s": float(samples.sum()),
+            "cpu_s": self.cpu,
+            "p50_ms": float(np.percentile(samples, 50) * 1000),
+            "p99_ms": float(np.percentile(samples, 99) * 1000),
+            "max_ms": float(samples.max() * 1000),
+        }
+
+
+def db_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal", path + "-journal") if os.path.exists(p))
+
+
+def load_flask_server():
+    spec = importlib.util.spec_from_file_location("flask_server", os.path.join(REPO_ROOT, "SBM", "flask_server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def replay(events, duration, speed=0.0):
+    """
+    Replay events through the pipeline and return the benchmark report.
+    speed is the simulated-seconds-per-wall-second pacing; 0 replays as fast as possible.
+    Must run after the home directory has been redirected (see main()).
+    """
+    import model
+    import storage
+    import window_features
+    from scoring import predict_normal
+
+    storage.init_databases()
+    flask_server = load_flask_server() if any(e["source"] == "browser" for e in events) else None
+
+    detector = model.IntrusionDetector()
+    detector.load_model()
+
+    stages = {name: StageTimer() for name in ("store", "store_browser", "fetch", "features", "score", "window")}
+    verdicts = []
+    sizes_before = {"soft_activity": db_size(storage.ACTIVITY_DB_PATH)}
+    if flask_server:
+        sizes_before["tab_activity"] = db_size(flask_server.DB_PATH)
+
+    def score_window(end):
+        with stages["window"]:
+            end_ms = storage.epoch_ms(end)
+            with stages["fetch"]:
+                window = window_features.window_aggregate(end_ms - WINDOW_SECONDS * 1000, end_ms + 1)
+            with stages["features"]:
+                features = window.extended_features(WINDOW_SECONDS, window_features.context())
+            with stages["score"]:
+                verdicts.append(bool(predict_normal(detector.clf, [features])[0]))
+
+    wall_start = time.perf_counter()
+    next_window = WINDOW_SECONDS
+    for event in events:
+        while event["t"] >= next_window:
+            score_window(sim_time(next_window))
+            next_window += WINDOW_SECONDS
+        if speed > 0:
+            delay = event["t"] / speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        if event["source"] == "browser":
+            with stages["store_browser"]:
+                flask_server.insert_activity(event["data"])
+        else:
+            timestamp = sim_time(event["t"]).strftime(storage.TIMESTAMP_FORMAT)
+            with stages["store"]:
+                storage.insert_event(event["type"], timestamp=timestamp, **event["data"])
+    while next_window <= duration:
+        score_window(sim_time(next_window))
+        next_window += WINDOW_SECONDS
+    wall_total = time.perf_counter() - wall_start
+
+    sizes_after = {"soft_activity": db_size(storage.ACTIVITY_DB_PATH)}
+    if flask_server:
+        sizes_after["tab_activity"] = db_size(flask_server.DB_PATH)
+
+    stored = len(stages["store"].samples) + len(stages["store_browser"].samples)
+    store_wall = sum(stages["store"].samples) + sum(stages["store_browser"].samples)
+    return {
+        "events": len(events),
+        "simulated_s": duration,
+        "wall_s": wall_total,
+        "acceleration": duration / wall_total if wall_total else None,
+        "events_per_s": len(events) / wall_total if wall_total else None,
+        "store_events_per_s": stored / store_wall if store_wall else None,
+        "windows": len(verdicts),
+        "normal_windows": sum(verdicts),
+        "db_bytes_before": sizes_before,
+        "db_bytes_after": sizes_after,
+        "db_bytes_per_event": {
+            name: (sizes_after[name] - sizes_before[name]) / max(1, stored) for name in sizes_after
+        },
+        "stages": {name: timer.summary() for name, timer in stages.items()},
+    }
+
+
+# ---------------- CLI ----------------
+
+def redirect_home():
+    """Point HOME/USERPROFILE at a fresh directory before any repo module is imported."""
+    home = tempfile.mkdtemp(prefix="sbm-replay-")
+    for sub in ("Documents", "documents"):
+        os.makedirs(os.path.join(home, sub), exist_ok=True)
+    os.environ["HOME"] = home
+    os.environ["USERPROFILE"] = home
+    # The shipped model is in the repository root, not the working directory
+    os.environ.setdefault("SBM_MODEL_DIR", REPO_ROOT)
+    return home
+
+
+def run_isolated(events, duration, speed):
+    """Run one replay in a subprocess so every case starts from empty databases."""
+    import subprocess
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+        stream_path = f.name
+    save_stream(events, stream_path)
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--stream", stream_path,
+             "--duration", str(duration), "--speed", str(speed), "--quiet-json"],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        os.remove(stream_path)
+
+
+def print_report(name, report):
+    print(f"\n=== {name}: {report['events']} events, {report['simulated_s']:.0f}s simulated, "
+          f"{report['windows']} windows ({report['normal_windows']} normal) ===")
+    print(f"wall {report['wall_s']:.2f}s  x{report['acceleration']:.0f} real time  "
+          f"{report['events_per_s']:.0f} events/s end-to-end  {report['store_events_per_s']:.0f} events/s stored")
+    for db, per_event in report["db_bytes_per_event"].items():
+        print(f"{db}: {report['db_bytes_before'][db]} -> {report['db_bytes_after'][db]} bytes ({per_event:.0f} B/event)")
+    print(f"{'stage':<14}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'wall s':>10}{'cpu s':>10}")
+    for stage, s in report["stages"].items():
+        if s["count"]:
+            print(f"{stage:<14}{s['count']:>8}{s['p50_ms']:>10.3f}{s['p99_ms']:>10.3f}"
+                  f"{s['max_ms']:>10.3f}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic activity through the detection pipeline")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="office")
+    parser.add_argument("--suite", action="store_true", help="Run every preset, each against fresh databases")
+    parser.add_argument("--stream", help="Replay events from a JSONL stream instead of generating them")
+    parser.add_argument("--save-stream", help="Write the generated stream to this JSONL file")
+    parser.add_argument("--duration", type=float, default=300, help="Simulated seconds")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="Multiply every preset rate")
+    parser.add_argument("--speed", type=float, default=0.0, help="Simulated seconds per wall second (0 = unpaced)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the report(s) to this file")
+    parser.add_argument("--quiet-json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+
+    if args.suite:
+        reports = {}
+        for name in sorted(PRESETS):
+            rates = {k: v * args.rate_scale for k, v in PRESETS[name].items()}
+            events = generate_stream(rates, args.duration, args.seed)
+            reports[name] = run_isolated(events, args.duration, args.speed)
+            print_report(name, reports[name])
+    else:
+        if args.stream:
+            events = load_stream(args.stream)
+            name = os.path.basename(args.stream)
+        else:
+            rates = {k: v * args.rate_scale for k, v in PRESETS[args.preset].items()}
+            events = generate_stream(rates, args.duration, args.seed)
+            name = args.preset
+        if args.save_stream:
+            save_stream(events, args.save_stream)
+        redirect_home()
+        report = replay(events, args.duration, args.speed)
+        if args.quiet_json:
+            # Machine-readable output for run_isolated(); everything else goes to stderr
+            sys.stdout.flush()
+            print(json.dumps(report))
+            return
+        reports = {name: report}
+        print_report(name, report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"seed": args.seed, "duration": args.duration, "reports": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
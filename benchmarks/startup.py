@@ -0,0 +1,156 @@
+"""
+Startup benchmark for ui.py.
+
+Measures, in fresh interpreter processes:
+  * the `python -X importtime -c "import ui"` profile (total and the slowest
+    modules imported directly by ui)
+  * time-to-first-paint: interpreter start -> first Paint event on MainUI
+
+Runs headless (QT_QPA_PLATFORM=offscreen) against a throwaway home directory
+that already holds an authenticator key, so no enrollment dialog is shown.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--top 15] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_PAINT_SNIPPET = r"""
+import time
+t0 = time.perf_counter()
+import sys
+from PyQt6.QtCore import QObject, QEvent, QTimer
+from PyQt6.QtWidgets import QApplication
+import ui
+t_import = time.perf_counter()
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint and not hasattr(self, "t_paint"):
+            self.t_paint = time.perf_counter()
+            QTimer.singleShot(0, app.quit)
+        return False
+
+app = QApplication(sys.argv)
+window = ui.MainUI()
+# Background services start after the first paint; they are not part of this measurement
+window.start_background_services = lambda: None
+watcher = FirstPaint()
+window.installEventFilter(watcher)
+window.show()
+QTimer.singleShot(10000, app.quit)
+app.exec()
+print(f"{t_import - t0} {getattr(watcher, 't_paint', float('nan')) - t0}")
+"""
+
+
+def bench_env(home):
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["USERPROFILE"] = home
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def make_home():
+    home = tempfile.mkdtemp(prefix="sbm-startup-")
+    documents = os.path.join(home, "Documents")
+    os.makedirs(documents, exist_ok=True)
+    with open(os.path.join(documents, "auth_key.txt"), "w") as f:
+        f.write("JBSWY3DPEHPK3PXP")
+    return home
+
+
+def parse_importtime(stderr):
+    """
+    Return (total_us, [(cumulative_us, module)]) where total_us sums the
+    top-level imports and the list holds the modules imported directly by them.
+    """
+    total_us = 0
+    direct = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        # One leading space, then two more per nesting level
+        depth = (len(raw_name) - len(raw_name.lstrip(" ")) - 1) // 2
+        if depth == 0:
+            total_us += int(cumulative_us)
+        elif depth == 1:
+            direct.append((int(cumulative_us), raw_name.strip()))
+    return total_us, direct
+
+
+def run_importtime(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import ui"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import ui failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def run_first_paint(env):
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_PAINT_SNIPPET],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"first paint run failed:\n{result.stderr[-2000:]}")
+    import_s, paint_s = result.stdout.strip().splitlines()[-1].split()
+    return float(import_s), float(paint_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ui.py import time and time-to-first-paint")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports of ui to list")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    home = make_home()
+    env = bench_env(home)
+
+    import_totals = []
+    slowest = {}
+    for _ in range(args.runs):
+        total_us, modules = run_importtime(env)
+        import_totals.append(total_us / 1e6)
+        for us, name in modules:
+            slowest.setdefault(name, []).append(us / 1e6)
+
+    paints = [run_first_paint(env) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "import_ui_s": statistics.median(import_totals),
+        "ui_module_import_s": statistics.median(p[0] for p in paints),
+        "time_to_first_paint_s": statistics.median(p[1] for p in paints),
+        "slowest_imports_s": dict(sorted(
+            ((name, statistics.median(times)) for name, times in slowest.items()),
+            key=lambda item: item[1], reverse=True
+        )[:args.top]),
+    }
+
+    print(f"import ui (-X importtime): {report['import_ui_s'] * 1000:.1f} ms")
+    print(f"time to first paint:       {report['time_to_first_paint_s'] * 1000:.1f} ms")
+    print("slowest imports pulled in by ui:")
+    for name, seconds in report["slowest_imports_s"].items():
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
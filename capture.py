@@ -0,0 +1,83 @@
+"""
+Platform capture layer: input listeners and window/process lookups.
+
+Everything platform-specific (pynput, pygetwindow, win32gui/win32process,
+xdotool/wmctrl) is imported on first use, so the scoring side of the project
+never pays for it and can run on a headless Linux box.
+"""
+import platform
+import subprocess
+
+SYSTEM = platform.system()  # "Windows", "Linux", "Darwin"
+
+
+def create_listeners(on_press, on_release, on_click, on_scroll, on_move):
+    """Return (keyboard_listener, mouse_listener); neither is started."""
+    from pynput import keyboard, mouse
+
+    keyboard_listener = keyboard.Listener(on_press=on_press, on_release=on_release)
+    mouse_listener = mouse.Listener(on_click=on_click, on_scroll=on_scroll, on_move=on_move)
+    return keyboard_listener, mouse_listener
+
+
+def get_active_window_title():
+    """Return the title of the active window, or None."""
+    if SYSTEM == "Windows":
+        import pygetwindow as gw
+        active_window = gw.getActiveWindow()
+        return active_window.title if active_window else None
+    if SYSTEM == "Linux":
+        result = subprocess.run(['xdotool', 'getactivewindow', 'getwindowname'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode == 0:
+            return result.stdout.strip()
+    return None
+
+
+def get_all_window_titles():
+    """Return a list of titles for all open windows."""
+    titles = []
+    if SYSTEM == "Windows":
+        import pygetwindow as gw
+        titles = [w.title for w in gw.getAllWindows() if w.title]
+    elif SYSTEM == "Linux":
+        result = subprocess.run(['wmctrl', '-l'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                parts = line.split(None, 3)
+                if len(parts) == 4:
+                    titles.append(parts[3])
+    return titles
+
+
+def get_foreground_window_id():
+    """Return the id of the foreground window (HWND / X11 window id), or None."""
+    if SYSTEM == "Windows":
+        import win32gui
+        return win32gui.GetForegroundWindow() or None
+    if SYSTEM == "Linux":
+        result = subprocess.run(['xdotool', 'getactivewindow'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode == 0 and result.stdout.strip().isdigit():
+            return int(result.stdout.strip())
+    return None
+
+
+def get_window_pid(window_id):
+    """Return the process id owning a window, or None."""
+    if SYSTEM == "Windows":
+        import win32process
+        _, pid = win32process.GetWindowThreadProcessId(window_id)
+        return pid or None
+    if SYSTEM == "Linux":
+        result = subprocess.run(['xdotool', 'getwindowpid', str(window_id)],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode == 0 and result.stdout.strip().isdigit():
+            return int(result.stdout.strip())
+    return None
+
+
+def get_foreground_pid():
+    """Return the process id owning the foreground window, or None."""
+    window_id = get_foreground_window_id()
+    return get_window_pid(window_id) if window_id is not None else None
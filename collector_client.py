@@ -0,0 +1,65 @@
+"""
+Agent side of the central collector (SBM/collector_server.py).
+
+Set SBM_COLLECTOR_URL (e.g. http://127.0.0.1:5001) to have IntrusionDetector
+send feature windows to the collector instead of scoring them locally.
+Windows are pushed as gzip-compressed JSON batches; only feature vectors are
+sent, never raw events.
+"""
+import gzip
+import json
+import logging
+import os
+import urllib.request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+COLLECTOR_URL = os.environ.get("SBM_COLLECTOR_URL", "")
+
+PUSH_SECONDS = metrics.histogram("sbm_collector_push_seconds", "Round trip of one batch to the collector")
+PUSH_ERRORS = metrics.counter("sbm_collector_push_errors_total", "Batches the collector could not score")
+
+
+class CollectorError(Exception):
+    pass
+
+
+class CollectorClient:
+    def __init__(self, url=None, profile_key=None, timeout=10):
+        import profiles
+
+        self.url = (url or COLLECTOR_URL).rstrip("/") + "/score_windows"
+        self.profile_key = profile_key or profiles.current_profile().key
+        self.timeout = timeout
+        self.pending = []
+
+    def add(self, start, features):
+        """Queue one window; it is sent with the next flush()."""
+        self.pending.append({"start": start, "features": [float(value) for value in features]})
+
+    def flush(self):
+        """Send the queued windows and return their verdicts [{"start", "score", "normal", "explanation"}, ...]."""
+        if not self.pending:
+            return []
+        windows, self.pending = self.pending, []
+        return self.score(windows)
+
+    def score(self, windows):
+        body = gzip.compress(json.dumps({"profile": self.profile_key, "windows": windows}).encode())
+        req = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        })
+        try:
+            with PUSH_SECONDS.time(), urllib.request.urlopen(req, timeout=self.timeout) as response:
+                reply = json.loads(response.read())
+        except (OSError, ValueError) as e:
+            PUSH_ERRORS.inc()
+            raise CollectorError(f"Collector at {self.url} unavailable: {e}") from e
+
+        if not reply.get("success"):
+            PUSH_ERRORS.inc()
+            raise CollectorError(reply.get("error", "collector rejected the batch"))
+        return reply["verdicts"]
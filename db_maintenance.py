@@ -0,0 +1,153 @@
+"""
+SQLite maintenance for databases with continuous inserts and deletes.
+
+soft_activity.sqlite gets a row per input event and loses everything older
+than 15 minutes every minute. Left alone the deletes scan the whole table
+and the freed pages pile up on the freelist. This module:
+
+  * switches a database to WAL with synchronous=NORMAL, a bounded WAL file
+    (journal_size_limit) and auto_vacuum=INCREMENTAL
+  * deletes expired rows through the epoch_ms index in bounded batches, so
+    a big backlog never holds the write lock for long
+  * returns free pages with incremental_vacuum and checkpoints the WAL on a
+    schedule (Maintainer.run(), called from periodic_maintenance)
+  * reports file size, WAL size and freelist fragmentation as metrics
+"""
+import logging
+import os
+import sqlite3
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SIZE_LIMIT = 16 * 1024 * 1024   # WAL is truncated back to this after checkpoints
+DELETE_BATCH = 2000                     # rows per delete transaction
+VACUUM_PAGES = 512                      # pages returned per incremental_vacuum call
+FREELIST_VACUUM_RATIO = 0.10            # vacuum once this share of the file is free pages
+TRUNCATE_EVERY = 10                     # every Nth checkpoint also truncates the WAL file
+
+MAINTENANCE_SECONDS = metrics.histogram("sbm_db_maintenance_seconds", "One maintenance pass over a database")
+ROWS_DELETED = metrics.counter("sbm_db_rows_deleted_total", "Expired rows deleted in batches")
+
+
+def configure(conn):
+    """Per-connection settings; call on every new connection."""
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA journal_size_limit={JOURNAL_SIZE_LIMIT}")
+    conn.execute("PRAGMA busy_timeout=5000")
+
+
+def prepare(path):
+    """
+    Put a database into WAL + incremental auto-vacuum mode. Switching an
+    existing file to incremental auto-vacuum needs one full VACUUM, done here
+    once; afterwards this is only a couple of PRAGMA reads.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        configure(conn)  # busy_timeout: the VACUUM waits for concurrent writers
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+def delete_before(conn, table, cutoff_ms, max_id=None, batch=DELETE_BATCH):
+    """
+    Delete rows with epoch_ms < cutoff_ms (and id <= max_id, if given) in
+    batches of `batch`, committing after each. Returns the number deleted.
+    """
+    condition = "epoch_ms < ?" + (" AND id <= ?" if max_id is not None else "")
+    params = (cutoff_ms,) + ((max_id,) if max_id is not None else ())
+    deleted = 0
+    while True:
+        cursor = conn.execute(f"""
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM {table} WHERE {condition} LIMIT {batch}
+            )
+        """, params)
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch:
+            break
+    ROWS_DELETED.inc(deleted)
+    return deleted
+
+
+def stats(path):
+    """Size and fragmentation of one database file."""
+    conn = sqlite3.connect(path)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+    wal_path = path + "-wal"
+    return {
+        "file_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist,
+        "freelist_ratio": freelist / page_count if page_count else 0.0,
+    }
+
+
+class Maintainer:
+    """
+    Checkpoint, vacuum and report on a set of databases, one pass per run().
+    Databases are prepare()d on the first pass, on the maintenance thread,
+    since the one-time VACUUM of a large file takes a while.
+    """
+
+    def __init__(self, paths):
+        self.paths = dict(paths)  # metric name -> file path
+        self.prepared = set()     # paths prepare() has succeeded on
+        self.passes = 0
+        self.gauges = {
+            name: (
+                metrics.gauge(f"sbm_db_{name}_bytes", f"{name} database file size"),
+                metrics.gauge(f"sbm_db_{name}_wal_bytes", f"{name} WAL file size"),
+                metrics.gauge(f"sbm_db_{name}_freelist_ratio", f"Share of {name} pages on the freelist"),
+            )
+            for name in self.paths
+        }
+
+    def run(self):
+        """One maintenance pass. Returns {name: stats} after the pass."""
+        self.passes += 1
+        mode = "TRUNCATE" if self.passes % TRUNCATE_EVERY == 0 else "PASSIVE"
+        report = {}
+        for name, path in self.paths.items():
+            with MAINTENANCE_SECONDS.time():
+                try:
+                    if path not in self.prepared:
+                        prepare(path)
+                        self.prepared.add(path)
+                    report[name] = self.maintain(path, mode)
+                except sqlite3.Error as e:
+                    logger.warning(f"Maintenance of {path} failed: {e}")
+                    continue
+            size, wal, ratio = self.gauges[name]
+            size.set(report[name]["file_bytes"])
+            wal.set(report[name]["wal_bytes"])
+            ratio.set(report[name]["freelist_ratio"])
+            logger.debug(f"{name}: {report[name]}")
+        return report
+
+    def maintain(self, path, checkpoint_mode="PASSIVE"):
+        before = stats(path)
+        conn = sqlite3.connect(path)
+        try:
+            configure(conn)
+            if before["freelist_ratio"] >= FREELIST_VACUUM_RATIO:
+                # executescript steps the pragma to completion; execute() frees a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            conn.execute(f"PRAGMA wal_checkpoint({checkpoint_mode})").fetchone()
+        finally:
+            conn.close()
+        return stats(path)
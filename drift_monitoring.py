@@ -0,0 +1,121 @@
+"""
+Live concept-drift monitoring of the 30-second windows.
+
+window_features.fill() hands every live window's features and score to
+observe(), which runs them through a scoring.drift.DriftMonitor whose
+reference is the profile's training windows (intrusion_model_drift.npz,
+rebuilt by build_reference() whenever the models are refitted). Drift
+events are logged, counted and passed to the callbacks registered with
+on_drift(); the activity monitor uses that to re-baseline and retrain in
+the background.
+
+Per-feature PSI is exported as sbm_drift_psi_<feature> gauges, so the
+metrics endpoint shows which features drifted.
+
+Usage:
+    python drift_monitoring.py   # rebuild the reference and print it
+"""
+import logging
+import threading
+
+import metrics
+import profiles
+from scoring import DEFAULT_WINDOW_SECONDS, EXTENDED_FEATURE_NAMES
+from scoring.drift import DriftMonitor, drift_filename
+
+logger = logging.getLogger(__name__)
+
+DRIFT_SCALE = DEFAULT_WINDOW_SECONDS
+MIN_REFERENCE_WINDOWS = 20
+
+DRIFT_EVENTS = metrics.counter("sbm_drift_events_total", "Drift events (feature PSI or score shifts)")
+DRIFTED_FEATURES = metrics.gauge("sbm_drifted_features", "Features whose live distribution has drifted")
+FEATURE_PSI = {name: metrics.gauge(f"sbm_drift_psi_{name}", f"Population stability index of {name}")
+               for name in EXTENDED_FEATURE_NAMES}
+
+_monitor = None
+_loaded = False
+_lock = threading.Lock()
+_listeners = []
+
+
+def drift_path(profile=None):
+    return drift_filename(profiles.own_model_path(profile))
+
+
+def build_reference(profile=None):
+    """Fit the reference to the training windows and save it. Returns the monitor, or None."""
+    import model
+
+    features = model.IntrusionDetector(profile, DRIFT_SCALE).train()
+    if len(features) < MIN_REFERENCE_WINDOWS:
+        logger.info(f"No drift reference: {len(features)} training windows, need {MIN_REFERENCE_WINDOWS}")
+        return None
+    monitor = DriftMonitor.from_reference(features, EXTENDED_FEATURE_NAMES)
+    monitor.save(drift_path(profile))
+    reset()
+    return monitor
+
+
+def reset():
+    """Forget the live monitor; the next observe() reloads the reference."""
+    global _monitor, _loaded
+    with _lock:
+        _monitor = None
+        _loaded = False
+
+
+def on_drift(callback):
+    """Call callback(events) with the DriftEvents of each window that drifts."""
+    _listeners.append(callback)
+
+
+def _load():
+    global _monitor, _loaded
+    _loaded = True
+    try:
+        _monitor = DriftMonitor.load(drift_path())
+        if _monitor.feature_names != EXTENDED_FEATURE_NAMES:
+            raise ValueError("built for another feature vector; rebuilt at the next retrain")
+    except FileNotFoundError:
+        _monitor = None
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Drift reference unusable: {e}")
+        _monitor = None
+
+
+def observe(scale, features, scores):
+    """Feed one fill's windows of `scale` (features rows, scores or None) to the monitor."""
+    if scale != DRIFT_SCALE:
+        return
+    with _lock:
+        if not _loaded:
+            _load()
+        if _monitor is None:
+            return
+        events = []
+        for row, score in zip(features, scores):
+            events.extend(_monitor.update(row, score))
+        for name, psi in zip(_monitor.feature_names, _monitor.psi.tolist()):
+            if name in FEATURE_PSI:
+                FEATURE_PSI[name].set(psi)
+        DRIFTED_FEATURES.set(int(_monitor.drifted.sum()))
+    if not events:
+        return
+    DRIFT_EVENTS.inc(len(events))
+    logger.warning("Drift detected: " + ", ".join(f"{e.feature} ({e.kind} {e.statistic:.2f})" for e in events))
+    for callback in _listeners:
+        try:
+            callback(events)
+        except Exception as e:
+            logger.error(f"Drift callback failed: {e}")
+
+
+if __name__ == "__main__":
+    metrics.configure_logging()
+    monitor = build_reference()
+    if monitor is None:
+        print("Not enough training windows for a drift reference")
+    else:
+        for name, edges in zip(monitor.feature_names, monitor.edges):
+            print(f"{name:>22}: " + " ".join(f"{edge:.3g}" for edge in edges))
@@ -0,0 +1,100 @@
+"""
+Train the autoencoder that is ensembled with the IsolationForest.
+
+The autoencoder (scoring.autoencoder) learns the profile's 30-second
+training windows, as IntrusionDetector.train() returns them: the stored
+windows since the first 10 minutes were recorded, at most
+model.TRAINING_DAYS back. The ensemble's spreads are then calibrated on the same windows
+against the forest the profile is scored with. Both are saved next to the
+profile's own model (intrusion_model_autoencoder.npz,
+intrusion_model_ensemble.npz), so profiles that share the fallback forest
+keep their own autoencoder; profiles.models loads them from there, and
+the stored windows are re-scored with the new ensemble.
+
+The first 10 minutes give about 20 windows, so MIN_WINDOWS is derived from
+that. train_if_stale() waits until that many windows are stored.
+
+Usage:
+    python ensemble_training.py [--weight 1.0] [--epochs 60]
+"""
+import argparse
+import logging
+import os
+import time
+
+import metrics
+import model
+import profiles
+import storage
+import window_features
+from scoring import (
+    DEFAULT_WINDOW_SECONDS, Autoencoder, EnsembleDetector, autoencoder_filename, ensemble_filename, load_pipeline
+)
+
+logger = logging.getLogger(__name__)
+
+TRAINING_SECONDS = 10 * 60  # activity copied to the training database (ActivityMonitor.copy_first_10_minutes)
+# Half the windows of the first 10 minutes; with fewer the forest scores alone
+MIN_WINDOWS = TRAINING_SECONDS // DEFAULT_WINDOW_SECONDS // 2
+AUTOENCODER_WEIGHT = 1.0    # relative to the forest's weight of 1
+TRAIN_EVERY_SECONDS = 24 * 3600
+
+TRAIN_SECONDS = metrics.histogram("sbm_autoencoder_training_seconds", "Time to train the autoencoder ensemble")
+TRAINING_WINDOWS = metrics.gauge("sbm_autoencoder_training_windows", "Windows the autoencoder was trained on")
+
+
+def ensemble_path(profile=None):
+    return ensemble_filename(profiles.own_model_path(profile))
+
+
+def train(profile=None, weight=AUTOENCODER_WEIGHT, epochs=60):
+    """Fit the autoencoder, calibrate the ensemble and save both. Returns the ensemble, or None."""
+    with TRAIN_SECONDS.time():
+        features = model.IntrusionDetector(profile).train()
+        if len(features) < MIN_WINDOWS:
+            logger.info(f"Not training the autoencoder: {len(features)} windows, need {MIN_WINDOWS}")
+            return None
+        forest = load_pipeline(profiles.model_path(profile))
+        features = features[:, :forest.n_features_in_]  # the autoencoder reads the forest's columns
+        # A few training windows still give a few hundred Adam steps
+        autoencoder = Autoencoder.fit(features, epochs=epochs, batch_size=min(64, max(8, len(features) // 4)))
+        ensemble = EnsembleDetector({"forest": forest, "autoencoder": autoencoder},
+                                    {"forest": 1.0, "autoencoder": weight}).calibrate(features)
+    own_path = profiles.own_model_path(profile)
+    autoencoder.save(autoencoder_filename(own_path))
+    ensemble.save(ensemble_filename(own_path))
+    profiles.models.invalidate(profile)
+    window_features.rescore(profiles.models.get(profile), DEFAULT_WINDOW_SECONDS)
+    TRAINING_WINDOWS.set(len(features))
+    logger.info(f"Trained the autoencoder on {len(features)} windows")
+    return ensemble
+
+
+def train_if_stale(profile=None):
+    """
+    Retrain once the saved ensemble is more than a day old, as soon as
+    MIN_WINDOWS training windows are stored.
+    """
+    path = ensemble_path(profile)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < TRAIN_EVERY_SECONDS:
+        return None
+    training_range = model.IntrusionDetector(profile).training_range()
+    if training_range is None:
+        return None
+    if storage.window_counts(DEFAULT_WINDOW_SECONDS, storage.epoch_ms(training_range[0]))[0] < MIN_WINDOWS:
+        return None
+    return train(profile)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the autoencoder ensembled with the IsolationForest")
+    parser.add_argument("--weight", type=float, default=AUTOENCODER_WEIGHT,
+                        help="Autoencoder weight relative to the forest")
+    parser.add_argument("--epochs", type=int, default=60)
+    args = parser.parse_args()
+    metrics.configure_logging()
+    trained = train(weight=args.weight, epochs=args.epochs)
+    if trained is None:
+        print("Not enough training windows")
+    else:
+        print(f"spreads: {trained.spreads}  weights: {trained.weights}")
@@ -3,25 +3,18 @@ import time
 import platform
 import subprocess
 import psutil
-import sqlite3
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from PyQt6.QtWidgets import QInputDialog, QWidget
 from PyQt6.QtCore import QThread, pyqtSignal, QTimer
 from threading import Lock
 import pyotp
-
-# Define SQLite Database Path
-DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "activity.sqlite")
+import storage
 
 
 def get_locked_files():
     """Fetch locked files from the SQLite database."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM blocked_items")
-        locked_files = [row[0] for row in cursor.fetchall()]
-    return locked_files
+    return storage.blocked_items()
 
 
 class FileAccessMonitor(FileSystemEventHandler):
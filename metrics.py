@@ -0,0 +1,279 @@
+"""
+Lightweight in-process metrics and logging setup.
+
+Counters, gauges and histograms are registered by name at import time and
+updated from the hot paths. Collection is off unless SBM_METRICS=1 (or
+enable() is called); while off every update is a single flag check and
+Histogram.time() hands back a shared no-op context manager.
+
+Export:
+  * SBM_METRICS_PORT=9464   serve Prometheus text on http://127.0.0.1:<port>/metrics
+  * SBM_METRICS_JSON=path   dump a JSON snapshot every SBM_METRICS_INTERVAL seconds (default 60)
+
+Logging:
+  * SBM_LOG_LEVEL=DEBUG|INFO|WARNING|ERROR|OFF   (default WARNING)
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _State:
+    enabled = os.environ.get("SBM_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def enable(flag=True):
+    _State.enabled = flag
+
+
+def is_enabled():
+    return _State.enabled
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not _State.enabled:
+            return
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self):
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value):
+        if not _State.enabled:
+            return
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self):
+        return [f"{self.name} {self.value}"]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        if not _State.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes the elapsed wall time in seconds."""
+        if not _State.enabled:
+            return _NOOP_TIMER
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding it."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+    def prometheus(self):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def _register(cls, name, help_text, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = cls(name, help_text, **kwargs)
+            _registry[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name, help_text=""):
+    return _register(Counter, name, help_text)
+
+
+def gauge(name, help_text=""):
+    return _register(Gauge, name, help_text)
+
+
+def histogram(name, help_text="", buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help_text, buckets=buckets)
+
+
+def snapshot():
+    """Return {metric name: value} for every registered metric."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        if metric.help:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.prometheus())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- Exporters ----------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(port=9464, host="127.0.0.1"):
+    """Serve /metrics on a local port from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_json_dump(path, interval=60):
+    """Write a JSON snapshot to path every interval seconds from a daemon thread."""
+    def dump_loop():
+        while True:
+            time.sleep(interval)
+            write_json(path)
+
+    thread = threading.Thread(target=dump_loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def write_json(path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"timestamp": time.time(), "metrics": snapshot()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_exporters():
+    """Start whichever exporters the SBM_METRICS_* environment variables ask for."""
+    port = os.environ.get("SBM_METRICS_PORT")
+    json_path = os.environ.get("SBM_METRICS_JSON")
+    if port or json_path:
+        enable()
+    if port:
+        serve_prometheus(int(port))
+    if json_path:
+        start_json_dump(json_path, float(os.environ.get("SBM_METRICS_INTERVAL", "60")))
+
+
+def configure_logging(level=None):
+    """Configure root logging from SBM_LOG_LEVEL (default WARNING; OFF disables logging)."""
+    level = (level or os.environ.get("SBM_LOG_LEVEL", "WARNING")).upper()
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
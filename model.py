@@ -1,211 +1,54 @@
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import time
-import pynput
-from pynput.keyboard import Listener as KeyboardListener
-from pynput.mouse import Listener as MouseListener
-import threading
-import queue
-import sys
-import math
-import psutil
-import win32gui
-import win32process
-from datetime import datetime  # Import datetime here
-import ast
+# Platform-independent: window/input capture lives in capture.py and the
+# scoring code in the scoring package, so this imports cleanly on a headless box.
+import logging
 import os
-from datetime import timedelta
-import sqlite3
-import joblib
+import warnings
+from datetime import datetime, timedelta
 
-from data_formatting import extract_key_inference  # Import the data function
-from data_formatting import extract_mouse_inference  # Import the data function
-from data_formatting import extract_focus_inference
+import numpy as np
 
-ACTIVITY_DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_activity.sqlite")   
+import collector_client
+import metrics
+import profiles
+import storage
+import window_features
+from scoring import (
+    DEFAULT_WINDOW_SECONDS, EXTENDED_FEATURE_NAMES, WINDOW_SCALES, ScoringPipeline, explain, format_explanation,
+    parse_timestamp, pipeline_filename, predict_normal, scaler_filename
+)
+from scoring.windows import model_scale
+from storage import TIMESTAMP_FORMAT
+
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_INTERVAL_SECONDS = metrics.histogram("sbm_extract_interval_seconds", "Time to split the training DB into windows")
+EXTRACT_FEATURES_SECONDS = metrics.histogram("sbm_extract_features_seconds", "Time to build one window's feature vector")
+INFERENCE_SECONDS = metrics.histogram("sbm_inference_seconds", "End-to-end run_inference latency (fetch, features, score)")
+SCORE_SECONDS = metrics.histogram("sbm_score_seconds", "Model scoring latency for one window")
+EXPLAIN_SECONDS = metrics.histogram("sbm_explain_seconds", "Feature attribution latency for one window")
+WINDOWS_SCORED = metrics.counter("sbm_windows_scored_total", "Windows scored by run_inference")
+ANOMALIES = metrics.counter("sbm_anomalies_total", "Windows the model flagged as suspicious")
+FIT_SECONDS = metrics.histogram("sbm_forest_fit_seconds", "Time to fit and save a profile's IsolationForest")
+
+# IsolationForest settings for profile models, from the benchmarks/evaluate.py grid
+FOREST_PARAMS = {"n_estimators": 200, "contamination": 0.05, "random_state": 42}
+MIN_TRAINING_WINDOWS = 10  # fewer and the profile keeps scoring with the model it has
+# History models are trained on. A retrain after drift sees the drifted
+# minutes as a small part of it rather than as the whole training set.
+TRAINING_DAYS = 7
 
 class IntrusionDetector:
-    def __init__(self):
-        self.keyboard_events = []
-        self.mouse_events = []
-        self.focus_events = []
+    def __init__(self, profile=None, window_seconds=DEFAULT_WINDOW_SECONDS):
+        # Models are shared through profiles.models, so creating a detector per
+        # window does not reload the model from disk
+        self.profile = profile or profiles.current_profile()
+        self.window_seconds = window_seconds  # each window length has its own model
         self.model = None
-        self.model_filename = r"intrusion_model.joblib"
-        self.clf = None
-        self.scaler = None
-
-    def extract_features(self, duration, inference):
-        
-        if inference:
-            # self.take_data()
-            pass
-        
-        print("-"*15)
-        # print(self.keyboard_events)
-
-        # Keyboard Features
-        if not self.keyboard_events:
-            print("No keyboard events to process.")
-            keyboard_features = [0] * 5  # Return default values if no events
-        else:
-            typing_speed = len(self.keyboard_events) / duration if duration > 0 else 0
-            shortcuts = 0
-            backspace = 0
-            modifiers = {'Key.ctrl', 'Key.ctrl_l', 'Key.ctrl_r', 'Key.alt', 'Key.alt_l', 
-                        'Key.alt_r', 'Key.cmd', 'Key.shift', 'Key.shift_l', 'Key.shift_r'}
-
-            for event in self.keyboard_events:
-                if event[0] in modifiers:
-                    shortcuts += 1
-                if event[0] == 'Key.backspace':
-                    backspace += 1
-
-            values = [int(item[1]) for item in self.keyboard_events]
-            dwell_time = sum(values) / len(values) if values else 0
-
-            datetime_data = []
-            for item in self.keyboard_events:
-                timestamp_str = item[2]
-                try:
-                    timestamp_obj = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    datetime_data.append((item[0], item[1], timestamp_obj))
-                except ValueError as e:
-                    print(f"Error converting timestamp: {timestamp_str}. Error: {e}")
-                    continue
-
-            time_differences = []
-            for i in range(1, len(datetime_data)):
-                time_diff = datetime_data[i][2] - datetime_data[i-1][2]
-                time_differences.append(time_diff.total_seconds())
-
-            average_difference = sum(time_differences) / len(time_differences) if time_differences else 0
-
-            print(f"Typing rate: {typing_speed * 30}")
-            print(f"Error rate: {backspace}")
-            print(f"Special keys rate: {shortcuts}")
-            print(f"Average Dwell Time: {dwell_time}")
-            print(f"Average flight time: {average_difference}")
-
-            keyboard_features = [typing_speed, shortcuts, backspace, dwell_time, average_difference]
-
-
-        # Mouse Features
-        if not self.mouse_events:
-            print("No mouse events to process.")
-            mouse_features = [0] * 4  # Default values
-        else:
-            click_distances = []
-            mouse_speeds = []
-            double_clicks = 0
-            click_times = []
-            mouse_positions = []
-
-            for i in range(len(self.mouse_events)):
-                click_type, click_interval, position_str, timestamp_str = self.mouse_events[i]
-                
-                # Keep track of all intervals for averaging
-                mouse_intervals = []
-                if click_interval > 0:  # Only add valid intervals
-                    mouse_intervals.append(click_interval)
-
-                try:
-                    position = ast.literal_eval(position_str)
-                    x, y = position
-
-                    if i > 0:
-                        prev_position_str = self.mouse_events[i - 1][2]
-                        prev_position = ast.literal_eval(prev_position_str)
-                        x1, y1 = prev_position
-                        distance = ((x - x1)**2 + (y - y1)**2)**0.5
-                        click_distances.append(distance)
-
-                    mouse_speeds.append(distance / click_interval if click_interval > 0 and i > 0 else 0)
-
-                    click_times.append(time.time())
-                    if i > 0 and click_times[i] - click_times[i - 1] < 0.5:
-                        double_clicks += 1
-
-                    mouse_positions.append((x, time.time()))
-                    if len(mouse_positions) > 1:
-                        prev_x, prev_time = mouse_positions[-2]
-                        dx = x - prev_x
-                        time_diff = time.time() - prev_time
-                        if time_diff > 0:
-                            mouse_speeds.append(dx / time_diff)
-
-                except (SyntaxError, ValueError) as e:
-                    print(f"Error processing mouse data point {i+1}: {e}")
-                    mouse_features = [0] * 4  # Updated to 4 default values
-                    break  # Exit from the loop if there is an error
-
-            avg_click_distance = sum(click_distances) / len(click_distances) if click_distances else 0
-            avg_mouse_speed = np.mean(mouse_speeds) if mouse_speeds else 0
-            avg_mouse_interval = sum(mouse_intervals) / len(mouse_intervals) if mouse_intervals else 0
-
-            print(f"Average Click Distance: {avg_click_distance}")
-            print(f"Average Mouse Speed: {avg_mouse_speed}")
-            print(f"Double Clicks: {double_clicks}")
-            print(f"Average Mouse Interval: {avg_mouse_interval}")
-
-            mouse_features = [ avg_mouse_interval, avg_click_distance, avg_mouse_speed, double_clicks]
-
-        # Focus Features
-        transitions = []
-        previous_app = None
-
-
-        if self.focus_events is None or not self.focus_events:  # Check for None or empty
-            print("No focus events to process.")
-            focus_features = [0] * 7  # Default values
-        else:
-            durations = []
-            timestamps = []
-
-            for title, duration, timestamp_str in self.focus_events:
-
-                current_app = title
-                if previous_app and current_app != previous_app:
-                    transition = f"{previous_app}→{current_app}"
-                    transitions.append(transition)
-    
-                previous_app = current_app
-
-
-                try:
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    durations.append(duration)
-                    timestamps.append(timestamp)
-                except ValueError as e:
-                    print(f"Error converting focus timestamp: {timestamp_str}. Error: {e}")
-                    focus_features = [0] * 7 #Default Values
-                    break #Exit from the loop if there is an error
-
-            switching_rate = len(durations) - 1
-            max_duration = max(durations) if durations else 0
-            mean_duration = np.mean(durations) if durations else 0
-            total_transitions = len(transitions)              # Number of app switches
-            unique_transitions = len(set(transitions))        # Unique transition patterns
-            transition_rate = total_transitions / 30
-
-            print(f"Switching Rate: {switching_rate}")
-            print(f"Max Duration: {max_duration}")
-            print(f"Average of Duration: {mean_duration}")
-            print(f"Transition count: {total_transitions}")
-            print(f"Unique transitions: {unique_transitions}")
-            print(f"Transition rate: {transition_rate}")
-
-            focus_features = [0, 0, mean_duration, total_transitions, unique_transitions, transition_rate, 0]
-            
-        all_features = keyboard_features + mouse_features + focus_features
-        print(f"Keyboard features: {len(keyboard_features)}")  # Should be 5
-        print(f"Mouse features: {len(mouse_features)}")       # Should be 4
-        print(f"Focus features: {len(focus_features)}")       # Should be 7
-        print(f"Total features: {len(all_features)}")         # Should be 16
-
-        
-        return all_features  # Return the combined list of features
+        self.model_filename = profiles.model_path(self.profile, model_scale(window_seconds))
+        self.clf = None  # ScoringPipeline: scaler and IsolationForest
+        self.explanation = None  # features that drove the last verdict (format_explanation text)
+        self.collector = None
 
     def get_timeframe(self):
         """
@@ -213,138 +56,212 @@ class IntrusionDetector:
         Returns:
             tuple: (start_time, end_time) as datetime objects.
         """
-        conn = sqlite3.connect(ACTIVITY_DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM SOFTWARE")
-        result = cursor.fetchone()
-        conn.close()
+        result = storage.time_range(storage.ACTIVITY_DB_PATH)
 
         if result and result[0] and result[1]:
-            start_time = datetime.strptime(result[0], "%Y-%m-%d %H:%M:%S")
-            end_time = datetime.strptime(result[1], "%Y-%m-%d %H:%M:%S")
+            start_time = parse_timestamp(result[0])
+            end_time = parse_timestamp(result[1])
             return start_time, end_time
         else:
             raise ValueError("No data available in the database.")
 
     def extract_key_data(self):
-        return self._extract_data_by_interval("Keyboard", ["key", "key_interval", "timestamp"])
+        return self._extract_data_by_interval("Keyboard", ["key", "key_interval", "timestamp", "press_ns", "event_ns"])
 
     def extract_mouse_data(self):
         return self._extract_data_by_interval("Click", ["click_type", "click_interval", "position", "timestamp"])
 
     def extract_focus_data(self):
-        return self._extract_data_by_interval("App in Focus", ["duration", "timestamp"])
+        return self._extract_data_by_interval("App in Focus", [storage.FOCUS_APP_COLUMN, "duration", "timestamp"])
 
     def extract_pc_data(self):
-        return self._extract_data_by_interval("PC Usage", ["CPU Utilization", ""])
+        return self._extract_data_by_interval("PC Usage", ["cpu_usage", "memory_usage", "process_cpu", "io_bytes",
+                                                            "spawned", "duration"])
 
     def _extract_data_by_interval(self, data_type, columns):
         """
-        Extract data from the database grouped into 30-second intervals.
+        Extract data from the database grouped into window_seconds intervals.
         Ensures there are entries for all intervals, even if they are empty.
         """
-        # Open the training database
-        DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_training.sqlite")
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get the first and last timestamps for the entire database
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM SOFTWARE")
-        first_timestamp, last_timestamp = cursor.fetchone()
+        with EXTRACT_INTERVAL_SECONDS.time():
+            return self._query_intervals(data_type, columns)
 
+    def _query_intervals(self, data_type, columns):
+        # Get the first and last timestamps of the training database
+        first_timestamp, last_timestamp = storage.time_range(storage.TRAINING_DB_PATH)
         if not first_timestamp or not last_timestamp:
-            conn.close()
             return []  # Return empty list if no data exists for the given type
 
         # Convert timestamps to datetime objects
-        first_time = datetime.strptime(first_timestamp, "%Y-%m-%d %H:%M:%S")
-        last_time = datetime.strptime(last_timestamp, "%Y-%m-%d %H:%M:%S")
+        first_time = parse_timestamp(first_timestamp)
+        last_time = parse_timestamp(last_timestamp)
 
         # Initialize the loop and results
         results = []
         current_time = first_time
 
         while current_time <= last_time:
-            next_time = current_time + timedelta(seconds=30)
-
-            # Fetch records for the current 30-second interval
-            cursor.execute(f"""
-                SELECT {", ".join(columns)} FROM SOFTWARE 
-                WHERE TYPE = ? AND timestamp >= ? AND timestamp < ?;
-            """, (data_type, current_time.strftime("%Y-%m-%d %H:%M:%S"), next_time.strftime("%Y-%m-%d %H:%M:%S")))
-            
-            # Store interval data (empty or populated)
-            interval_data = cursor.fetchall()
+            next_time = current_time + timedelta(seconds=self.window_seconds)
+
+            # Fetch records for the current interval (empty or populated)
+            interval_data = storage.fetch_events(data_type, columns, current_time,
+                                                 next_time - timedelta(milliseconds=1), storage.TRAINING_DB_PATH)
             results.append(interval_data)
 
             # Move to the next interval
             current_time = next_time
 
-        conn.close()
         return results
     
+    def training_range(self, now=None):
+        """
+        (start, end) datetimes of the training windows: from the window
+        holding the first event of the training database (the first 10
+        minutes recorded) up to now, at most TRAINING_DAYS back. None before
+        anything has been copied.
+        """
+        first_ms, _ = storage.epoch_range(storage.TRAINING_DB_PATH)
+        if first_ms is None:
+            return None
+        end = now or datetime.now()
+        start = storage.EPOCH + timedelta(milliseconds=window_features.window_start(first_ms, self.window_seconds))
+        return max(start, end - timedelta(days=TRAINING_DAYS)), end
+
     def train(self):
-        # Extract the data for training
-        key_data = self.extract_key_data()
-        mouse_data = self.extract_mouse_data()
-        focus_data = self.extract_focus_data()
-
-        extracted_features = []
-
-        for k, m, f in zip(key_data, mouse_data, focus_data):
-            self.keyboard_events = k
-            self.mouse_events = m
-            self.focus_events = f
-
-            extracted_features.append(self.extract_features(inference=False))
-        
-        # print("Key Data:")
-        # for interval in key_data:
-        #     print(interval)
-        #     print()
-        # print("Mouse Data:")
-        # for interval in mouse_data:
-        #     print(interval)
-        #     print()
-        # print("Focus Data:")
-        # for interval in focus_data:
-        #     print(interval)
-        #     print()
+        """
+        Feature matrix of the training windows (training_range()), one row
+        per window_seconds window. Windows are read from the window_features
+        table; those of soft_training.sqlite not stored yet are computed
+        first.
+        """
+        window_features.backfill(storage.TRAINING_DB_PATH)
+        training_range = self.training_range()
+        if training_range is None:
+            return np.empty((0, len(EXTENDED_FEATURE_NAMES)))
+        with EXTRACT_INTERVAL_SECONDS.time():
+            _, features, _ = window_features.load(self.window_seconds, *training_range)
+        return features
+
+    def fit(self):
+        """
+        Fit a StandardScaler and IsolationForest on train() and save them as
+        the profile's own model for this window length, with the fused
+        pipeline. The registry drops the model it had and the stored windows
+        are re-scored. Returns the pipeline, or None with fewer than
+        MIN_TRAINING_WINDOWS windows.
+        """
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+        import joblib
+
+        features = self.train()
+        if len(features) < MIN_TRAINING_WINDOWS:
+            logger.info(f"Not fitting the {self.window_seconds}s forest: {len(features)} windows, "
+                        f"need {MIN_TRAINING_WINDOWS}")
+            return None
+        scale = model_scale(self.window_seconds)
+        path = profiles.own_model_path(self.profile, scale)
+        with FIT_SECONDS.time():
+            scaler = StandardScaler().fit(features)
+            scaled = scaler.transform(features)
+            scaled[~np.isfinite(scaled)] = 0.0  # as ScoringPipeline.transform imputes
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # max_samples larger than a small training set
+                clf = IsolationForest(**FOREST_PARAMS).fit(scaled)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            for target, fitted in ((scaler_filename(path), scaler), (path, clf)):
+                joblib.dump(fitted, target + ".tmp")
+                os.replace(target + ".tmp", target)
+            pipeline = ScoringPipeline.from_sklearn(clf, scaler, EXTENDED_FEATURE_NAMES[:features.shape[1]])
+            pipeline.save(pipeline_filename(path))
+        profiles.models.invalidate(self.profile, scale)
+        self.model_filename = path
+        self.clf = None
+        rescored = window_features.rescore(profiles.models.get(self.profile, scale), self.window_seconds)
+        logger.info(f"Fitted the {self.window_seconds}s forest on {len(features)} windows; "
+                    f"re-scored {rescored} stored windows")
+        return pipeline
 
     def load_model(self):
         try:
-            self.clf = joblib.load(self.model_filename)  # Load the IsolationForest
-            self.scaler = joblib.load(self.model_filename.replace(".joblib", "_scaler.joblib"))  # Load the scaler
-            print(f"Model loaded from {self.model_filename}")
+            # IsolationForest fused with its scaler; scores raw feature rows
+            self.clf = profiles.models.get(self.profile, model_scale(self.window_seconds))
+            logger.debug(f"Model for {self.profile.key} ready from {self.model_filename}")
             return True
         except FileNotFoundError:
-            print(f"Model file {self.model_filename} not found. Training a new model.")
+            logger.warning(f"Model file {self.model_filename} not found. Training a new model.")
             return False
         except Exception as e:
-            print(f"Error loading model: {e}")
+            logger.error(f"Error loading model: {e}")
             return False
 
-    def run_inference(self):
-
-        self.load_model()
-
-        self.keyboard_events = extract_key_inference()
-        self.mouse_events = extract_mouse_inference()
-        self.focus_events = extract_focus_inference()
-
-        my_model = self.clf
-        features = self.extract_features(duration=30, inference=True)
-        if my_model.predict([features])[0] == 1:
-            print("The model predicts: Normal activity")
+    def score_remote(self, features, end_time=None):
+        """
+        Score one window on the central collector. Returns its verdict
+        ({"normal", "score", "explanation"}), or None if it is unreachable.
+        """
+        if self.collector is None:
+            self.collector = collector_client.CollectorClient(profile_key=self.profile.key)
+        start = ((end_time or datetime.now()) - timedelta(seconds=self.window_seconds)).strftime(TIMESTAMP_FORMAT)
+        self.collector.add(start, features)
+        try:
+            return self.collector.flush()[0]
+        except collector_client.CollectorError as e:
+            logger.warning(f"{e}; scoring locally")
+            return None
+
+    def explain(self, features):
+        """Text naming the features that drove this window's score, or None without a local model."""
+        if self.clf is None and not self.load_model():
+            return None
+        return format_explanation(explain(self.clf, features)) or None
+
+    def run_inference(self, end_time=None):
+        """
+        Score the window_seconds ending now (or at end_time, when replaying).
+        Returns True for normal activity, False for suspicious.
+        """
+        with INFERENCE_SECONDS.time():
+            end_ms = storage.epoch_ms(end_time or datetime.now())
+            window = window_features.window_aggregate(end_ms - self.window_seconds * 1000, end_ms + 1)
+            with EXTRACT_FEATURES_SECONDS.time():
+                features = window.extended_features(self.window_seconds, window_features.context())
+            with SCORE_SECONDS.time():
+                verdict = self.score_remote(features, end_time) if collector_client.COLLECTOR_URL else None
+                if verdict is None:
+                    if self.clf is None:
+                        self.load_model()
+                    normal = bool(predict_normal(self.clf, [features])[0])
+            if verdict is not None:
+                # The collector explains the windows it scores; no local model is loaded
+                normal = bool(verdict["normal"])
+                self.explanation = verdict.get("explanation")
+            else:
+                with EXPLAIN_SECONDS.time():
+                    self.explanation = self.explain(features)
+
+        WINDOWS_SCORED.inc()
+        if normal:
+            logger.info("The model predicts: Normal activity")
             return True
         else:
-            print("The model predicts Suspicious behaviour")
+            ANOMALIES.inc()
+            logger.info(f"The model predicts Suspicious behaviour, driven by: {self.explanation}")
             return False
 
 
+def fit_scales(profile=None, scales=WINDOW_SCALES):
+    """
+    Fit the forest of every window length. A scale with fewer than
+    MIN_TRAINING_WINDOWS training windows (5 minutes needs 50 minutes of
+    training data) keeps the model it has. Returns {scale: pipeline or None}.
+    """
+    return {scale: IntrusionDetector(profile, scale).fit() for scale in scales}
+
+
 # Example usage:
 if __name__ == "__main__":
+    metrics.configure_logging()
     detector = IntrusionDetector()
     detector.run_inference()
 
@@ -0,0 +1,200 @@
+"""
+User/host profiles: where each profile's events and models live, and a
+registry that keeps recently used models in memory.
+
+A profile is a (user, host) pair with the key "user@host". The profile of
+the person at this machine comes from SBM_PROFILE ("user@host" or just
+"user") and defaults to the logged-in account on this host.
+
+Layout:
+  * the local OS account keeps the original ~/Documents files
+  * every other profile (a shared service account, windows pushed from other
+    workstations) is partitioned under ~/Documents/profiles/<key>/ with its
+    own databases
+  * every profile's own models (the forests IntrusionDetector.fit() trains,
+    the autoencoder, digraph profile, ...) are under
+    <SBM_MODEL_DIR>/profiles/<key>/
+  * a profile without a trained model of its own falls back to the shipped
+    intrusion_model.joblib in the working directory, which is never
+    overwritten
+  * models for other window lengths than the shipped 30 seconds sit next to
+    it as intrusion_model_<seconds>s.joblib (see model_filename())
+"""
+import getpass
+import logging
+import os
+import re
+import socket
+import threading
+from collections import OrderedDict
+
+import metrics
+
+DATA_ROOT = os.path.join(os.path.expanduser("~"), "Documents")
+MODEL_ROOT = os.environ.get("SBM_MODEL_DIR", "")
+MODEL_FILENAME = "intrusion_model.joblib"
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_HITS = metrics.counter("sbm_model_cache_hits_total", "Model registry lookups served from memory")
+MODEL_CACHE_MISSES = metrics.counter("sbm_model_cache_misses_total", "Model registry lookups that loaded from disk")
+MODELS_LOADED = metrics.gauge("sbm_models_loaded", "Models held in the registry's in-memory cache")
+
+
+class Profile:
+    def __init__(self, user, host):
+        self.user = user
+        self.host = host
+
+    @property
+    def key(self):
+        return f"{self.user}@{self.host}"
+
+    @classmethod
+    def from_key(cls, key):
+        user, _, host = key.partition("@")
+        return cls(user, host or socket.gethostname())
+
+    @property
+    def is_local(self):
+        """True for the account logged in on this machine (the original single-user layout)."""
+        return self.user == _os_user() and self.host == socket.gethostname()
+
+    def __eq__(self, other):
+        return isinstance(other, Profile) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Profile({self.key!r})"
+
+
+def _os_user():
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return "user"
+
+
+def current_profile():
+    """The profile this process records and scores for."""
+    configured = os.environ.get("SBM_PROFILE")
+    if configured:
+        return Profile.from_key(configured)
+    return Profile(_os_user(), socket.gethostname())
+
+
+def _safe_key(profile):
+    return re.sub(r"[^A-Za-z0-9@._-]", "_", profile.key)
+
+
+def data_dir(profile=None):
+    """Directory holding a profile's databases."""
+    profile = profile or current_profile()
+    if profile.is_local:
+        return DATA_ROOT
+    return os.path.join(DATA_ROOT, "profiles", _safe_key(profile))
+
+
+def data_path(name, profile=None):
+    """Path of one of a profile's databases (e.g. "soft_activity.sqlite"); creates its directory."""
+    directory = data_dir(profile)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def model_filename(scale=None):
+    """File name of the model for `scale`-second windows; None is the shipped 30-second model."""
+    return MODEL_FILENAME if scale is None else MODEL_FILENAME.replace(".joblib", f"_{scale}s.joblib")
+
+
+def own_model_path(profile=None, scale=None):
+    """Where a profile's own trained model is (or would be) stored."""
+    profile = profile or current_profile()
+    return os.path.join(MODEL_ROOT, "profiles", _safe_key(profile), model_filename(scale))
+
+
+def model_path(profile=None, scale=None):
+    """The model a profile is scored with: its own if trained, else the shared one."""
+    path = own_model_path(profile, scale)
+    return path if os.path.exists(path) else os.path.join(MODEL_ROOT, model_filename(scale))
+
+
+class ModelRegistry:
+    """
+    Models keyed by profile, with at most `capacity` kept in memory (LRU).
+
+    Profiles that share a model file (and have no autoencoder ensemble of
+    their own) share one loaded copy, so hundreds of profiles without their
+    own model cost a single load.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.models = OrderedDict()  # (model path, ensemble model path) -> detector
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(profile=None, scale=None):
+        """(forest model path, path the ensemble files sit next to) of a profile."""
+        from scoring import ensemble_filename
+
+        path = model_path(profile, scale)
+        own = own_model_path(profile, scale)
+        return path, own if own != path and os.path.exists(ensemble_filename(own)) else path
+
+    def get(self, profile=None, scale=None):
+        """Return a profile's detector, loading it on a cache miss."""
+        key = self.key(profile, scale)
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is not None:
+                self.models.move_to_end(key)
+                MODEL_CACHE_HITS.inc()
+                return entry
+
+        from scoring import load_model
+        entry = load_model(key[0], ensemble_model_filename=key[1])
+        MODEL_CACHE_MISSES.inc()
+        logger.info(f"Loaded model {key[0]} for {(profile or current_profile()).key}")
+
+        with self.lock:
+            self.models[key] = entry
+            self.models.move_to_end(key)
+            while len(self.models) > self.capacity:
+                self.models.popitem(last=False)
+            MODELS_LOADED.set(len(self.models))
+        return entry
+
+    def invalidate(self, profile=None, scale=None):
+        """Drop a profile's cached model, e.g. after it has been retrained."""
+        path = model_path(profile, scale)
+        with self.lock:
+            for key in [key for key in self.models if key[0] == path]:
+                del self.models[key]
+            MODELS_LOADED.set(len(self.models))
+
+    def predict_normal(self, windows):
+        """
+        Score [(profile, features), ...] and return one bool per window
+        (True = normal), in input order. Windows are grouped per model so
+        each model scores its windows in one batch.
+        """
+        from scoring import predict_normal
+
+        groups = {}
+        for index, (profile, features) in enumerate(windows):
+            groups.setdefault(self.key(profile), (profile, []))[1].append(index)
+
+        results = [False] * len(windows)
+        for profile, indexes in groups.values():
+            clf = self.get(profile)
+            predictions = predict_normal(clf, [windows[i][1] for i in indexes])
+            for i, normal in zip(indexes, predictions):
+                results[i] = bool(normal)
+        return results
+
+
+# Shared by every IntrusionDetector in the process
+models = ModelRegistry(int(os.environ.get("SBM_MODEL_CACHE", "64")))
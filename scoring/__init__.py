@@ -0,0 +1,28 @@
+"""
+Headless scoring for the intrusion detector.
+
+Depends only on numpy (and scikit-learn/joblib when a model is loaded), so it
+can be imported on any platform and in worker processes without pulling in
+the desktop capture stack (pynput, win32gui, PyQt).
+"""
+from scoring.apps import app_name
+from scoring.features import (
+    EXTENDED_FEATURE_NAMES, FEATURE_NAMES, PLACEHOLDER_FEATURES, FeatureContext, extra_features,
+    extract_extended_features, extract_features, parse_timestamp
+)
+from scoring.keystrokes import (
+    KEYSTROKE_FEATURE_NAMES, PROFILE_FEATURE_NAMES, DigraphHistogram, DigraphProfile, DigraphStream,
+    digraph_profile_filename
+)
+from scoring.mouse import MOUSE_MOVE_FEATURE_NAMES, MouseMoveSampler, mouse_move_features
+from scoring.markov import MARKOV_FEATURE_NAMES, USER_EVENT_TYPES, MarkovChain, markov_filename
+from scoring.sequences import SEQUENCE_FEATURE_NAMES, SequencePatterns, prefixspan, sequence_patterns_filename
+from scoring.system import SYSTEM_FEATURE_NAMES, system_features
+from scoring.windows import DEFAULT_WINDOW_SECONDS, WINDOW_SCALES, WindowAggregate, merge_all
+from scoring.detector import decision_scores, load_model, load_pipeline, predict_normal, scaler_filename
+from scoring.ensemble import Detector, EnsembleDetector, ensemble_filename
+from scoring.autoencoder import Autoencoder, autoencoder_filename
+from scoring.drift import DriftEvent, DriftMonitor, PageHinkley, drift_filename
+from scoring.explain import explain, explain_rows, format_explanation, path_contributions
+from scoring.forest import CompiledForest, forest_filename
+from scoring.pipeline import ScoringPipeline, feature_schema, pipeline_filename
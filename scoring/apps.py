@@ -0,0 +1,33 @@
+"""
+Stable application names for focus events.
+
+Window titles change with every browser tab and edited document, so focus
+features keyed by title see a new "app" per page and their transition sets
+grow without bound. Focus events carry the executable of the foreground
+process (app_identity.AppResolver) where it could be resolved; app_name()
+normalises that, or the window title of rows captured without one, to a
+short lowercase name:
+
+    "WINWORD.EXE"                                     -> "winword"
+    "Inbox (3) - alice@example.com - Mozilla Firefox" -> "mozilla firefox"
+
+Titles are reduced to their last " - "/" | " separated part, which is where
+Windows and most Linux desktops put the application name. storage.app_ids
+maps the names to compact integer ids.
+"""
+import functools
+import re
+
+MAX_NAME_LENGTH = 64
+TITLE_SEPARATORS = re.compile(r"\s+[-–—|]\s+")
+EXECUTABLE_SUFFIX = re.compile(r"\.(exe|bin|app)$", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4096)
+def app_name(name):
+    """Normalised app name of an executable name or window title ("" for None or empty)."""
+    if not name:
+        return ""
+    name = TITLE_SEPARATORS.split(name.strip())[-1]
+    name = EXECUTABLE_SUFFIX.sub("", name.strip())
+    return " ".join(name.lower().split())[:MAX_NAME_LENGTH]
@@ -0,0 +1,150 @@
+"""
+Dense autoencoder in pure NumPy.
+
+The network standardises a window's features, squeezes them through a small
+bottleneck (16 -> 8 -> 4 -> 8 -> 16 by default, tanh hidden layers, linear
+output) and reconstructs them. Trained on normal windows only, it
+reconstructs habitual activity well and unfamiliar combinations of features
+badly, so the reconstruction error is the anomaly score.
+
+Training is mini-batch Adam on the mean squared error; the whole model is a
+handful of small matrices, so a forward pass over a batch is four matmuls
+and scoring a window costs microseconds on the CPU.
+
+decision_function() is log(threshold) - log(error), where threshold is the
+(1 - contamination) quantile of the training errors: negative for the
+windows reconstructed worse than all but `contamination` of the training
+set, like IsolationForest.decision_function.
+"""
+import os
+
+import numpy as np
+
+from scoring.ensemble import Detector
+
+HIDDEN_LAYERS = (8, 4, 8)
+CONTAMINATION = 0.05
+EPSILON = 1e-12  # keeps log() finite for a perfect reconstruction
+
+
+class Autoencoder(Detector):
+    """Feature-reconstruction detector; fit() trains one, load() restores a saved one."""
+
+    def __init__(self, weights, biases, mean, scale, threshold):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float64) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float64) for b in biases]
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = float(threshold)
+        self.n_features_in_ = len(self.mean)
+
+    @classmethod
+    def fit(cls, X, hidden=HIDDEN_LAYERS, epochs=60, batch_size=64, learning_rate=0.01,
+            contamination=CONTAMINATION, seed=0):
+        """Train on the rows of X (normal windows) with mini-batch Adam."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or len(X) < 2:
+            raise ValueError(f"need at least two training rows, got shape {X.shape}")
+        finite = np.where(np.isfinite(X), X, np.nan)
+        mean = np.nan_to_num(np.nanmean(finite, axis=0))
+        scale = np.nan_to_num(np.nanstd(finite, axis=0))
+        scale[scale == 0] = 1.0
+
+        rng = np.random.default_rng(seed)
+        sizes = [X.shape[1], *hidden, X.shape[1]]
+        # Glorot-uniform initialisation
+        weights = [rng.uniform(-1, 1, (n_in, n_out)) * np.sqrt(6 / (n_in + n_out))
+                   for n_in, n_out in zip(sizes, sizes[1:])]
+        biases = [np.zeros(n_out) for n_out in sizes[1:]]
+        model = cls(weights, biases, mean, scale, 0.0)
+
+        params = model.weights + model.biases
+        moments = [np.zeros_like(p) for p in params]
+        velocities = [np.zeros_like(p) for p in params]
+        beta1, beta2 = 0.9, 0.999
+        step = 0
+        Z = model._standardise(X)
+        for _ in range(epochs):
+            order = rng.permutation(len(Z))
+            for i in range(0, len(Z), batch_size):
+                batch = Z[order[i:i + batch_size]]
+                grads = model._gradients(batch)
+                step += 1
+                for p, g, m, v in zip(params, grads, moments, velocities):
+                    m *= beta1
+                    m += (1 - beta1) * g
+                    v *= beta2
+                    v += (1 - beta2) * g * g
+                    p -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + 1e-8)
+
+        model.threshold = float(np.quantile(model.reconstruction_error(X), 1 - contamination))
+        return model
+
+    def _standardise(self, X):
+        scaled = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        finite = np.isfinite(scaled)
+        if not finite.all():
+            scaled[~finite] = 0.0
+        return scaled
+
+    def _forward(self, Z):
+        """Activations of every layer, input first."""
+        activations = [Z]
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            out = activations[-1] @ w + b
+            activations.append(out if i == last else np.tanh(out))
+        return activations
+
+    def _gradients(self, Z):
+        """Gradients of the batch's mean squared error, weights then biases."""
+        activations = self._forward(Z)
+        delta = 2 * (activations[-1] - Z) / Z.size
+        weight_grads = [None] * len(self.weights)
+        bias_grads = [None] * len(self.biases)
+        for i in range(len(self.weights) - 1, -1, -1):
+            weight_grads[i] = activations[i].T @ delta
+            bias_grads[i] = delta.sum(axis=0)
+            if i:
+                delta = (delta @ self.weights[i].T) * (1 - activations[i] ** 2)
+        return weight_grads + bias_grads
+
+    def reconstruction_error(self, X):
+        """Mean squared reconstruction error of each row, in standardised units."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected rows of {self.n_features_in_} features, got shape {X.shape}")
+        Z = self._standardise(X)
+        out = Z
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            out = out @ w + b
+            if i != last:
+                np.tanh(out, out=out)
+        return np.mean((out - Z) ** 2, axis=1)
+
+    def decision_function(self, X):
+        return np.log(self.threshold + EPSILON) - np.log(self.reconstruction_error(X) + EPSILON)
+
+    def save(self, path):
+        """Persist the layers and scaling as an uncompressed .npz (no pickles)."""
+        arrays = {f"w{i}": w for i, w in enumerate(self.weights)}
+        arrays.update((f"b{i}", b) for i, b in enumerate(self.biases))
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, layers=np.array(len(self.weights)), mean=self.mean, scale=self.scale,
+                 threshold=np.array(self.threshold), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            layers = int(data["layers"])
+            return cls([data[f"w{i}"] for i in range(layers)], [data[f"b{i}"] for i in range(layers)],
+                       data["mean"], data["scale"], float(data["threshold"]))
+
+
+def autoencoder_filename(model_filename):
+    """The autoencoder is stored next to the joblib model: intrusion_model_autoencoder.npz."""
+    return model_filename.replace(".joblib", "_autoencoder.npz")
@@ -0,0 +1,89 @@
+import logging
+import os
+
+import numpy as np
+
+from scoring.autoencoder import Autoencoder, autoencoder_filename
+from scoring.ensemble import EnsembleDetector, ensemble_filename
+from scoring.features import EXTENDED_FEATURE_NAMES
+from scoring.pipeline import ScoringPipeline, pipeline_filename
+
+logger = logging.getLogger(__name__)
+
+
+def scaler_filename(model_filename):
+    return model_filename.replace(".joblib", "_scaler.joblib")
+
+
+def load_model(model_filename, feature_names=EXTENDED_FEATURE_NAMES, ensemble_model_filename=None):
+    """
+    Load the profile's detector. That is the forest pipeline, combined with
+    the autoencoder when one has been trained (intrusion_model_ensemble.npz
+    exists, see ensemble_training.py). The ensemble files are looked up next
+    to ensemble_model_filename (the profile's own model path), default
+    next to the forest.
+    """
+    pipeline = load_pipeline(model_filename, feature_names)
+    ensemble_model_filename = ensemble_model_filename or model_filename
+    ensemble = ensemble_filename(ensemble_model_filename)
+    if not os.path.exists(ensemble):
+        return pipeline
+    try:
+        autoencoder = Autoencoder.load(autoencoder_filename(ensemble_model_filename))
+        if autoencoder.n_features_in_ != pipeline.n_features_in_:
+            raise ValueError(f"autoencoder has {autoencoder.n_features_in_} features, "
+                             f"forest {pipeline.n_features_in_}")
+        return EnsembleDetector.load(ensemble, {"forest": pipeline, "autoencoder": autoencoder})
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Scoring with the forest alone; ensemble {ensemble} unusable: {e}")
+        return pipeline
+
+
+def load_pipeline(model_filename, feature_names=EXTENDED_FEATURE_NAMES):
+    """
+    The IsolationForest as a ScoringPipeline: scaler and compiled forest
+    in one object, scoring raw feature rows. The pipeline file next to the
+    joblib files is mapped while it is newer than both; otherwise the
+    model and scaler are unpickled (importing sklearn), fused and the
+    pipeline re-written. A model is trained on the leading columns of the
+    stored vector; raises ValueError unless those are `feature_names` (the
+    shipped model's 16 are the leading FEATURE_NAMES).
+    """
+    compiled = pipeline_filename(model_filename)
+    sources = [model_filename, scaler_filename(model_filename)]
+    if os.path.exists(compiled) and all(os.path.getmtime(compiled) >= os.path.getmtime(p) for p in sources):
+        try:
+            pipeline = ScoringPipeline.load(compiled)
+            pipeline.check_schema(feature_names[:pipeline.n_features_in_])
+            return pipeline
+        except ValueError as e:
+            logger.warning(f"Rebuilding {compiled}: {e}")
+
+    import joblib
+
+    clf = joblib.load(model_filename)
+    scaler = joblib.load(scaler_filename(model_filename))
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, feature_names[:clf.n_features_in_])
+    try:
+        pipeline.save(compiled)
+    except OSError as e:
+        logger.warning(f"Could not cache scoring pipeline {compiled}: {e}")
+    return pipeline
+
+
+def leading_columns(clf, feature_rows):
+    """The first clf.n_features_in_ columns of raw rows: the part of the stored vector the model was trained on."""
+    return np.asarray(feature_rows, dtype=np.float64)[:, :clf.n_features_in_]
+
+
+def predict_normal(clf, feature_rows):
+    """Return a boolean array, True where the detector considers a row normal."""
+    return clf.predict(leading_columns(clf, feature_rows)) == 1
+
+
+def decision_scores(clf, feature_rows):
+    """
+    Detector decision_function for a batch of raw rows. Negative scores
+    are anomalies, so `scores >= 0` matches predict_normal row for row.
+    """
+    return clf.decision_function(leading_columns(clf, feature_rows))
@@ -0,0 +1,156 @@
+"""
+Streaming concept-drift detection on window features and anomaly scores.
+
+Two detectors, both constant memory and O(features) per window:
+
+  * Population stability index per feature. The reference windows (the
+    ones the model was trained on) fix BINS quantile bins per feature and
+    the share of reference windows in each. Live windows go into
+    exponentially decayed bin counts with an effective length of `window`
+    windows, and every CHECK_EVERY windows
+        PSI = sum((live - reference) * ln(live / reference))
+    is computed per feature. A feature drifts above PSI_DRIFT (0.25, the
+    usual "significant shift") and recovers below PSI_RECOVER.
+  * Page-Hinkley on the anomaly score. Scores are standardised with the
+    first MIN_WINDOWS scores after each reset. Cumulative deviations from
+    the running mean, less a tolerance of `delta` standard deviations, are
+    tracked in both directions. A sustained shift past `threshold` is a
+    drift, e.g. the model starting to flag most windows.
+
+DriftMonitor.update() returns DriftEvents for the changes it detects.
+"""
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+BINS = 10
+PSI_DRIFT = 0.25
+PSI_RECOVER = 0.1
+MIN_WINDOWS = 30   # scores that standardise Page-Hinkley; PSI waits for `window` windows
+CHECK_EVERY = 10   # windows between PSI evaluations
+EPSILON = 1e-4     # floor for empty bins, so the log stays finite
+
+# kind is "psi" or "score"; feature is the feature name (or "score"); statistic the PSI or PH value
+DriftEvent = namedtuple("DriftEvent", ["kind", "feature", "statistic"])
+
+
+class PageHinkley:
+    """Two-sided Page-Hinkley test on a stream standardised by its first samples."""
+
+    __slots__ = ("delta", "threshold", "min_samples", "n", "sum", "sum_sq", "scale", "mean", "up", "down")
+
+    def __init__(self, delta=0.1, threshold=20.0, min_samples=MIN_WINDOWS):
+        self.delta = delta
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.sum = self.sum_sq = 0.0
+        self.scale = None
+        self.mean = 0.0
+        self.up = self.down = 0.0
+
+    def update(self, x):
+        """Add one value; returns the PH statistic when it crosses the threshold (and resets), else None."""
+        if not math.isfinite(x):
+            return None
+        self.n += 1
+        if self.scale is None:
+            self.sum += x
+            self.sum_sq += x * x
+            if self.n < self.min_samples:
+                return None
+            mean = self.sum / self.n
+            self.scale = (mean, math.sqrt(max(self.sum_sq / self.n - mean * mean, 0.0)) or 1.0)
+            self.n = 0
+            return None
+        z = (x - self.scale[0]) / self.scale[1]
+        self.mean += (z - self.mean) / self.n
+        self.up = max(0.0, self.up + z - self.mean - self.delta)
+        self.down = max(0.0, self.down + self.mean - z - self.delta)
+        statistic = max(self.up, self.down)
+        if statistic > self.threshold:
+            self.reset()
+            return statistic
+        return None
+
+
+class DriftMonitor:
+    """Per-feature PSI against reference windows plus Page-Hinkley on the score."""
+
+    def __init__(self, feature_names, edges, reference, window=120):
+        self.feature_names = list(feature_names)
+        self.edges = np.asarray(edges, dtype=np.float64)          # (features, BINS - 1)
+        self.reference = np.asarray(reference, dtype=np.float64)  # (features, BINS), rows sum to 1
+        self.window = int(window)
+        self.decay = 1.0 - 1.0 / self.window
+        self.counts = np.zeros_like(self.reference)
+        self.seen = 0
+        self.psi = np.zeros(len(self.feature_names))
+        self.drifted = np.zeros(len(self.feature_names), dtype=bool)
+        self.score_test = PageHinkley()
+        self._rows = np.arange(len(self.feature_names))
+
+    @classmethod
+    def from_reference(cls, X, feature_names, bins=BINS, window=120):
+        """Bins and reference shares from the rows of X (the training windows)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(feature_names) or not len(X):
+            raise ValueError(f"need reference rows of {len(feature_names)} features, got shape {X.shape}")
+        edges = np.quantile(X, np.arange(1, bins) / bins, axis=0).T
+        reference = np.zeros((X.shape[1], bins))
+        for j in range(X.shape[1]):
+            reference[j] = np.bincount(np.searchsorted(edges[j], X[:, j], side="right"), minlength=bins)
+        return cls(feature_names, edges, reference / len(X), window)
+
+    def _bins(self, row):
+        # searchsorted per feature, vectorised: count the edges each value is >= to
+        return (row[:, None] >= self.edges).sum(axis=1)
+
+    def update(self, row, score=None):
+        """Add one window's features (and anomaly score); returns the DriftEvents it triggers."""
+        row = np.asarray(row, dtype=np.float64)
+        events = []
+        self.counts *= self.decay
+        self.counts[self._rows, self._bins(np.where(np.isfinite(row), row, 0.0))] += 1.0
+        self.seen += 1
+        # PSI of a short sample is biased upwards by about (BINS - 1) / samples,
+        # so wait for a full window of live data
+        if self.seen >= max(MIN_WINDOWS, self.window) and self.seen % CHECK_EVERY == 0:
+            live = np.maximum(self.counts / self.counts.sum(axis=1, keepdims=True), EPSILON)
+            reference = np.maximum(self.reference, EPSILON)
+            self.psi = ((live - reference) * np.log(live / reference)).sum(axis=1)
+            newly = (self.psi > PSI_DRIFT) & ~self.drifted
+            self.drifted = (self.drifted & (self.psi >= PSI_RECOVER)) | newly
+            events.extend(DriftEvent("psi", self.feature_names[j], float(self.psi[j])) for j in np.flatnonzero(newly))
+        if score is not None:
+            statistic = self.score_test.update(float(score))
+            if statistic is not None:
+                events.append(DriftEvent("score", "score", statistic))
+        return events
+
+    def drifted_features(self):
+        return [name for name, drifted in zip(self.feature_names, self.drifted) if drifted]
+
+    def save(self, path):
+        """Persist the reference (bins and shares); live counts start afresh on load."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, feature_names=np.array(self.feature_names, dtype=str), edges=self.edges,
+                 reference=self.reference, window=np.array(self.window))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["feature_names"].tolist(), data["edges"], data["reference"], int(data["window"]))
+
+
+def drift_filename(model_filename):
+    """The drift reference is stored next to the joblib model: intrusion_model_drift.npz."""
+    return model_filename.replace(".joblib", "_drift.npz")
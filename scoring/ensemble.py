@@ -0,0 +1,90 @@
+"""
+Detector interface and score ensembles.
+
+A Detector scores raw window-feature rows: decision_function() returns one
+score per row, negative for anomalies, and predict() maps that to the
+IsolationForest convention (1 normal, -1 anomaly). ScoringPipeline (scaler +
+forest) and Autoencoder both implement it, so anything that takes the
+loaded model (predict_normal, decision_scores, the collector) takes either,
+or an EnsembleDetector of several.
+
+The members' scores live on different scales, so the ensemble divides each
+by its spread (standard deviation of the member's scores on the training
+windows) before taking the weighted mean. Every member keeps 0 as its
+threshold, so the combined score does too.
+"""
+import os
+
+import numpy as np
+
+
+class Detector:
+    """Scores raw feature rows; subclasses implement decision_function."""
+
+    n_features_in_ = None
+
+    def decision_function(self, X):
+        """One score per row of X, negative for anomalies."""
+        raise NotImplementedError
+
+    def predict(self, X):
+        """1 for inliers, -1 for outliers, like IsolationForest.predict."""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+class EnsembleDetector(Detector):
+    """Weighted mean of member detectors' scores, each divided by its training spread."""
+
+    def __init__(self, members, weights=None, spreads=None):
+        """members: {name: Detector}; weights and spreads: {name: float}, default 1."""
+        self.members = dict(members)
+        self.weights = {name: float((weights or {}).get(name, 1.0)) for name in self.members}
+        self.spreads = {name: float((spreads or {}).get(name, 1.0)) or 1.0 for name in self.members}
+        self.n_features_in_ = next(iter(self.members.values())).n_features_in_
+
+    def calibrate(self, X):
+        """Set each member's spread from its scores on training rows X."""
+        for name, member in self.members.items():
+            spread = float(np.std(member.decision_function(X)))
+            self.spreads[name] = spread if spread > 0 else 1.0
+        return self
+
+    def member_scores(self, X):
+        """{name: decision_function of that member}, unnormalised."""
+        return {name: member.decision_function(X) for name, member in self.members.items()}
+
+    def decision_function(self, X):
+        total = sum(self.weights.values())
+        combined = None
+        for name, scores in self.member_scores(X).items():
+            part = scores * (self.weights[name] / self.spreads[name] / total)
+            combined = part if combined is None else combined + part
+        return combined
+
+    def save(self, path):
+        """Persist member names, weights and spreads (the members are saved separately)."""
+        names = list(self.members)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, names=np.array(names, dtype=str),
+                 weights=np.array([self.weights[name] for name in names]),
+                 spreads=np.array([self.spreads[name] for name in names]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, members):
+        """Combine `members` ({name: Detector}) with saved weights and spreads."""
+        with np.load(path, allow_pickle=False) as data:
+            names = data["names"].tolist()
+            weights = dict(zip(names, data["weights"].tolist()))
+            spreads = dict(zip(names, data["spreads"].tolist()))
+        missing = set(names) - set(members)
+        if missing:
+            raise ValueError(f"{path} combines {sorted(missing)}, which are not loaded")
+        return cls({name: members[name] for name in names}, weights, spreads)
+
+
+def ensemble_filename(model_filename):
+    """Ensemble weights are stored next to the joblib model: intrusion_model_ensemble.npz."""
+    return model_filename.replace(".joblib", "_ensemble.npz")
@@ -0,0 +1,266 @@
+import ast
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from scoring.apps import app_name
+from scoring.keystrokes import KEYSTROKE_FEATURE_NAMES, PROFILE_FEATURE_NAMES, DigraphHistogram
+from scoring.markov import MARKOV_FEATURE_NAMES, markov_features
+from scoring.mouse import MOUSE_MOVE_FEATURE_NAMES, mouse_move_features
+from scoring.sequences import SEQUENCE_FEATURE_NAMES
+from scoring.system import SYSTEM_FEATURE_NAMES, system_features
+
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = [
+    # Keyboard
+    "typing_speed", "shortcuts", "backspace", "dwell_time", "flight_time",
+    # Mouse
+    "mouse_interval", "click_distance", "mouse_speed", "double_clicks",
+    # Focus
+    "switching_rate", "max_focus_duration", "mean_focus_duration", "total_transitions",
+    "unique_transitions", "transition_rate", "reserved",
+]
+
+# Always 0 in the vector the shipped model was trained on
+PLACEHOLDER_FEATURES = frozenset({"switching_rate", "max_focus_duration", "reserved"})
+
+# Base vector followed by the extra feature families. Windows are stored and
+# scored with this vector; a model reads its leading n_features_in_ columns,
+# so the shipped model still sees exactly FEATURE_NAMES.
+EXTENDED_FEATURE_NAMES = (FEATURE_NAMES + KEYSTROKE_FEATURE_NAMES + PROFILE_FEATURE_NAMES + MOUSE_MOVE_FEATURE_NAMES
+                          + SEQUENCE_FEATURE_NAMES + MARKOV_FEATURE_NAMES + SYSTEM_FEATURE_NAMES)
+
+
+def parse_timestamp(timestamp_str):
+    """Parse a stored timestamp, with or without fractional seconds."""
+    return datetime.fromisoformat(timestamp_str)
+
+
+def extract_features(keyboard_events, mouse_events, focus_events, duration=30):
+    """
+    Build the 16-feature vector for one window of events.
+
+    keyboard_events: [(key, key_interval, timestamp[, press_ns, event_ns]), ...]
+    mouse_events:    [(click_type, click_interval, position, timestamp), ...]
+    focus_events:    [(title, duration, timestamp), ...]
+    duration:        window length in seconds
+    """
+    # Keyboard Features
+    if not keyboard_events:
+        logger.debug("No keyboard events to process.")
+        keyboard_features = [0] * 5  # Return default values if no events
+    else:
+        typing_speed = len(keyboard_events) / duration if duration > 0 else 0
+        shortcuts = 0
+        backspace = 0
+        modifiers = {'Key.ctrl', 'Key.ctrl_l', 'Key.ctrl_r', 'Key.alt', 'Key.alt_l', 
+                    'Key.alt_r', 'Key.cmd', 'Key.shift', 'Key.shift_l', 'Key.shift_r'}
+
+        for event in keyboard_events:
+            if event[0] in modifiers:
+                shortcuts += 1
+            if event[0] == 'Key.backspace':
+                backspace += 1
+
+        values = [float(item[1]) for item in keyboard_events if item[1] is not None]
+        dwell_time = sum(values) / len(values) if values else 0
+
+        digraphs = DigraphHistogram.from_events(keyboard_events)
+        if digraphs.count:
+            # Release->press latency from the monotonic capture clock
+            average_difference = float(digraphs.rp_ms.mean()) / 1000
+        else:
+            # Rows captured before press/release times were recorded
+            datetime_data = []
+            for item in keyboard_events:
+                timestamp_str = item[2]
+                try:
+                    datetime_data.append(parse_timestamp(timestamp_str))
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Error converting timestamp: {timestamp_str}. Error: {e}")
+                    continue
+
+            time_differences = []
+            for i in range(1, len(datetime_data)):
+                time_differences.append((datetime_data[i] - datetime_data[i-1]).total_seconds())
+
+            average_difference = sum(time_differences) / len(time_differences) if time_differences else 0
+
+        logger.debug(f"Typing rate: {typing_speed * duration}")
+        logger.debug(f"Error rate: {backspace}")
+        logger.debug(f"Special keys rate: {shortcuts}")
+        logger.debug(f"Average Dwell Time: {dwell_time}")
+        logger.debug(f"Average flight time: {average_difference}")
+
+        keyboard_features = [typing_speed, shortcuts, backspace, dwell_time, average_difference]
+
+
+    # Mouse Features
+    if not mouse_events:
+        logger.debug("No mouse events to process.")
+        mouse_features = [0] * 4  # Default values
+    else:
+        click_distances = []
+        mouse_speeds = []
+        double_clicks = 0
+        click_times = []
+        mouse_positions = []
+
+        for i in range(len(mouse_events)):
+            click_type, click_interval, position_str, timestamp_str = mouse_events[i]
+
+            # Keep track of all intervals for averaging
+            mouse_intervals = []
+            if click_interval > 0:  # Only add valid intervals
+                mouse_intervals.append(click_interval)
+
+            try:
+                position = ast.literal_eval(position_str)
+                x, y = position
+
+                if i > 0:
+                    prev_position_str = mouse_events[i - 1][2]
+                    prev_position = ast.literal_eval(prev_position_str)
+                    x1, y1 = prev_position
+                    distance = ((x - x1)**2 + (y - y1)**2)**0.5
+                    click_distances.append(distance)
+
+                mouse_speeds.append(distance / click_interval if click_interval > 0 and i > 0 else 0)
+
+                # Click times come from the stored event timestamps, not the
+                # time the window happens to be scored
+                click_time = parse_timestamp(timestamp_str).timestamp()
+                click_times.append(click_time)
+                if i > 0 and click_times[i] - click_times[i - 1] < 0.5:
+                    double_clicks += 1
+
+                mouse_positions.append((x, click_time))
+                if len(mouse_positions) > 1:
+                    prev_x, prev_time = mouse_positions[-2]
+                    dx = x - prev_x
+                    time_diff = click_time - prev_time
+                    if time_diff > 0:
+                        mouse_speeds.append(dx / time_diff)
+
+            except (SyntaxError, TypeError, ValueError) as e:
+                logger.warning(f"Error processing mouse data point {i+1}: {e}")
+                mouse_features = [0] * 4  # Updated to 4 default values
+                break  # Exit from the loop if there is an error
+
+        avg_click_distance = sum(click_distances) / len(click_distances) if click_distances else 0
+        avg_mouse_speed = np.mean(mouse_speeds) if mouse_speeds else 0
+        avg_mouse_interval = sum(mouse_intervals) / len(mouse_intervals) if mouse_intervals else 0
+
+        logger.debug(f"Average Click Distance: {avg_click_distance}")
+        logger.debug(f"Average Mouse Speed: {avg_mouse_speed}")
+        logger.debug(f"Double Clicks: {double_clicks}")
+        logger.debug(f"Average Mouse Interval: {avg_mouse_interval}")
+
+        mouse_features = [ avg_mouse_interval, avg_click_distance, avg_mouse_speed, double_clicks]
+
+    # Focus Features
+    transitions = []
+    previous_app = None
+
+
+    if focus_events is None or not focus_events:  # Check for None or empty
+        logger.debug("No focus events to process.")
+        focus_features = [0] * 7  # Default values
+    else:
+        durations = []
+        timestamps = []
+
+        for title, focus_duration, timestamp_str in focus_events:
+
+            # Transitions are between apps, not titles: a new tab is not a switch
+            current_app = app_name(title)
+            if previous_app and current_app != previous_app:
+                transitions.append((previous_app, current_app))
+
+            previous_app = current_app
+
+
+            try:
+                timestamp = parse_timestamp(timestamp_str)
+                durations.append(focus_duration)
+                timestamps.append(timestamp)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Error converting focus timestamp: {timestamp_str}. Error: {e}")
+                focus_features = [0] * 7 #Default Values
+                break #Exit from the loop if there is an error
+
+        switching_rate = len(durations) - 1
+        max_duration = max(durations) if durations else 0
+        mean_duration = np.mean(durations) if durations else 0
+        total_transitions = len(transitions)              # Number of app switches
+        unique_transitions = len(set(transitions))        # Unique transition patterns
+        transition_rate = total_transitions / duration
+
+        logger.debug(f"Switching Rate: {switching_rate}")
+        logger.debug(f"Max Duration: {max_duration}")
+        logger.debug(f"Average of Duration: {mean_duration}")
+        logger.debug(f"Transition count: {total_transitions}")
+        logger.debug(f"Unique transitions: {unique_transitions}")
+        logger.debug(f"Transition rate: {transition_rate}")
+
+        focus_features = [0, 0, mean_duration, total_transitions, unique_transitions, transition_rate, 0]
+
+    all_features = keyboard_features + mouse_features + focus_features
+    logger.debug(f"Features: {len(keyboard_features)} keyboard, {len(mouse_features)} mouse, "
+                 f"{len(focus_features)} focus, {len(all_features)} total")
+
+
+    return all_features  # Return the combined list of features
+
+
+class FeatureContext:
+    """
+    The references a window's extra families are scored against: the
+    profile's DigraphProfile, its mined SequencePatterns with app_ids (a
+    function mapping app names to the ids the patterns were mined over) and
+    the event-type and app MarkovChains. Families whose reference is None
+    are 0.
+    """
+
+    def __init__(self, digraphs=None, patterns=None, app_ids=None, event_chain=None, app_chain=None):
+        self.digraphs = digraphs
+        self.patterns = patterns
+        self.app_ids = app_ids
+        self.event_chain = event_chain
+        self.app_chain = app_chain
+
+
+def extra_features(keyboard_events, move_events=(), apps=(), event_types=(), pc_events=(), context=None):
+    """
+    The families EXTENDED_FEATURE_NAMES appends to FEATURE_NAMES, in its
+    order. move_events are "Mouse Move" rows (position, press_ns, event_ns),
+    apps the app name of every focus event and event_types the type of every
+    user-driven event, both in time order. pc_events are "PC Usage" rows as
+    scoring.system.system_features takes them.
+    """
+    context = context or FeatureContext()
+    digraphs = DigraphHistogram.from_events(keyboard_events)
+    if context.digraphs is not None:
+        profile_scores = context.digraphs.score(digraphs)
+    else:
+        profile_scores = [0.0] * len(PROFILE_FEATURE_NAMES)
+    if context.patterns is not None and context.app_ids is not None:
+        sequence_scores = context.patterns.score(context.app_ids(apps) if apps else [])
+    else:
+        sequence_scores = [0.0] * len(SEQUENCE_FEATURE_NAMES)
+    markov_scores = markov_features(context.event_chain, context.app_chain, event_types, apps)
+    return (digraphs.features() + profile_scores + mouse_move_features(move_events) + sequence_scores
+            + markov_scores + system_features(pc_events))
+
+
+def extract_extended_features(keyboard_events, mouse_events, focus_events, duration=30, move_events=(),
+                              pc_events=(), event_types=(), context=None):
+    """
+    The 16-feature vector followed by extra_features(), ordered as
+    EXTENDED_FEATURE_NAMES. context is an optional FeatureContext.
+    """
+    apps = [app_name(title) for title, _, _ in focus_events or ()]
+    return (extract_features(keyboard_events, mouse_events, focus_events, duration)
+            + extra_features(keyboard_events, move_events, apps, event_types, pc_events, context))
@@ -0,0 +1,153 @@
+"""
+Array-based IsolationForest evaluator.
+
+CompiledForest.from_sklearn() flattens every tree of a fitted
+IsolationForest into shared contiguous arrays, one entry per node:
+  feature    global feature index tested at the node (0 at leaves)
+  threshold  split threshold; a row goes left when x <= threshold
+  left/right global index of the children (a leaf points at itself)
+  missing_left  whether NaN goes left
+  value      path-length contribution of a leaf: depth + c(n_node_samples) - 1
+plus the root of each tree, the normalising denominator and offset_.
+
+decision_function() walks all trees for all rows at once, one vectorized
+step per tree level, and sums the leaf values tree by tree in sklearn's
+order. Rows are rounded to float32 first as sklearn does, so scores are
+bit-identical to IsolationForest.decision_function. Loading and scoring a
+compiled forest never imports sklearn.
+
+The win is per-call overhead: a single row scores in tens of microseconds
+against sklearn's milliseconds. Large batches are not faster. At 10k rows
+the compiled walk measures roughly on par with sklearn's Cython tree
+traversal, and up to ~1.4x slower. Bigger chunks do not close the gap.
+They push the (rows, trees) index arrays out of cache, and 256-4096 row
+chunks measured slower than 64 (benchmarks/forest.py). Only bulk rescoring
+after a refit produces batches that size; live scoring does not.
+
+Usage:
+    python -m scoring.forest intrusion_model.joblib   # writes intrusion_model_forest.npz
+"""
+import os
+import sys
+
+import numpy as np
+
+
+class CompiledForest:
+    """IsolationForest flattened into NumPy arrays; drop-in for decision_function/predict."""
+
+    ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+    CHUNK_ROWS = 64  # rows walked together; larger chunks fall out of cache and score big batches slower
+
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, max_depth, denominator,
+                 offset, n_features):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.missing_left = np.ascontiguousarray(missing_left, dtype=bool)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.denominator = float(denominator)
+        self.offset_ = float(offset)
+        self.n_features_in_ = int(n_features)
+        self.children = np.ascontiguousarray(np.stack([self.left, self.right], axis=1).ravel())
+
+    @classmethod
+    def from_sklearn(cls, clf):
+        """Flatten a fitted sklearn IsolationForest (imports sklearn for the normaliser only)."""
+        from sklearn.ensemble._iforest import _average_path_length
+
+        parts = {name: [] for name in cls.ARRAYS}
+        base = 0
+        for tree, features, path_lengths, average_lengths in zip(
+                clf.estimators_, clf.estimators_features_,
+                clf._decision_path_lengths, clf._average_path_length_per_tree):
+            t = tree.tree_
+            nodes = np.arange(t.node_count)
+            leaf = t.children_left == -1
+            parts["feature"].append(np.where(leaf, 0, np.asarray(features)[np.maximum(t.feature, 0)]))
+            parts["threshold"].append(t.threshold)
+            parts["left"].append(base + np.where(leaf, nodes, t.children_left))
+            parts["right"].append(base + np.where(leaf, nodes, t.children_right))
+            missing = getattr(t, "missing_go_to_left", None)
+            parts["missing_left"].append(missing if missing is not None else np.zeros(t.node_count, dtype=bool))
+            # Same expression as sklearn's _parallel_compute_tree_depths, per node
+            parts["value"].append(path_lengths + average_lengths - 1.0)
+            parts["roots"].append([base])
+            base += t.node_count
+
+        denominator = len(clf.estimators_) * _average_path_length([clf._max_samples])[0]
+        return cls(
+            *(np.concatenate(parts[name]) for name in cls.ARRAYS),
+            max_depth=max(tree.tree_.max_depth for tree in clf.estimators_),
+            denominator=denominator, offset=clf.offset_, n_features=clf.n_features_in_,
+        )
+
+    def decision_function(self, X):
+        """IsolationForest.decision_function: negative for anomalies."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected rows of {self.n_features_in_} features, got shape {X.shape}")
+        if len(X) <= self.CHUNK_ROWS:
+            return self._decision_chunk(X)
+        return np.concatenate([self._decision_chunk(X[i:i + self.CHUNK_ROWS])
+                               for i in range(0, len(X), self.CHUNK_ROWS)])
+
+    def _decision_chunk(self, X):
+        # node[i, t] is row i's current node in tree t; children holds
+        # (left, right) pairs, so the next node is children[2 * node + went_right]
+        flat = X.ravel()
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            x = flat.take(row_offsets + self.feature.take(node))
+            go_left = x <= self.threshold.take(node)
+            missing = np.isnan(x)
+            if missing.any():
+                go_left |= missing & self.missing_left.take(node)
+            node = self.children.take(2 * node + ~go_left)
+
+        # cumsum adds tree by tree, like sklearn's depths += ..., so the sum is bit-identical
+        depths = np.cumsum(self.value.take(node), axis=1)[:, -1] if node.shape[1] else np.zeros(len(X))
+        scores = 2 ** (-np.divide(depths, self.denominator, out=np.ones_like(depths),
+                                  where=self.denominator != 0))
+        # score_samples is -scores; decision_function subtracts offset_
+        return -scores - self.offset_
+
+    def predict(self, X):
+        """1 for inliers, -1 for outliers, like IsolationForest.predict."""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def save(self, path):
+        """Write the arrays to an uncompressed .npz (no pickles)."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path, **{name: getattr(self, name) for name in self.ARRAYS},
+            max_depth=np.array(self.max_depth), denominator=np.array(self.denominator),
+            offset=np.array(self.offset_), n_features=np.array(self.n_features_in_),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(*(data[name] for name in cls.ARRAYS), max_depth=data["max_depth"],
+                       denominator=data["denominator"], offset=data["offset"], n_features=data["n_features"])
+
+
+def forest_filename(model_filename):
+    """The compiled forest is stored next to the joblib model: intrusion_model_forest.npz."""
+    return model_filename.replace(".joblib", "_forest.npz")
+
+
+if __name__ == "__main__":
+    import joblib
+
+    model_filename = sys.argv[1] if len(sys.argv) > 1 else "intrusion_model.joblib"
+    forest = CompiledForest.from_sklearn(joblib.load(model_filename))
+    forest.save(forest_filename(model_filename))
+    print(f"{len(forest.roots)} trees, {len(forest.value)} nodes -> {forest_filename(model_filename)}")
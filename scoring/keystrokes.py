@@ -0,0 +1,283 @@
+"""
+Keystroke dynamics from monotonic press/release timestamps.
+
+Keyboard rows carry press_ns/event_ns (time.monotonic_ns() at press and
+release). Consecutive keystrokes form digraphs with two latencies:
+  press->press   (PP)  time between the two key presses
+  release->press (RP)  the flight time; negative when keys overlap (rollover)
+
+Each stored window carries its DigraphHistogram features and, scored
+against the user's DigraphProfile, how far its latencies are from the
+user's usual ones (KEYSTROKE_ and PROFILE_FEATURE_NAMES).
+"""
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+# Histogram bin edges in milliseconds. The first bin holds negative RP
+# latencies (rollover); the rest are log-spaced up to MAX_DIGRAPH_GAP_MS.
+MAX_DIGRAPH_GAP_MS = 2000.0
+LATENCY_BIN_EDGES_MS = np.concatenate(([-np.inf, 0.0], np.geomspace(10.0, MAX_DIGRAPH_GAP_MS, 16)))
+
+KEYSTROKE_FEATURE_NAMES = [
+    "pp_mean_ms", "pp_std_ms", "pp_median_ms",
+    "rp_mean_ms", "rp_std_ms", "rp_median_ms",
+    "rollover_ratio", "dwell_std_ms", "digraph_count", "distinct_digraphs",
+]
+
+
+def timed_keystrokes(keyboard_events):
+    """
+    Return (keys, press_ns, release_ns) for the rows that carry monotonic
+    timestamps, ordered by press time. Rows are (key, key_interval, timestamp,
+    press_ns, event_ns); older rows without the last two are skipped.
+    """
+    timed = [e for e in keyboard_events if len(e) >= 5 and e[3] is not None and e[4] is not None]
+    timed.sort(key=lambda e: e[3])
+    keys = [e[0] for e in timed]
+    press_ns = np.fromiter((e[3] for e in timed), dtype=np.int64, count=len(timed))
+    release_ns = np.fromiter((e[4] for e in timed), dtype=np.int64, count=len(timed))
+    return keys, press_ns, release_ns
+
+
+class DigraphHistogram:
+    """
+    PP and RP latency histograms for one window, one row per distinct key pair.
+
+    pairs:       list of (first_key, second_key), row order of the arrays below
+    pair_ids:    row index of every digraph, in typing order
+    pp_ms/rp_ms: latency of every digraph
+    pp_hist/rp_hist: (n_pairs, n_bins) counts over LATENCY_BIN_EDGES_MS
+    counts, pp_sum, rp_sum: per-pair totals for per-pair means
+    """
+
+    def __init__(self, pairs, pair_ids, pp_ms, rp_ms, dwell_ms):
+        self.pairs = pairs
+        self.pair_ids = pair_ids
+        self.pp_ms = pp_ms
+        self.rp_ms = rp_ms
+        self.dwell_ms = dwell_ms
+
+        n_pairs = len(pairs)
+        n_bins = len(LATENCY_BIN_EDGES_MS) - 1
+        self.pp_hist = np.zeros((n_pairs, n_bins), dtype=np.int32)
+        self.rp_hist = np.zeros((n_pairs, n_bins), dtype=np.int32)
+        np.add.at(self.pp_hist, (pair_ids, _bin_index(pp_ms)), 1)
+        np.add.at(self.rp_hist, (pair_ids, _bin_index(rp_ms)), 1)
+        self.counts = np.bincount(pair_ids, minlength=n_pairs)
+        self.pp_sum = np.bincount(pair_ids, weights=pp_ms, minlength=n_pairs)
+        self.rp_sum = np.bincount(pair_ids, weights=rp_ms, minlength=n_pairs)
+
+    @classmethod
+    def from_events(cls, keyboard_events):
+        keys, press_ns, release_ns = timed_keystrokes(keyboard_events)
+        dwell_ms = (release_ns - press_ns) / 1e6
+        if len(keys) < 2:
+            return cls([], np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0), dwell_ms)
+
+        pp_ms = np.diff(press_ns) / 1e6
+        rp_ms = (press_ns[1:] - release_ns[:-1]) / 1e6
+        # Long pauses are think time, not digraphs
+        keep = pp_ms <= MAX_DIGRAPH_GAP_MS
+
+        pair_index = {}
+        pair_ids = []
+        for i in np.flatnonzero(keep):
+            pair = (keys[i], keys[i + 1])
+            pair_ids.append(pair_index.setdefault(pair, len(pair_index)))
+        return cls(list(pair_index), np.asarray(pair_ids, dtype=np.intp), pp_ms[keep], rp_ms[keep], dwell_ms)
+
+    @property
+    def count(self):
+        return int(self.pp_ms.size)
+
+    def pair_means(self):
+        """Per-pair (pp_mean_ms, rp_mean_ms) arrays, aligned with self.pairs."""
+        counts = np.maximum(self.counts, 1)
+        return self.pp_sum / counts, self.rp_sum / counts
+
+    def features(self):
+        """Window-level keystroke features, ordered as KEYSTROKE_FEATURE_NAMES."""
+        dwell_std = float(self.dwell_ms.std()) if self.dwell_ms.size else 0.0
+        if not self.count:
+            return [0.0] * 7 + [dwell_std, 0, 0]
+        return [
+            float(self.pp_ms.mean()), float(self.pp_ms.std()), float(np.median(self.pp_ms)),
+            float(self.rp_ms.mean()), float(self.rp_ms.std()), float(np.median(self.rp_ms)),
+            float(np.mean(self.rp_ms < 0)), dwell_std, self.count, len(self.pairs),
+        ]
+
+
+def _bin_index(latencies_ms):
+    return np.clip(np.searchsorted(LATENCY_BIN_EDGES_MS, latencies_ms, side="right") - 1,
+                   0, len(LATENCY_BIN_EDGES_MS) - 2)
+
+
+class DigraphStream:
+    """
+    Turns live press/release callbacks into completed digraphs.
+
+    Keystrokes are kept in press order; a digraph (a, b) is emitted once both
+    a and b have been released, so rollover (b pressed before a is released)
+    still yields the correct negative release->press latency.
+    """
+
+    def __init__(self, history=16):
+        self.keystrokes = deque(maxlen=history)  # [key, press_ns, release_ns or None]
+
+    def press(self, key, press_ns):
+        self.keystrokes.append([key, press_ns, None])
+
+    def release(self, key, release_ns):
+        """Record a release; return [((a, b), pp_ms, rp_ms), ...] for digraphs completed by it."""
+        strokes = self.keystrokes
+        index = None
+        for i in range(len(strokes) - 1, -1, -1):
+            if strokes[i][0] == key and strokes[i][2] is None:
+                index = i
+                break
+        if index is None:
+            return []
+        strokes[index][2] = release_ns
+
+        completed = []
+        for first, second in ((index - 1, index), (index, index + 1)):
+            if first < 0 or second >= len(strokes):
+                continue
+            a, b = strokes[first], strokes[second]
+            if a[2] is None or b[2] is None:
+                continue
+            pp_ms = (b[1] - a[1]) / 1e6
+            if pp_ms <= MAX_DIGRAPH_GAP_MS:
+                completed.append(((a[0], b[0]), pp_ms, (b[1] - a[2]) / 1e6))
+        return completed
+
+
+PROFILE_FEATURE_NAMES = ["profile_pp_z", "profile_rp_z", "profile_coverage"]
+
+
+class DigraphProfile:
+    """
+    Running PP/RP mean and variance for at most `capacity` digraphs.
+
+    Statistics live in fixed-size NumPy arrays indexed through a pair -> slot
+    dict. Updates use Welford's algorithm; when the profile is full, a new
+    pair replaces the least frequently seen one (LFU).
+    """
+    MIN_COUNT = 5  # samples before a digraph is trusted for scoring
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.slots = {}
+        self.pairs = [None] * capacity
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.pp_mean = np.zeros(capacity)
+        self.pp_m2 = np.zeros(capacity)
+        self.rp_mean = np.zeros(capacity)
+        self.rp_m2 = np.zeros(capacity)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _slot_for(self, pair):
+        slot = self.slots.get(pair)
+        if slot is not None:
+            return slot
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            slot = int(np.argmin(self.counts))
+            del self.slots[self.pairs[slot]]
+        self.slots[pair] = slot
+        self.pairs[slot] = pair
+        self.counts[slot] = 0
+        self.pp_mean[slot] = self.pp_m2[slot] = 0.0
+        self.rp_mean[slot] = self.rp_m2[slot] = 0.0
+        return slot
+
+    def update(self, pair, pp_ms, rp_ms):
+        with self.lock:
+            slot = self._slot_for(pair)
+            self.counts[slot] += 1
+            n = self.counts[slot]
+            delta = pp_ms - self.pp_mean[slot]
+            self.pp_mean[slot] += delta / n
+            self.pp_m2[slot] += delta * (pp_ms - self.pp_mean[slot])
+            delta = rp_ms - self.rp_mean[slot]
+            self.rp_mean[slot] += delta / n
+            self.rp_m2[slot] += delta * (rp_ms - self.rp_mean[slot])
+
+    def update_from_histogram(self, histogram):
+        """Fold every digraph of a DigraphHistogram into the profile (e.g. when training)."""
+        for pair_id, pp_ms, rp_ms in zip(histogram.pair_ids, histogram.pp_ms, histogram.rp_ms):
+            self.update(histogram.pairs[pair_id], float(pp_ms), float(rp_ms))
+
+    def score(self, histogram):
+        """
+        Compare a window's digraphs with the profile, ordered as PROFILE_FEATURE_NAMES:
+        mean |z| of PP and RP latencies over digraphs the profile knows, and the
+        fraction of the window's digraphs it knows.
+        """
+        if not histogram.count:
+            return [0.0, 0.0, 0.0]
+        with self.lock:
+            pair_slots = np.array([self.slots.get(pair, -1) for pair in histogram.pairs], dtype=np.intp)
+            slots = pair_slots[histogram.pair_ids]
+            known = slots >= 0
+            known[known] = self.counts[slots[known]] >= self.MIN_COUNT
+            if not known.any():
+                return [0.0, 0.0, 0.0]
+            slots = slots[known]
+            n = self.counts[slots]
+            pp_std = np.sqrt(self.pp_m2[slots] / (n - 1))
+            rp_std = np.sqrt(self.rp_m2[slots] / (n - 1))
+            pp_z = np.abs(histogram.pp_ms[known] - self.pp_mean[slots]) / np.maximum(pp_std, 1.0)
+            rp_z = np.abs(histogram.rp_ms[known] - self.rp_mean[slots]) / np.maximum(rp_std, 1.0)
+        return [float(pp_z.mean()), float(rp_z.mean()), float(known.mean())]
+
+    def save(self, path):
+        """Persist the occupied slots as a compressed .npz (no pickles)."""
+        with self.lock:
+            used = sorted(self.slots.values())
+            pairs = np.array([self.pairs[slot] for slot in used], dtype=str).reshape(-1, 2)
+            arrays = dict(
+                capacity=np.array(self.capacity),
+                pairs=pairs,
+                counts=self.counts[used],
+                pp_mean=self.pp_mean[used], pp_m2=self.pp_m2[used],
+                rp_mean=self.rp_mean[used], rp_m2=self.rp_m2[used],
+            )
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, capacity=None):
+        """Load a saved profile; returns an empty profile if the file does not exist."""
+        if not os.path.exists(path):
+            return cls(capacity or 256)
+        with np.load(path, allow_pickle=False) as data:
+            profile = cls(capacity or int(data["capacity"]))
+            n = min(len(data["counts"]), profile.capacity)
+            # Keep the most frequent digraphs if the capacity shrank
+            order = np.argsort(-data["counts"], kind="stable")[:n]
+            for slot, row in enumerate(order):
+                pair = tuple(str(key) for key in data["pairs"][row])
+                profile.slots[pair] = slot
+                profile.pairs[slot] = pair
+            profile.counts[:n] = data["counts"][order]
+            profile.pp_mean[:n] = data["pp_mean"][order]
+            profile.pp_m2[:n] = data["pp_m2"][order]
+            profile.rp_mean[:n] = data["rp_mean"][order]
+            profile.rp_m2[:n] = data["rp_m2"][order]
+        return profile
+
+
+def digraph_profile_filename(model_filename):
+    """The profile is stored next to the joblib model: intrusion_model_digraphs.npz."""
+    return model_filename.replace(".joblib", "_digraphs.npz")
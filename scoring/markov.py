@@ -0,0 +1,158 @@
+"""
+Markov models of event sequences.
+
+A MarkovChain learns first- and second-order transition counts over a
+sequence of symbols: the user-driven event types of the activity log
+(USER_EVENT_TYPES) or the apps that take focus. Counts are sparse,
+one dict per context that has been seen, so memory grows with the
+transitions that actually occur rather than with vocabulary size squared.
+
+Probabilities use add-alpha smoothing. The second-order estimate is blended
+with the first-order one, weighted by how often its context has been seen:
+    p(x | a, b) = lam * P2(x | a, b) + (1 - lam) * P1(x | b),  lam = n(a, b) / (n(a, b) + BACKOFF)
+A window's surprise is the mean negative log-likelihood of its transitions,
+which takes a couple of dict lookups per event.
+"""
+import math
+import os
+import threading
+
+import numpy as np
+
+MARKOV_FEATURE_NAMES = ["event_type_surprise", "event_type_max_surprise", "app_surprise"]
+
+# Event types the event chain learns. Timer-driven rows (PC Usage, All Apps
+# Open) and the high-rate Mouse Move strokes would swamp the user's actions.
+USER_EVENT_TYPES = ("Keyboard", "Click", "Scroll", "App in Focus", "App Open", "App Closed")
+
+
+class MarkovChain:
+    """Online first/second-order transition counts with smoothed log-likelihoods."""
+
+    ALPHA = 0.5    # additive smoothing
+    BACKOFF = 5.0  # second-order contexts seen this often get half the weight
+
+    def __init__(self, order=2):
+        if order not in (1, 2):
+            raise ValueError("order must be 1 or 2")
+        self.order = order
+        self.index = {}     # symbol -> id
+        self.symbols = []   # id -> symbol
+        self.counts1 = {}   # b -> {x: count}
+        self.totals1 = {}   # b -> count
+        self.counts2 = {}   # (a, b) -> {x: count}
+        self.totals2 = {}   # (a, b) -> count
+        self.history = []   # last `order` symbol ids seen by observe()
+        self.lock = threading.Lock()
+
+    def _id(self, symbol):
+        symbol_id = self.index.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def _count(self, a, b, x, n=1):
+        counts = self.counts1.setdefault(b, {})
+        counts[x] = counts.get(x, 0) + n
+        self.totals1[b] = self.totals1.get(b, 0) + n
+        if self.order == 2 and a is not None:
+            counts = self.counts2.setdefault((a, b), {})
+            counts[x] = counts.get(x, 0) + n
+            self.totals2[(a, b)] = self.totals2.get((a, b), 0) + n
+
+    def observe(self, symbol):
+        """Add the next symbol of the live stream (called from log_event)."""
+        with self.lock:
+            x = self._id(symbol)
+            history = self.history
+            if history:
+                self._count(history[-2] if len(history) > 1 else None, history[-1], x)
+            history.append(x)
+            if len(history) > self.order:
+                del history[0]
+
+    def update(self, symbols):
+        """Count every transition of a finished sequence (e.g. when training)."""
+        with self.lock:
+            ids = [self._id(symbol) for symbol in symbols]
+            for i in range(1, len(ids)):
+                self._count(ids[i - 2] if i > 1 else None, ids[i - 1], ids[i])
+
+    def _log_prob(self, a, b, x, vocabulary):
+        alpha = self.ALPHA
+        n1 = self.totals1.get(b, 0)
+        c1 = self.counts1[b].get(x, 0) if n1 else 0
+        p = (c1 + alpha) / (n1 + alpha * vocabulary)
+        if self.order == 2 and a is not None:
+            n2 = self.totals2.get((a, b), 0)
+            if n2:
+                p2 = (self.counts2[(a, b)].get(x, 0) + alpha) / (n2 + alpha * vocabulary)
+                lam = n2 / (n2 + self.BACKOFF)
+                p = lam * p2 + (1 - lam) * p
+        return math.log(p)
+
+    def surprise(self, symbols):
+        """
+        (mean, max) negative log-likelihood of a window's transitions, in nats;
+        (0, 0) for fewer than two symbols. Unknown symbols get the smoothed
+        probability of an unseen transition.
+        """
+        if len(symbols) < 2:
+            return 0.0, 0.0
+        with self.lock:
+            vocabulary = len(self.symbols) + 1  # +1 for symbols never seen
+            ids = [self.index.get(symbol, -1) for symbol in symbols]
+            total = 0.0
+            worst = 0.0
+            for i in range(1, len(ids)):
+                nll = -self._log_prob(ids[i - 2] if i > 1 else None, ids[i - 1], ids[i], vocabulary)
+                total += nll
+                worst = max(worst, nll)
+        return total / (len(ids) - 1), worst
+
+    def save(self, path):
+        """Persist the counts as COO arrays in a compressed .npz (no pickles)."""
+        with self.lock:
+            rows1 = [(b, x, n) for b, counts in self.counts1.items() for x, n in counts.items()]
+            rows2 = [(a, b, x, n) for (a, b), counts in self.counts2.items() for x, n in counts.items()]
+            arrays = dict(
+                order=np.array(self.order),
+                symbols=np.array(self.symbols, dtype=str),
+                first=np.array(rows1, dtype=np.int64).reshape(-1, 3),
+                second=np.array(rows2, dtype=np.int64).reshape(-1, 4),
+            )
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, order=2):
+        """Load saved counts; returns an empty chain if the file does not exist."""
+        if not os.path.exists(path):
+            return cls(order)
+        with np.load(path, allow_pickle=False) as data:
+            chain = cls(int(data["order"]))
+            for symbol in data["symbols"].tolist():
+                chain._id(symbol)
+            for b, x, n in data["first"].tolist():
+                chain.counts1.setdefault(b, {})[x] = n
+                chain.totals1[b] = chain.totals1.get(b, 0) + n
+            for a, b, x, n in data["second"].tolist():
+                chain.counts2.setdefault((a, b), {})[x] = n
+                chain.totals2[(a, b)] = chain.totals2.get((a, b), 0) + n
+        return chain
+
+
+def markov_filename(model_filename, name):
+    """Chains are stored next to the joblib model: intrusion_model_markov_<name>.npz."""
+    return model_filename.replace(".joblib", f"_markov_{name}.npz")
+
+
+def markov_features(event_chain, app_chain, event_types, apps):
+    """Window surprise scores, ordered as MARKOV_FEATURE_NAMES."""
+    event_mean, event_max = event_chain.surprise(event_types) if event_chain is not None else (0.0, 0.0)
+    app_mean, _ = app_chain.surprise(apps) if app_chain is not None else (0.0, 0.0)
+    return [event_mean, event_max, app_mean]
@@ -0,0 +1,167 @@
+"""
+Mouse trajectory capture and features.
+
+Pointer callbacks arrive at the device rate (hundreds per second), far too
+many to store. MouseMoveSampler keeps a point only once the pointer has
+moved MIN_DISTANCE_PX from the last kept point or MAX_INTERVAL_MS has passed,
+so fast sweeps are sampled by distance and slow drags by time. Kept points
+are grouped into strokes, split at pauses, and each stroke is stored as one
+"Mouse Move" row:
+
+  position  JSON [[x, y, ms since stroke start], ...]
+  press_ns  monotonic time of the first point
+  event_ns  monotonic time of the last point
+"""
+import json
+
+import numpy as np
+
+MIN_DISTANCE_PX = 8.0
+MAX_INTERVAL_MS = 100.0
+PAUSE_MS = 300.0          # a gap this long ends the stroke
+MAX_STROKE_POINTS = 128   # long continuous sweeps are split into several rows
+
+MOUSE_MOVE_FEATURE_NAMES = [
+    "move_speed_mean", "move_speed_std", "move_speed_max",
+    "move_accel_mean", "move_accel_std",
+    "move_curvature_mean", "move_straightness",
+    "move_stroke_count", "move_pause_mean_ms", "move_path_px",
+]
+
+
+class MouseMoveSampler:
+    """
+    Downsamples pointer callbacks into strokes.
+
+    move() returns a finished stroke as (points, start_ns, end_ns) when the
+    new point starts a new one, else None; flush() returns the open stroke.
+    points are [[x, y, ms since start_ns], ...].
+    """
+
+    def __init__(self):
+        self.points = []
+        self.start_ns = None
+        self.kept = None      # (x, y, ns) of the last kept point
+        self.latest = None    # (x, y, ns) of the last raw point
+
+    def move(self, x, y, ns):
+        finished = None
+        if self.latest is not None and (ns - self.latest[2]) / 1e6 >= PAUSE_MS:
+            finished = self.flush()
+
+        self.latest = (x, y, ns)
+        if self.kept is None:
+            self._keep(x, y, ns)
+            return finished
+
+        kx, ky, kns = self.kept
+        if (x - kx) ** 2 + (y - ky) ** 2 >= MIN_DISTANCE_PX ** 2 or (ns - kns) / 1e6 >= MAX_INTERVAL_MS:
+            self._keep(x, y, ns)
+            if len(self.points) >= MAX_STROKE_POINTS:
+                finished = self.flush()
+        return finished
+
+    def flush(self):
+        """Close the open stroke, keeping the final resting point, and return it (or None)."""
+        if self.latest is not None and self.kept is not None and self.latest != self.kept:
+            self._keep(*self.latest)
+        stroke = None
+        if len(self.points) >= 2:
+            stroke = (self.points, self.start_ns, self.kept[2])
+        self.points = []
+        self.start_ns = None
+        self.kept = None
+        self.latest = None
+        return stroke
+
+    def idle(self, ns):
+        """Return the open stroke if the pointer has been still for PAUSE_MS, else None."""
+        if self.latest is not None and (ns - self.latest[2]) / 1e6 >= PAUSE_MS:
+            return self.flush()
+        return None
+
+    def _keep(self, x, y, ns):
+        if self.start_ns is None:
+            self.start_ns = ns
+        self.points.append([x, y, round((ns - self.start_ns) / 1e6, 1)])
+        self.kept = (x, y, ns)
+
+
+def trajectory_arrays(move_events):
+    """
+    Flatten "Mouse Move" rows (position, press_ns, event_ns) into point arrays.
+
+    Returns (xy, t_ms, stroke_ids, bounds) where t_ms is on the shared
+    monotonic clock and bounds is an (n_strokes, 2) array of start/end ms,
+    all ordered by stroke start.
+    """
+    strokes = []
+    for position, press_ns, event_ns in move_events:
+        if not position or press_ns is None:
+            continue
+        try:
+            points = json.loads(position)
+        except ValueError:
+            continue
+        if len(points) >= 2:
+            strokes.append((press_ns, event_ns, points))
+    strokes.sort(key=lambda s: s[0])
+
+    if not strokes:
+        return np.zeros((0, 2)), np.zeros(0), np.zeros(0, dtype=np.intp), np.zeros((0, 2))
+    lengths = [len(points) for _, _, points in strokes]
+    flat = np.array([p for _, _, points in strokes for p in points], dtype=float)
+    offsets = np.repeat([press_ns / 1e6 for press_ns, _, _ in strokes], lengths)
+    stroke_ids = np.repeat(np.arange(len(strokes)), lengths)
+    bounds = np.array([(press_ns / 1e6, (event_ns or press_ns) / 1e6) for press_ns, event_ns, _ in strokes])
+    return flat[:, :2], flat[:, 2] + offsets, stroke_ids, bounds
+
+
+def mouse_move_features(move_events):
+    """Per-window trajectory features, ordered as MOUSE_MOVE_FEATURE_NAMES."""
+    xy, t_ms, stroke_ids, bounds = trajectory_arrays(move_events)
+    if not len(bounds):
+        return [0.0] * len(MOUSE_MOVE_FEATURE_NAMES)
+
+    # Segments between consecutive points of the same stroke
+    same = stroke_ids[1:] == stroke_ids[:-1]
+    delta = np.diff(xy, axis=0)[same]
+    dt = np.diff(t_ms)[same] / 1000.0
+    seg_ids = stroke_ids[1:][same]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    valid = dt > 0
+    speed = np.zeros_like(length)
+    speed[valid] = length[valid] / dt[valid]
+
+    # Acceleration and turning angle between consecutive segments of a stroke
+    pair = seg_ids[1:] == seg_ids[:-1]
+    dt_pair = ((dt[1:] + dt[:-1]) / 2)[pair]
+    accel = np.divide(np.diff(speed)[pair], dt_pair, out=np.zeros(int(pair.sum())), where=dt_pair > 0)
+    heading = np.arctan2(delta[:, 1], delta[:, 0])
+    turn = np.abs(np.angle(np.exp(1j * np.diff(heading))))[pair]
+    moving = ((length[1:] > 0) & (length[:-1] > 0))[pair]
+    curvature = float(turn[moving].mean()) if moving.any() else 0.0
+
+    # Straightness: chord / path length per stroke, averaged
+    path = np.bincount(seg_ids, weights=length, minlength=len(bounds))
+    starts = np.flatnonzero(np.r_[True, stroke_ids[1:] != stroke_ids[:-1]])
+    ends = np.r_[starts[1:], len(stroke_ids)] - 1
+    chord = np.hypot(*(xy[ends] - xy[starts]).T)
+    has_path = path > 0
+    straightness = float((chord[has_path] / path[has_path]).mean()) if has_path.any() else 0.0
+
+    pauses = bounds[1:, 0] - bounds[:-1, 1]
+    pauses = pauses[pauses > 0]
+
+    return [
+        float(speed.mean()) if speed.size else 0.0,
+        float(speed.std()) if speed.size else 0.0,
+        float(speed.max()) if speed.size else 0.0,
+        float(np.abs(accel).mean()) if accel.size else 0.0,
+        float(accel.std()) if accel.size else 0.0,
+        curvature,
+        straightness,
+        len(bounds),
+        float(pauses.mean()) if pauses.size else 0.0,
+        float(path.sum()),
+    ]
@@ -0,0 +1,167 @@
+"""
+Preprocessing and model fused into one scoring artifact.
+
+A ScoringPipeline standardises a feature row with the scaler's mean/scale
+arrays and scores it with the compiled IsolationForest, the same arithmetic
+as scaler.transform() followed by clf.decision_function(). Values that are
+NaN or infinite (an empty window divides by zero somewhere) are imputed
+with the training mean, i.e. 0 after scaling.
+
+The pipeline is stored as one file, intrusion_model_pipeline.bin:
+  8 bytes   magic, b"SBMPIPE" + format version
+  4 bytes   little-endian length of the JSON header
+  header    JSON: feature names, their schema id, scalars, and the dtype,
+            shape and offset of every array
+  arrays    raw, each starting on an ALIGN-byte boundary
+load() maps the file once and wraps the arrays in place, so loading is a
+single mmap with no unpickling and no copies of the tree arrays.
+
+Usage:
+    python -m scoring.pipeline intrusion_model.joblib   # writes intrusion_model_pipeline.bin
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from scoring.ensemble import Detector
+from scoring.forest import CompiledForest
+
+FORMAT_VERSION = 1
+MAGIC = b"SBMPIPE" + bytes([FORMAT_VERSION])
+ALIGN = 64
+
+
+def feature_schema(feature_names):
+    """Schema id of an ordered feature list; changes when a feature is added, removed or moved."""
+    return zlib.crc32(",".join(feature_names).encode())
+
+
+class ScoringPipeline(Detector):
+    """Scaler + compiled IsolationForest; drop-in for decision_function/predict on raw features."""
+
+    def __init__(self, mean, scale, forest, feature_names):
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale, dtype=np.float64)
+        self.forest = forest
+        self.feature_names = list(feature_names)
+        self.schema = feature_schema(self.feature_names)
+        if not len(self.mean) == len(self.scale) == len(self.feature_names) == forest.n_features_in_:
+            raise ValueError(f"scaler has {len(self.mean)} features, names {len(self.feature_names)}, "
+                             f"forest {forest.n_features_in_}")
+        self.n_features_in_ = forest.n_features_in_
+        self.offset_ = forest.offset_
+
+    @classmethod
+    def from_sklearn(cls, clf, scaler, feature_names):
+        """Fuse a fitted StandardScaler and IsolationForest."""
+        return cls(scaler.mean_, scaler.scale_, CompiledForest.from_sklearn(clf), feature_names)
+
+    def check_schema(self, feature_names):
+        """Raise ValueError unless rows are built as `feature_names` (the names the model was trained on)."""
+        if feature_schema(feature_names) != self.schema:
+            raise ValueError(f"model expects features {self.feature_names}, got {list(feature_names)}")
+
+    def transform(self, X):
+        """Standardise raw rows; non-finite values become the training mean."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected rows of {self.n_features_in_} features, got shape {X.shape}")
+        scaled = (X - self.mean) / self.scale
+        finite = np.isfinite(scaled)
+        if not finite.all():
+            scaled[~finite] = 0.0
+        return scaled
+
+    def decision_function(self, X):
+        """IsolationForest.decision_function of the scaled rows: negative for anomalies."""
+        return self.forest.decision_function(self.transform(X))
+
+    def _arrays(self):
+        arrays = {"mean": self.mean, "scale": self.scale}
+        arrays.update((f"forest.{name}", getattr(self.forest, name)) for name in CompiledForest.ARRAYS)
+        return arrays
+
+    def save(self, path):
+        """Write the single-file artifact (see the module docstring for the layout)."""
+        arrays = self._arrays()
+        header = {
+            "format": FORMAT_VERSION,
+            "features": self.feature_names,
+            "schema": self.schema,
+            "forest": {"max_depth": self.forest.max_depth, "denominator": self.forest.denominator,
+                       "offset": self.forest.offset_, "n_features": self.forest.n_features_in_},
+            "arrays": {},
+        }
+        # Offsets are relative to the data section, which starts at the first
+        # ALIGN boundary after the header
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _aligned(offset + array.nbytes)
+        encoded = json.dumps(header).encode()
+        data_start = _aligned(len(MAGIC) + 4 + len(encoded))
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+            for name, array in arrays.items():
+                f.write(b"\0" * (data_start + header["arrays"][name]["offset"] - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Map a saved pipeline; raises ValueError for a file of another format version."""
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} scoring pipeline; "
+                             f"rebuild it with python -m scoring.pipeline")
+        (header_size,) = struct.unpack_from("<I", buffer, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(buffer[start:start + header_size]))
+        data_start = _aligned(start + header_size)
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[name] = np.frombuffer(buffer, dtype, count, data_start + spec["offset"]).reshape(spec["shape"])
+        scalars = header["forest"]
+        forest = CompiledForest(*(arrays[f"forest.{name}"] for name in CompiledForest.ARRAYS),
+                                max_depth=scalars["max_depth"], denominator=scalars["denominator"],
+                                offset=scalars["offset"], n_features=scalars["n_features"])
+        pipeline = cls(arrays["mean"], arrays["scale"], forest, header["features"])
+        if pipeline.schema != header["schema"]:
+            raise ValueError(f"{path}: feature schema {header['schema']} does not match its feature names")
+        return pipeline
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def pipeline_filename(model_filename):
+    """The fused pipeline is stored next to the joblib model: intrusion_model_pipeline.bin."""
+    return model_filename.replace(".joblib", "_pipeline.bin")
+
+
+if __name__ == "__main__":
+    import joblib
+
+    from scoring.detector import scaler_filename
+    from scoring.features import FEATURE_NAMES
+
+    model_filename = sys.argv[1] if len(sys.argv) > 1 else "intrusion_model.joblib"
+    pipeline = ScoringPipeline.from_sklearn(joblib.load(model_filename), joblib.load(scaler_filename(model_filename)),
+                                            FEATURE_NAMES)
+    pipeline.save(pipeline_filename(model_filename))
+    print(f"{len(pipeline.forest.roots)} trees, {len(pipeline.feature_names)} features "
+          f"-> {pipeline_filename(model_filename)}")
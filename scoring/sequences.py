@@ -0,0 +1,163 @@
+"""
+Sequential patterns of application focus.
+
+Focus history is turned into sessions of integer app ids (consecutive
+repeats collapsed) and mined with PrefixSpan for frequent contiguous
+workflows such as editor -> terminal -> browser -> editor. Support is the
+number of sessions a pattern occurs in; the projected database keeps every
+occurrence as a (session, next position) pointer, so no session is copied.
+
+The mined patterns are compiled into a prefix automaton (Aho-Corasick over
+app ids). Scoring a window walks its app sequence once, so it is linear in
+the window's length whatever the number of patterns.
+"""
+import os
+from collections import deque
+
+import numpy as np
+
+SEQUENCE_FEATURE_NAMES = ["pattern_coverage", "pattern_support", "unmatched_transitions"]
+
+MIN_PATTERN_LENGTH = 2  # single apps say nothing about workflow
+
+
+def collapse(app_ids):
+    """Drop consecutive repeats: [3, 3, 5, 5, 3] -> [3, 5, 3]."""
+    collapsed = []
+    for app_id in app_ids:
+        if not collapsed or collapsed[-1] != app_id:
+            collapsed.append(app_id)
+    return collapsed
+
+
+def prefixspan(sequences, min_support, max_length=6):
+    """
+    Frequent contiguous patterns of integer sequences.
+    Returns [(pattern tuple, support)], patterns of every length up to max_length.
+    """
+    patterns = []
+    # Projected database of the empty prefix: every position of every sequence
+    stack = [((), [(s, i) for s, sequence in enumerate(sequences) for i in range(len(sequence))])]
+    while stack:
+        prefix, projected = stack.pop()
+        # Occurrences of each next item, and the sessions it occurs in
+        extensions = {}
+        for s, i in projected:
+            sequence = sequences[s]
+            if i < len(sequence):
+                occurrences, sessions = extensions.setdefault(sequence[i], ([], set()))
+                occurrences.append((s, i + 1))
+                sessions.add(s)
+        for item, (occurrences, sessions) in extensions.items():
+            if len(sessions) < min_support:
+                continue
+            pattern = prefix + (item,)
+            patterns.append((pattern, len(sessions)))
+            if len(pattern) < max_length:
+                stack.append((pattern, occurrences))
+    return patterns
+
+
+class SequencePatterns:
+    """Mined workflow patterns with a prefix automaton for linear-time window scoring."""
+
+    def __init__(self, patterns=(), sessions=0):
+        self.patterns = [(tuple(pattern), int(support)) for pattern, support in patterns
+                         if len(pattern) >= MIN_PATTERN_LENGTH]
+        self.sessions = sessions  # sessions mined; supports are out of this
+        self._build()
+
+    def _build(self):
+        # goto[state] maps app id -> state; best[state] is (length, support) of
+        # the longest pattern ending at this state, following failure links
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [(0, 0)]
+        for pattern, support in self.patterns:
+            state = 0
+            for app_id in pattern:
+                next_state = self.goto[state].get(app_id)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][app_id] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append((0, 0))
+                state = next_state
+            self.best[state] = max(self.best[state], (len(pattern), support))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for app_id, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and app_id not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(app_id, 0) if state else 0
+                self.best[child] = max(self.best[child], self.best[self.fail[child]])
+                queue.append(child)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def score(self, app_ids):
+        """
+        Match one window's app sequence, ordered as SEQUENCE_FEATURE_NAMES:
+        share of its transitions covered by a mined pattern, mean support
+        (as a share of sessions) of the longest pattern at each match, and
+        the number of transitions no pattern covers.
+        """
+        sequence = collapse(app_ids)
+        transitions = len(sequence) - 1
+        if transitions < 1 or not self.patterns:
+            return [0.0, 0.0, float(max(transitions, 0))]
+
+        covered = np.zeros(transitions, dtype=bool)
+        support_total = 0
+        matches = 0
+        goto, fail, best = self.goto, self.fail, self.best
+        state = 0
+        for i, app_id in enumerate(sequence):
+            while state and app_id not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(app_id, 0)
+            length, support = best[state]
+            if length:
+                # Transitions i-length+1 .. i-1 are inside the match
+                covered[i - length + 1:i] = True
+                support_total += support
+                matches += 1
+
+        mean_support = support_total / matches / max(self.sessions, 1) if matches else 0.0
+        return [float(covered.mean()), float(mean_support), float(transitions - covered.sum())]
+
+    def save(self, path):
+        """Persist as a compressed .npz: concatenated patterns, offsets and supports."""
+        lengths = np.array([len(pattern) for pattern, _ in self.patterns], dtype=np.int64)
+        arrays = dict(
+            items=np.array([app_id for pattern, _ in self.patterns for app_id in pattern], dtype=np.int64),
+            offsets=np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            supports=np.array([support for _, support in self.patterns], dtype=np.int64),
+            sessions=np.array(self.sessions),
+        )
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load saved patterns; returns an empty set if the file does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as data:
+            items, offsets = data["items"].tolist(), data["offsets"].tolist()
+            patterns = [(items[offsets[i]:offsets[i + 1]], support)
+                        for i, support in enumerate(data["supports"].tolist())]
+            return cls(patterns, int(data["sessions"]))
+
+
+def sequence_patterns_filename(model_filename):
+    """Patterns are stored next to the joblib model: intrusion_model_sequences.npz."""
+    return model_filename.replace(".joblib", "_sequences.npz")
@@ -0,0 +1,36 @@
+"""
+System-behaviour features from the "PC Usage" rows telemetry.py samples.
+
+Each row is (cpu_usage, memory_usage, process_cpu, io_bytes, spawned,
+duration). Rows written before the foreground-process columns existed have
+None there and only count towards the system averages.
+
+These are the last family of the stored window vector
+(features.EXTENDED_FEATURE_NAMES).
+"""
+import numpy as np
+
+# CPU and memory in %, foreground_io_rate in bytes/s, child_spawn_rate in processes/minute
+SYSTEM_FEATURE_NAMES = [
+    "system_cpu", "system_memory", "foreground_cpu", "foreground_io_rate", "child_spawn_rate",
+]
+
+
+def system_features(pc_events):
+    """Per-window system features, ordered as SYSTEM_FEATURE_NAMES."""
+    if not pc_events:
+        return [0.0] * len(SYSTEM_FEATURE_NAMES)
+    rows = np.array([[np.nan if value is None else value for value in row] for row in pc_events], dtype=float)
+    cpu, memory, process_cpu, io_bytes, spawned, duration = rows.T
+
+    def mean(values):
+        values = values[np.isfinite(values)]
+        return float(values.mean()) if len(values) else 0.0
+
+    def rate(values):
+        # per second of the sampled time the values cover
+        known = np.isfinite(values) & np.isfinite(duration) & (duration > 0)
+        seconds = duration[known].sum()
+        return float(values[known].sum() / seconds) if seconds > 0 else 0.0
+
+    return [mean(cpu), mean(memory), mean(process_cpu), rate(io_bytes), rate(spawned) * 60.0]
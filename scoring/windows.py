@@ -0,0 +1,290 @@
+"""
+Multi-scale feature windows.
+
+Windows come in several lengths (WINDOW_SCALES, 5s / 30s / 5min by default):
+short ones detect quickly, long ones give a stable baseline. A
+WindowAggregate holds the sufficient statistics behind the 16-feature
+vector of one window (counts, sums, the set of app transitions) plus its
+first and last keystroke, click and focus event. Merging the aggregates of
+adjacent windows gives the aggregate of their union, so a 30-second window
+is built from six 5-second ones and a 5-minute window from ten 30-second
+ones without re-reading events.
+
+The extra families of EXTENDED_FEATURE_NAMES (digraph latencies, mouse
+trajectories, app sequences, Markov surprise, system load) are not sums, so
+an aggregate also keeps the window's keystroke, "Mouse Move", focus app,
+event type and "PC Usage" rows; merging concatenates them and
+extended_features() computes those families over the union exactly.
+
+Pairs that straddle a boundary (flight time, click distance and speed,
+double clicks, app transitions) are recovered from the edge events. The one
+approximation is keystroke rollover across a boundary, where the later
+window's first key was pressed before the earlier window's last key.
+"""
+import ast
+import logging
+import os
+
+from scoring.apps import app_name
+from scoring.features import extra_features, parse_timestamp
+from scoring.keystrokes import MAX_DIGRAPH_GAP_MS, timed_keystrokes
+
+logger = logging.getLogger(__name__)
+
+# Window length the shipped model was trained on
+DEFAULT_WINDOW_SECONDS = 30
+
+# Window lengths in seconds, finest first; each must be a multiple of the one before
+WINDOW_SCALES = tuple(sorted(int(s) for s in os.environ.get("SBM_WINDOW_SCALES", "5,30,300").split(",")))
+
+MODIFIER_KEYS = {'Key.ctrl', 'Key.ctrl_l', 'Key.ctrl_r', 'Key.alt', 'Key.alt_l',
+                 'Key.alt_r', 'Key.cmd', 'Key.shift', 'Key.shift_l', 'Key.shift_r'}
+
+
+def check_scales(scales):
+    """Raise ValueError unless every scale is a positive multiple of the previous one."""
+    for finer, coarser in zip(scales, scales[1:]):
+        if finer <= 0 or coarser % finer:
+            raise ValueError(f"window scales {scales} must each be a multiple of the previous one")
+
+
+def model_scale(seconds):
+    """The profiles.model_path() scale of a window length (None for the shipped 30s model)."""
+    return None if seconds == DEFAULT_WINDOW_SECONDS else seconds
+
+
+class WindowAggregate:
+    """
+    Mergeable statistics of one window; features() gives the FEATURE_NAMES
+    vector and extended_features() the EXTENDED_FEATURE_NAMES one.
+    """
+
+    __slots__ = (
+        "keys", "shortcuts", "backspace", "dwell_sum", "dwell_n",
+        "rp_sum", "rp_n", "gap_sum", "gap_n", "first_key", "last_key", "first_key_time", "last_key_time",
+        "clicks", "last_click_interval", "distance_sum", "distance_n", "speed_sum", "speed_n",
+        "double_clicks", "first_click", "last_click",
+        "focus", "focus_duration_sum", "focus_duration_n", "transitions", "transition_set",
+        "first_app", "last_app",
+        "keystrokes", "moves", "apps", "event_types", "system",
+    )
+
+    def __init__(self):
+        # Keyboard: rp_* are digraph release->press latencies (ms), gap_* the
+        # timestamp gaps (s) used for windows without monotonic timings
+        self.keys = self.shortcuts = self.backspace = 0
+        self.dwell_sum, self.dwell_n = 0.0, 0
+        self.rp_sum, self.rp_n = 0.0, 0
+        self.gap_sum, self.gap_n = 0.0, 0
+        self.first_key = self.last_key = None            # (press_ns, release_ns)
+        self.first_key_time = self.last_key_time = None  # parsed timestamps
+        # Mouse
+        self.clicks = 0
+        self.last_click_interval = 0
+        self.distance_sum, self.distance_n = 0.0, 0
+        self.speed_sum, self.speed_n = 0.0, 0
+        self.double_clicks = 0
+        self.first_click = self.last_click = None        # (x, y, click_interval, epoch seconds)
+        # Focus
+        self.focus = 0
+        self.focus_duration_sum, self.focus_duration_n = 0.0, 0
+        self.transitions = 0
+        self.transition_set = set()  # (from app, to app)
+        self.first_app = self.last_app = None
+        # Rows of the extra families, in time order
+        self.keystrokes = []   # Keyboard rows
+        self.moves = []        # "Mouse Move" rows
+        self.apps = []         # app name of every focus event
+        self.event_types = []  # type of every user-driven event
+        self.system = []       # "PC Usage" rows
+
+    @property
+    def events(self):
+        return self.keys + self.clicks + self.focus
+
+    @classmethod
+    def from_events(cls, keyboard_events, mouse_events, focus_events, move_events=(), pc_events=(),
+                    event_types=()):
+        """Aggregate one window's rows (the same rows extract_extended_features takes)."""
+        agg = cls()
+        agg._add_keyboard(keyboard_events)
+        agg._add_mouse(mouse_events)
+        agg._add_focus(focus_events or [])
+        agg.keystrokes = list(keyboard_events)
+        agg.moves = list(move_events)
+        agg.apps = [app_name(title) for title, _, _ in focus_events or ()]
+        agg.event_types = list(event_types)
+        agg.system = list(pc_events)
+        return agg
+
+    def _add_keyboard(self, keyboard_events):
+        self.keys = len(keyboard_events)
+        for event in keyboard_events:
+            if event[0] in MODIFIER_KEYS:
+                self.shortcuts += 1
+            if event[0] == 'Key.backspace':
+                self.backspace += 1
+            if event[1] is not None:
+                self.dwell_sum += float(event[1])
+                self.dwell_n += 1
+
+        _, press_ns, release_ns = timed_keystrokes(keyboard_events)
+        if len(press_ns):
+            self.first_key = (int(press_ns[0]), int(release_ns[0]))
+            self.last_key = (int(press_ns[-1]), int(release_ns[-1]))
+            pp_ms = (press_ns[1:] - press_ns[:-1]) / 1e6
+            rp_ms = (press_ns[1:] - release_ns[:-1]) / 1e6
+            keep = pp_ms <= MAX_DIGRAPH_GAP_MS
+            self.rp_sum = float(rp_ms[keep].sum())
+            self.rp_n = int(keep.sum())
+
+        for event in keyboard_events:
+            try:
+                moment = parse_timestamp(event[2])
+            except (TypeError, ValueError):
+                continue
+            if self.last_key_time is None:
+                self.first_key_time = moment
+            else:
+                self.gap_sum += (moment - self.last_key_time).total_seconds()
+                self.gap_n += 1
+            self.last_key_time = moment
+
+    def _add_mouse(self, mouse_events):
+        self.clicks = len(mouse_events)
+        for i, (click_type, click_interval, position_str, timestamp_str) in enumerate(mouse_events):
+            # Like extract_features, the interval feature is the last click's interval
+            self.last_click_interval = click_interval if click_interval > 0 else 0
+            try:
+                x, y = ast.literal_eval(position_str)
+                click_time = parse_timestamp(timestamp_str).timestamp()
+            except (SyntaxError, TypeError, ValueError) as e:
+                logger.warning(f"Error processing mouse data point {i+1}: {e}")
+                break
+            click = (x, y, click_interval, click_time)
+            if self.last_click is None:
+                self.first_click = click
+                self.speed_n += 1  # the first click of a window counts as speed 0
+            else:
+                self._add_click_pair(self.last_click, click)
+            self.last_click = click
+
+    def _add_click_pair(self, previous, click):
+        """Statistics of two consecutive clicks, except the first click's speed entry."""
+        x1, y1, _, t1 = previous
+        x, y, click_interval, t = click
+        distance = ((x - x1)**2 + (y - y1)**2)**0.5
+        self.distance_sum += distance
+        self.distance_n += 1
+        self.speed_sum += distance / click_interval if click_interval > 0 else 0
+        self.speed_n += 1
+        if t - t1 < 0.5:
+            self.double_clicks += 1
+        if t - t1 > 0:
+            self.speed_sum += (x - x1) / (t - t1)
+            self.speed_n += 1
+
+    def _add_focus(self, focus_events):
+        self.focus = len(focus_events)
+        for i, (title, focus_duration, timestamp_str) in enumerate(focus_events):
+            app = app_name(title)
+            if i == 0:
+                self.first_app = app
+            elif self.last_app and app != self.last_app:
+                self.transitions += 1
+                self.transition_set.add((self.last_app, app))
+            self.last_app = app
+            try:
+                parse_timestamp(timestamp_str)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Error converting focus timestamp: {timestamp_str}. Error: {e}")
+                break
+            self.focus_duration_sum += focus_duration
+            self.focus_duration_n += 1
+
+    def merge(self, later):
+        """Aggregate of this window followed directly by `later`."""
+        merged = WindowAggregate()
+        for name in ("keys", "shortcuts", "backspace", "dwell_sum", "dwell_n", "rp_sum", "rp_n",
+                     "gap_sum", "gap_n", "clicks", "distance_sum", "distance_n", "speed_sum", "speed_n",
+                     "double_clicks", "focus", "focus_duration_sum", "focus_duration_n", "transitions"):
+            setattr(merged, name, getattr(self, name) + getattr(later, name))
+        merged.transition_set = self.transition_set | later.transition_set
+        for name in ("keystrokes", "moves", "apps", "event_types", "system"):
+            setattr(merged, name, getattr(self, name) + getattr(later, name))
+
+        # Keyboard edges
+        merged.first_key = self.first_key or later.first_key
+        merged.last_key = later.last_key or self.last_key
+        if self.last_key and later.first_key:
+            pp_ms = (later.first_key[0] - self.last_key[0]) / 1e6
+            if 0 <= pp_ms <= MAX_DIGRAPH_GAP_MS:
+                merged.rp_sum += (later.first_key[0] - self.last_key[1]) / 1e6
+                merged.rp_n += 1
+        merged.first_key_time = self.first_key_time or later.first_key_time
+        merged.last_key_time = later.last_key_time or self.last_key_time
+        if self.last_key_time and later.first_key_time:
+            merged.gap_sum += (later.first_key_time - self.last_key_time).total_seconds()
+            merged.gap_n += 1
+
+        # Mouse edges: the later window's first click loses its speed-0 entry
+        # and becomes an ordinary second click of a pair
+        merged.last_click_interval = later.last_click_interval if later.clicks else self.last_click_interval
+        merged.first_click = self.first_click or later.first_click
+        merged.last_click = later.last_click or self.last_click
+        if self.last_click and later.first_click:
+            merged.speed_n -= 1
+            merged._add_click_pair(self.last_click, later.first_click)
+
+        # Focus edges
+        merged.first_app = self.first_app if self.focus else later.first_app
+        merged.last_app = later.last_app if later.focus else self.last_app
+        if self.focus and later.focus and self.last_app and later.first_app != self.last_app:
+            merged.transitions += 1
+            merged.transition_set.add((self.last_app, later.first_app))
+        return merged
+
+    def features(self, duration):
+        """The FEATURE_NAMES vector of this window, `duration` seconds long."""
+        if not self.keys:
+            keyboard_features = [0] * 5
+        else:
+            if self.rp_n:
+                flight_time = self.rp_sum / self.rp_n / 1000
+            else:
+                flight_time = self.gap_sum / self.gap_n if self.gap_n else 0
+            keyboard_features = [
+                self.keys / duration if duration > 0 else 0, self.shortcuts, self.backspace,
+                self.dwell_sum / self.dwell_n if self.dwell_n else 0, flight_time,
+            ]
+
+        if not self.clicks:
+            mouse_features = [0] * 4
+        else:
+            mouse_features = [
+                self.last_click_interval,
+                self.distance_sum / self.distance_n if self.distance_n else 0,
+                self.speed_sum / self.speed_n if self.speed_n else 0,
+                self.double_clicks,
+            ]
+
+        if not self.focus:
+            focus_features = [0] * 7
+        else:
+            mean_duration = self.focus_duration_sum / self.focus_duration_n if self.focus_duration_n else 0
+            focus_features = [0, 0, mean_duration, self.transitions, len(self.transition_set),
+                              self.transitions / duration, 0]
+        return keyboard_features + mouse_features + focus_features
+
+    def extended_features(self, duration, context=None):
+        """The EXTENDED_FEATURE_NAMES vector; context is an optional FeatureContext."""
+        return self.features(duration) + extra_features(self.keystrokes, self.moves, self.apps, self.event_types,
+                                                        self.system, context)
+
+
+def merge_all(aggregates):
+    """Merge consecutive window aggregates, oldest first."""
+    merged = WindowAggregate()
+    for aggregate in aggregates:
+        merged = merged.merge(aggregate)
+    return merged
@@ -0,0 +1,124 @@
+"""
+Learn a profile's habitual app workflows from its focus history.
+
+The "App in Focus" history (the Parquet archive plus what is still in
+soft_activity.sqlite) is cut into sessions at idle gaps, encoded as integer
+app ids (storage.app_ids) and mined with scoring.sequences.prefixspan. The
+patterns are saved next to the profile's model as
+intrusion_model_sequences.npz. window_features scores every window's app
+sequence against them (pattern_coverage, pattern_support and
+unmatched_transitions in the stored vector); the activity monitor swaps in
+each new pattern set as it is mined.
+
+Usage:
+    python sequence_mining.py [--days 30] [--min-support 0.05]
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import archive
+import metrics
+import profiles
+import storage
+from scoring.sequences import SequencePatterns, collapse, prefixspan, sequence_patterns_filename
+
+logger = logging.getLogger(__name__)
+
+SESSION_GAP_SECONDS = 300   # a longer pause in focus changes starts a new session
+MAX_SESSION_APPS = 200      # long sessions are cut so one day at the desk is not a single sequence
+MIN_SUPPORT_RATIO = 0.05    # a pattern must occur in this share of sessions
+MIN_SUPPORT = 3
+MAX_PATTERN_LENGTH = 6
+MINE_EVERY_SECONDS = 24 * 3600
+
+MINE_SECONDS = metrics.histogram("sbm_sequence_mining_seconds", "Time to mine focus patterns")
+PATTERNS_MINED = metrics.gauge("sbm_sequence_patterns", "Focus patterns in the current pattern set")
+
+
+def patterns_path(profile=None):
+    return sequence_patterns_filename(profiles.own_model_path(profile))
+
+
+def load(profile=None):
+    """The profile's saved patterns, or None before its first mining."""
+    path = patterns_path(profile)
+    return SequencePatterns.load(path) if os.path.exists(path) else None
+
+
+def focus_history(start, end):
+    """(app, timestamp) of every focus event in [start, end], archive first; app falls back to the title."""
+    try:
+        rows = [(app or title, timestamp) for app, title, timestamp
+                in archive.read_rows("App in Focus", ["app", "title", "timestamp"], start, end)]
+    except archive.ArchiveUnavailable as e:
+        logger.warning(f"Mining focus patterns without the archive: {e}")
+        rows = []
+    rows += storage.fetch_events("App in Focus", [storage.FOCUS_APP_COLUMN, "timestamp"], start, end)
+    return rows
+
+
+def sessions(rows):
+    """Split (app, timestamp) rows into collapsed app-id sequences."""
+    if not rows:
+        return []
+    ids = storage.app_ids([app for app, _ in rows])
+    result = []
+    current = []
+    previous = None
+    for app_id, (_, timestamp) in zip(ids, rows):
+        try:
+            moment = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            continue
+        if previous is not None and (moment - previous).total_seconds() > SESSION_GAP_SECONDS:
+            result.append(current)
+            current = []
+        current.append(app_id)
+        previous = moment
+    result.append(current)
+
+    chunks = []
+    for session in result:
+        session = collapse(session)
+        chunks.extend(session[i:i + MAX_SESSION_APPS] for i in range(0, len(session), MAX_SESSION_APPS))
+    return [chunk for chunk in chunks if len(chunk) > 1]
+
+
+def mine(days=30, min_support_ratio=MIN_SUPPORT_RATIO, profile=None):
+    """Mine the last `days` of focus history and save the patterns. Returns them."""
+    with MINE_SECONDS.time():
+        end = datetime.now()
+        sequences = sessions(focus_history(end - timedelta(days=days), end))
+        if not sequences:
+            # Nothing to learn yet; try again on the next maintenance pass
+            return SequencePatterns()
+        min_support = max(MIN_SUPPORT, int(len(sequences) * min_support_ratio))
+        patterns = SequencePatterns(prefixspan(sequences, min_support, MAX_PATTERN_LENGTH), len(sequences))
+    patterns.save(patterns_path(profile))
+    PATTERNS_MINED.set(len(patterns))
+    logger.info(f"Mined {len(patterns)} focus patterns from {len(sequences)} sessions")
+    return patterns
+
+
+def mine_if_stale(profile=None):
+    """Re-mine once the saved patterns are more than a day old."""
+    path = patterns_path(profile)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < MINE_EVERY_SECONDS:
+        return None
+    return mine(profile=profile)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine habitual app-focus workflows")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--min-support", type=float, default=MIN_SUPPORT_RATIO,
+                        help="Minimum share of sessions a pattern must occur in")
+    args = parser.parse_args()
+    metrics.configure_logging()
+    mined = mine(args.days, args.min_support)
+    names = storage.app_names()
+    for pattern, support in sorted(mined.patterns, key=lambda p: (-p[1], -len(p[0])))[:20]:
+        print(f"{support:5d}  " + " -> ".join(names.get(app_id, str(app_id)) for app_id in pattern))
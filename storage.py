@@ -0,0 +1,548 @@
+"""
+SQLite storage shared by every module: database paths, the canonical
+schema, per-thread connections and the queries the rest of the code runs.
+
+Each thread keeps one open connection per database (connect() opens it on
+first use and applies db_maintenance.configure()), so hot paths such as
+insert_event no longer pay for connect/close, and sqlite3's per-connection
+statement cache reuses the prepared statements of the constant SQL below.
+The schema of a database is created or migrated the first time any thread
+opens it.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import db_maintenance
+import metrics
+import profiles
+
+# Databases of the current profile (~/Documents for the local user)
+ACTIVITY_DB_PATH = profiles.data_path("soft_activity.sqlite")   # live events, last 15 minutes
+TRAINING_DB_PATH = profiles.data_path("soft_training.sqlite")   # events the model is trained on
+OUTPUT_DB_PATH = profiles.data_path("output.sqlite")            # summaries and verdicts
+BROWSER_DB_PATH = profiles.data_path("tab_activity.sqlite")     # browser extension events
+
+DB_WRITE_SECONDS = metrics.histogram("sbm_db_write_seconds", "Latency of one software-table insert")
+
+# Microsecond timestamps; rows written before this still sort and compare
+# correctly against these strings, and both parse with datetime.fromisoformat.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Columns appended to the software table after the original schema, added
+# to existing databases by migrate_software_table()
+SOFTWARE_ADDED_COLUMNS = [
+    ("press_ns", "INTEGER"),  # time.monotonic_ns() at key/button press
+    ("event_ns", "INTEGER"),  # time.monotonic_ns() when the event was captured (key release)
+    ("epoch_ms", "INTEGER"),  # timestamp as ms since 1970-01-01 (wall clock, no timezone), indexed
+    ("process_cpu", "REAL"),  # PC Usage: foreground process CPU % since the last sample
+    ("io_bytes", "INTEGER"),  # PC Usage: bytes the foreground process read and wrote since the last sample
+    ("spawned", "INTEGER"),   # PC Usage: processes the foreground process started since the last sample
+    ("app", "TEXT"),          # App in Focus/Open/Closed: normalised executable name of the window's process
+]
+
+# Selects a focus row's app identity: the resolved app, else the title of
+# rows captured without one (scoring.apps.app_name normalises either)
+FOCUS_APP_COLUMN = "COALESCE(app, title)"
+
+# Every software column except id, in table order
+SOFTWARE_COLUMNS = [
+    "type", "title", "key", "key_interval", "click_type", "click_interval", "position",
+    "scroll_direction", "scroll_speed", "scroll_interval", "duration",
+    "cpu_usage", "memory_usage", "device_id", "device_type", "timestamp",
+] + [name for name, _ in SOFTWARE_ADDED_COLUMNS]
+
+SOFTWARE_DDL = """
+    CREATE TABLE IF NOT EXISTS software (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT,
+        title TEXT,
+        key TEXT,
+        key_interval REAL,
+        click_type TEXT,
+        click_interval REAL,
+        position TEXT,
+        scroll_direction TEXT,
+        scroll_speed REAL,
+        scroll_interval REAL,
+        duration REAL,
+        cpu_usage REAL,
+        memory_usage REAL,
+        device_id TEXT,
+        device_type TEXT,
+        timestamp TEXT,
+        press_ns INTEGER,
+        event_ns INTEGER,
+        epoch_ms INTEGER,
+        process_cpu REAL,
+        io_bytes INTEGER,
+        spawned INTEGER,
+        app TEXT
+    )
+"""
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_ms(moment):
+    """The epoch_ms value stored for a naive datetime."""
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+
+def migrate_software_table(cursor):
+    """Add any SOFTWARE_ADDED_COLUMNS missing from an existing software table."""
+    cursor.execute("PRAGMA table_info(software)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, declaration in SOFTWARE_ADDED_COLUMNS:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE software ADD COLUMN {name} {declaration}")
+    if "epoch_ms" not in existing:
+        # julianday() reads the stored string as UTC, matching epoch_ms() on the naive datetime
+        cursor.execute("""
+            UPDATE software
+            SET epoch_ms = CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)
+            WHERE epoch_ms IS NULL AND timestamp IS NOT NULL
+        """)
+    # Expiry deletes scan by time; window fetches by event type and time
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_software_epoch ON software (epoch_ms)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_software_type_epoch ON software (type, epoch_ms)")
+
+
+def _create_software(cursor):
+    cursor.execute(SOFTWARE_DDL)
+    migrate_software_table(cursor)
+
+
+def _create_activity(cursor):
+    _create_software(cursor)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blocked_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT
+        )
+    """)
+
+
+def _create_output(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS output_summary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT,
+            model_output TEXT,
+            timestamp TEXT,
+            explanation TEXT  -- features that drove the verdict, see scoring/explain.py
+        )
+    """)
+    cursor.execute("PRAGMA table_info(output_summary)")
+    if "explanation" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE output_summary ADD COLUMN explanation TEXT")
+    # Serves the History page: keyset pagination on (timestamp, id), optionally
+    # restricted to a single SAFE/UNSAFE verdict.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_output_summary_timestamp ON output_summary (timestamp, id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_output_summary_model_output
+        ON output_summary (model_output, timestamp, id)
+    """)
+    # Integer ids of the apps seen in focus, for sequence mining
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS apps (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE
+        )
+    """)
+    # One row per window and window length, filled by window_features.fill()
+    cursor.execute("PRAGMA table_info(window_features)")
+    if {row[1] for row in cursor.fetchall()} == {"start_ms", "start", "features", "score", "events"}:
+        # Single-scale table: every row is a 30-second window
+        cursor.execute("ALTER TABLE window_features RENAME TO window_features_30s")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS window_features (
+            scale INTEGER,     -- window length in seconds
+            start_ms INTEGER,  -- window start, epoch_ms() clock
+            start TEXT,        -- window start as TIMESTAMP_FORMAT
+            features BLOB,     -- float64 feature vector, EXTENDED_FEATURE_NAMES order
+            score REAL,        -- decision_function of the scale's model; NULL if none scored it
+            events INTEGER,    -- keyboard, click and focus events in the window
+            PRIMARY KEY (scale, start_ms)
+        )
+    """)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'window_features_30s'")
+    if cursor.fetchone():
+        cursor.execute("""
+            INSERT OR IGNORE INTO window_features (scale, start_ms, start, features, score, events)
+            SELECT 30, start_ms, start, features, score, events FROM window_features_30s
+        """)
+        cursor.execute("DROP TABLE window_features_30s")
+
+
+def _create_browser(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT,
+            url TEXT,
+            domain TEXT,
+            tab_id INTEGER,
+            window_id INTEGER,
+            entry_time TEXT,
+            exit_time TEXT,
+            key_pressed TEXT,
+            click_type TEXT,
+            x INTEGER,
+            y INTEGER,
+            scroll_direction TEXT,
+            scroll_distance REAL,
+            scroll_interval REAL,
+            interactive_element TEXT,
+            timestamp TEXT
+        )
+    """)
+
+
+SCHEMAS = {
+    ACTIVITY_DB_PATH: _create_activity,
+    TRAINING_DB_PATH: _create_software,
+    OUTPUT_DB_PATH: _create_output,
+    BROWSER_DB_PATH: _create_browser,
+}
+
+_local = threading.local()
+_initialized = set()
+_init_lock = threading.Lock()
+_app_ids = {}  # normalised app name -> id, cache of the apps table
+_app_lock = threading.Lock()
+
+
+def connect(path=ACTIVITY_DB_PATH):
+    """This thread's connection to a database, opened (and its schema ensured) on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, cached_statements=256)
+        db_maintenance.configure(conn)
+        init_schema(path, conn)
+        connections[path] = conn
+    return conn
+
+
+def init_schema(path, conn=None):
+    """Create or migrate a database's tables once per process."""
+    if path in _initialized:
+        return
+    with _init_lock:
+        if path in _initialized:
+            return
+        create = SCHEMAS.get(path)
+        if create is not None:
+            own = conn is None
+            conn = conn or sqlite3.connect(path)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                create(conn.cursor())
+                conn.commit()
+            finally:
+                if own:
+                    conn.close()
+        _initialized.add(path)
+
+
+def init_databases():
+    """Create every table of the current profile's databases."""
+    for path in SCHEMAS:
+        init_schema(path)
+
+
+def close_thread_connections():
+    """Close this thread's connections (e.g. before the thread exits)."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+# ---------------- software (activity / training) ----------------
+
+def insert_event(event_type, timestamp=None, **kwargs):
+    """
+    Insert a row into the software table in soft_activity.sqlite.
+    kwargs can include any of:
+      title, key, key_interval, click_type, click_interval, position,
+      scroll_direction, scroll_speed, scroll_interval, duration,
+      cpu_usage, memory_usage, device_id, device_type, press_ns, event_ns,
+      process_cpu, io_bytes, spawned, app
+    Returns the timestamp string the row was stored with.
+    """
+    moment = datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+    timestamp = timestamp or moment.strftime(TIMESTAMP_FORMAT)
+    position = kwargs.get("position")
+    with DB_WRITE_SECONDS.time():
+        conn = connect(ACTIVITY_DB_PATH)
+        conn.execute("""
+            INSERT INTO software (
+                type, title, key, key_interval, click_type, click_interval, position,
+                scroll_direction, scroll_speed, scroll_interval, duration,
+                cpu_usage, memory_usage, device_id, device_type, timestamp,
+                press_ns, event_ns, epoch_ms, process_cpu, io_bytes, spawned, app
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            event_type, kwargs.get("title"), kwargs.get("key"), kwargs.get("key_interval"),
+            kwargs.get("click_type"), kwargs.get("click_interval"),
+            json.dumps(position) if position else None,
+            kwargs.get("scroll_direction"), kwargs.get("scroll_speed"), kwargs.get("scroll_interval"),
+            kwargs.get("duration"), kwargs.get("cpu_usage"), kwargs.get("memory_usage"),
+            kwargs.get("device_id"), kwargs.get("device_type"), timestamp,
+            kwargs.get("press_ns"), kwargs.get("event_ns"), epoch_ms(moment),
+            kwargs.get("process_cpu"), kwargs.get("io_bytes"), kwargs.get("spawned"), kwargs.get("app")
+        ))
+        conn.commit()
+    return timestamp
+
+
+def fetch_events(event_type, columns, start, end, path=ACTIVITY_DB_PATH):
+    """Rows of one event type with start <= time <= end (datetimes), in insertion order."""
+    cursor = connect(path).execute(f"""
+        SELECT {", ".join(columns)} FROM software
+        WHERE type = ? AND epoch_ms BETWEEN ? AND ?
+        ORDER BY id
+    """, (event_type, epoch_ms(start), epoch_ms(end)))
+    return cursor.fetchall()
+
+
+def fetch_events_ms(event_type, columns, start_ms, end_ms, path=ACTIVITY_DB_PATH):
+    """Rows of one event type with start_ms <= epoch_ms < end_ms, in insertion order."""
+    cursor = connect(path).execute(f"""
+        SELECT {", ".join(columns)} FROM software
+        WHERE type = ? AND epoch_ms >= ? AND epoch_ms < ?
+        ORDER BY id
+    """, (event_type, start_ms, end_ms))
+    return cursor.fetchall()
+
+
+def fetch_event_types_ms(event_types, start_ms, end_ms, path=ACTIVITY_DB_PATH):
+    """(type, epoch_ms) of the events of any of `event_types` with start_ms <= epoch_ms < end_ms, in insertion order."""
+    cursor = connect(path).execute(f"""
+        SELECT type, epoch_ms FROM software
+        WHERE type IN ({", ".join("?" * len(event_types))}) AND epoch_ms >= ? AND epoch_ms < ?
+        ORDER BY id
+    """, (*event_types, start_ms, end_ms))
+    return cursor.fetchall()
+
+
+def epoch_range(path=ACTIVITY_DB_PATH):
+    """(first, last) epoch_ms of the software table, or (None, None) if empty."""
+    return connect(path).execute("SELECT MIN(epoch_ms), MAX(epoch_ms) FROM software").fetchone()
+
+
+def time_range(path=ACTIVITY_DB_PATH):
+    """(first, last) timestamp strings of the software table, or (None, None) if empty."""
+    return connect(path).execute("SELECT MIN(timestamp), MAX(timestamp) FROM software").fetchone()
+
+
+def first_timestamp(path=ACTIVITY_DB_PATH):
+    row = connect(path).execute("SELECT timestamp FROM software ORDER BY epoch_ms, id LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def fetch_software_rows(start, end, path=ACTIVITY_DB_PATH):
+    """Full rows (SOFTWARE_COLUMNS order) with start <= time <= end."""
+    cursor = connect(path).execute(f"""
+        SELECT {", ".join(SOFTWARE_COLUMNS)} FROM software
+        WHERE epoch_ms BETWEEN ? AND ? ORDER BY id
+    """, (epoch_ms(start), epoch_ms(end)))
+    return cursor.fetchall()
+
+
+def replace_software_rows(rows, path=TRAINING_DB_PATH):
+    """Replace the whole software table of a database with rows in SOFTWARE_COLUMNS order."""
+    conn = connect(path)
+    placeholders = ", ".join("?" * len(SOFTWARE_COLUMNS))
+    with conn:
+        conn.execute("DELETE FROM software")
+        conn.executemany(f"INSERT INTO software ({', '.join(SOFTWARE_COLUMNS)}) VALUES ({placeholders})", rows)
+
+
+def fetch_activity_log(start, end, path=ACTIVITY_DB_PATH):
+    """(type, title, timestamp) of every event with start <= time <= end, in insertion order."""
+    cursor = connect(path).execute("""
+        SELECT type, title, timestamp FROM software
+        WHERE epoch_ms BETWEEN ? AND ? ORDER BY id
+    """, (epoch_ms(start), epoch_ms(end)))
+    return cursor.fetchall()
+
+
+def event_type_counts(start, end, path=ACTIVITY_DB_PATH):
+    """{event type: count} for start <= time <= end."""
+    cursor = connect(path).execute("""
+        SELECT type, COUNT(*) FROM software WHERE epoch_ms BETWEEN ? AND ? GROUP BY type
+    """, (epoch_ms(start), epoch_ms(end)))
+    return dict(cursor.fetchall())
+
+
+def cpu_usage_series(path=ACTIVITY_DB_PATH):
+    """[(timestamp, cpu_usage), ...] of the PC Usage samples still in the database."""
+    return connect(path).execute("""
+        SELECT timestamp, cpu_usage FROM software
+        WHERE type = 'PC Usage' ORDER BY epoch_ms
+    """).fetchall()
+
+
+# ---------------- output_summary ----------------
+
+def insert_summary(description, model_output, timestamp=None, explanation=None):
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect(OUTPUT_DB_PATH)
+    conn.execute("""
+        INSERT INTO output_summary (description, model_output, timestamp, explanation) VALUES (?, ?, ?, ?)
+    """, (description, str(model_output), timestamp, explanation))
+    conn.commit()
+    return timestamp
+
+
+def fetch_summary_page(model_output=None, after=None, limit=200):
+    """
+    One page of output_summary, newest first, as (id, description, model_output,
+    timestamp, explanation) rows. model_output restricts to 'True'/'False'; after is the
+    (timestamp, id) of the last row of the previous page.
+    """
+    clauses = []
+    params = []
+    if model_output is not None:
+        clauses.append("model_output = ?")
+        params.append(model_output)
+    if after is not None:
+        last_timestamp, last_id = after
+        clauses.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+        params.extend([last_timestamp, last_timestamp, last_id])
+
+    query = "SELECT id, description, model_output, timestamp, explanation FROM output_summary"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return connect(OUTPUT_DB_PATH).execute(query, params).fetchall()
+
+
+def clear_summaries():
+    conn = connect(OUTPUT_DB_PATH)
+    conn.execute("DELETE FROM output_summary")
+    conn.commit()
+
+
+# ---------------- window_features ----------------
+
+def last_window_start(scale):
+    """start_ms of the newest stored window of a scale (seconds), or None."""
+    return connect(OUTPUT_DB_PATH).execute(
+        "SELECT MAX(start_ms) FROM window_features WHERE scale = ?", (scale,)
+    ).fetchone()[0]
+
+
+def insert_windows(rows, replace=False):
+    """
+    Store (scale, start_ms, start, features, score, events) rows. Windows
+    already stored are kept, so overlapping backfills are harmless, unless
+    `replace` (the live fill, whose windows have closed on every event).
+    """
+    conn = connect(OUTPUT_DB_PATH)
+    with conn:
+        conn.executemany(f"""
+            INSERT OR {"REPLACE" if replace else "IGNORE"} INTO window_features
+                (scale, start_ms, start, features, score, events)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def fetch_windows(scale, start_ms=None, end_ms=None):
+    """(start_ms, features, score, events) of a scale's windows starting in [start_ms, end_ms), oldest first."""
+    cursor = connect(OUTPUT_DB_PATH).execute("""
+        SELECT start_ms, features, score, events FROM window_features
+        WHERE scale = ? AND start_ms >= ? AND start_ms < ?
+        ORDER BY start_ms
+    """, (scale, start_ms if start_ms is not None else -2 ** 63, end_ms if end_ms is not None else 2 ** 63 - 1))
+    return cursor.fetchall()
+
+
+def update_window_scores(scale, scores):
+    """Set the score of a scale's stored windows from (score, start_ms) pairs."""
+    conn = connect(OUTPUT_DB_PATH)
+    with conn:
+        conn.executemany("UPDATE window_features SET score = ? WHERE scale = ? AND start_ms = ?",
+                         ((score, scale, start) for score, start in scores))
+
+
+def delete_windows_except_size(size):
+    """Delete stored windows whose features blob is not `size` bytes. Returns the number deleted."""
+    conn = connect(OUTPUT_DB_PATH)
+    with conn:
+        return conn.execute("DELETE FROM window_features WHERE length(features) != ?", (size,)).rowcount
+
+
+def window_counts(scale, start_ms):
+    """(windows, windows with a negative score) of a scale starting at or after start_ms."""
+    return connect(OUTPUT_DB_PATH).execute("""
+        SELECT COUNT(*), COALESCE(SUM(score < 0), 0) FROM window_features WHERE scale = ? AND start_ms >= ?
+    """, (scale, start_ms)).fetchone()
+
+
+# ---------------- apps ----------------
+
+def app_ids(names):
+    """
+    Integer id of each app (an executable name or window title, normalised
+    with scoring.apps.app_name; None counts as ""), assigning ids to names
+    not seen before.
+    """
+    from scoring.apps import app_name  # the scoring package imports numpy; storage and ui must not
+
+    names = [app_name(name) for name in names]
+    missing = {name for name in names if name not in _app_ids}
+    if missing:
+        with _app_lock:
+            conn = connect(OUTPUT_DB_PATH)
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO apps (name) VALUES (?)", ((name,) for name in missing))
+            for name in missing:
+                _app_ids[name] = conn.execute("SELECT id FROM apps WHERE name = ?", (name,)).fetchone()[0]
+    return [_app_ids[name] for name in names]
+
+
+def app_names():
+    """{id: name} of every app in the apps table."""
+    return dict(connect(OUTPUT_DB_PATH).execute("SELECT id, name FROM apps"))
+
+
+# ---------------- blocked_items ----------------
+
+def blocked_items():
+    return [row[0] for row in connect(ACTIVITY_DB_PATH).execute("SELECT name FROM blocked_items ORDER BY id")]
+
+
+def add_blocked_item(name):
+    conn = connect(ACTIVITY_DB_PATH)
+    conn.execute("INSERT INTO blocked_items (name) VALUES (?)", (name,))
+    conn.commit()
+
+
+def remove_blocked_item(name):
+    conn = connect(ACTIVITY_DB_PATH)
+    conn.execute("DELETE FROM blocked_items WHERE name = ?", (name,))
+    conn.commit()
+
+
+# ---------------- browser activity ----------------
+
+def insert_browser_event(data):
+    """Insert one browser event (the extension's JSON payload) into the activity table."""
+    conn = connect(BROWSER_DB_PATH)
+    conn.execute("""
+        INSERT INTO activity (action, url, domain, tab_id, window_id, entry_time, exit_time, key_pressed, click_type, x, y, scroll_direction, scroll_distance, scroll_interval, interactive_element, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        data.get("action"), data.get("url"), data.get("domain"), data.get("tab_id"), data.get("window_id"),
+        data.get("entry_time"), data.get("exit_time"), data.get("key_pressed"), data.get("click_type"),
+        data.get("x"), data.get("y"), data.get("scroll_direction"), data.get("scroll_distance"),
+        data.get("scroll_interval"), data.get("interactive_element"), data.get("timestamp")
+    ))
+    conn.commit()
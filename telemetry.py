@@ -0,0 +1,133 @@
+"""
+Non-blocking system telemetry for the "PC Usage" rows.
+
+psutil.cpu_percent(interval=1) sleeps through the interval it measures.
+TelemetrySampler keeps the previous sample's counters instead and reports
+deltas since then, so sample() returns at once and covers the whole gap
+between two calls. Each sample is one row:
+
+  cpu_usage     system CPU % since the last sample
+  memory_usage  system memory in use, %
+  title         name of the foreground process
+  process_cpu   the foreground process's CPU % since the last sample
+  io_bytes      bytes it read and wrote since the last sample
+  spawned       processes it started since the last sample
+  duration      seconds since the last sample
+
+process_cpu and io_bytes are None on the first sample after the foreground
+process changes (there is no previous reading of it), and when the OS
+refuses access to its counters.
+
+psutil.Process handles are cached by pid between samples: a handle keeps
+the baseline cpu_percent() needs, and only processes that appeared since
+the last sample are looked up. Those new processes are the spawn count;
+one that starts and exits between two samples is not seen.
+"""
+import logging
+import time
+
+import psutil
+
+import capture
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SECONDS = metrics.histogram("sbm_telemetry_sample_seconds", "Time to take one system telemetry sample")
+TRACKED_PROCESSES = metrics.gauge("sbm_tracked_processes", "Process handles cached by the telemetry sampler")
+
+
+def _io_bytes(proc):
+    """Bytes the process has read and written, or None where unavailable (macOS, access denied)."""
+    try:
+        counters = proc.io_counters()
+    except (AttributeError, psutil.AccessDenied):
+        return None
+    return counters.read_bytes + counters.write_bytes
+
+
+class TelemetrySampler:
+    """System and foreground-process counters as deltas between sample() calls."""
+
+    def __init__(self, foreground_pid=capture.get_foreground_pid):
+        self.foreground_pid = foreground_pid
+        self.processes = {}  # pid -> psutil.Process, kept across samples
+        self.last_time = time.monotonic()
+        self.last_pid = None
+        self.last_io = None
+        psutil.cpu_percent(None)  # baseline for the first sample's system CPU
+        self._refresh()           # processes already running are not spawns
+
+    def _refresh(self):
+        """Sync the handle cache with psutil.pids(); returns the handles of new processes."""
+        pids = set(psutil.pids())
+        for pid in self.processes.keys() - pids:
+            del self.processes[pid]
+        new = []
+        for pid in pids - self.processes.keys():
+            try:
+                proc = psutil.Process(pid)
+            except psutil.Error:
+                continue  # exited already
+            self.processes[pid] = proc
+            new.append(proc)
+        TRACKED_PROCESSES.set(len(self.processes))
+        return new
+
+    def _foreground(self):
+        try:
+            pid = self.foreground_pid()
+        except (ImportError, OSError) as e:  # no pywin32 / xdotool
+            logger.debug(f"No foreground process: {e}")
+            return None
+        if pid is None:
+            return None
+        proc = self.processes.get(pid)
+        if proc is None or not proc.is_running():  # is_running() also catches a reused pid
+            try:
+                proc = psutil.Process(pid)
+            except psutil.Error:
+                return None
+            self.processes[pid] = proc
+        return proc
+
+    def sample(self):
+        """One "PC Usage" row (log_event kwargs) covering the time since the last call."""
+        with SAMPLE_SECONDS.time():
+            now = time.monotonic()
+            row = {
+                "cpu_usage": psutil.cpu_percent(None), "memory_usage": psutil.virtual_memory().percent,
+                "duration": now - self.last_time,
+                "title": None, "process_cpu": None, "io_bytes": None, "spawned": None,
+            }
+            self.last_time = now
+            new = self._refresh()
+            proc = self._foreground()
+            if proc is None:
+                self.last_pid = self.last_io = None
+                return row
+
+            same = proc.pid == self.last_pid
+            try:
+                with proc.oneshot():
+                    row["title"] = proc.name()
+                    cpu = proc.cpu_percent(None)
+                    io = _io_bytes(proc)
+            except psutil.Error as e:
+                logger.debug(f"Foreground process {proc.pid} unreadable: {e}")
+                self.last_pid = self.last_io = None
+                return row
+            if same:
+                row["process_cpu"] = cpu
+                if io is not None and self.last_io is not None:
+                    row["io_bytes"] = max(io - self.last_io, 0)
+            self.last_pid, self.last_io = proc.pid, io
+
+            spawned = 0
+            for child in new:
+                try:
+                    spawned += child.ppid() == proc.pid
+                except psutil.Error:
+                    pass
+            row["spawned"] = spawned
+            return row
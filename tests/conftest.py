@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# storage and profiles resolve ~/Documents and the model directory at import
+# time; point them at a scratch home before any test imports them
+HOME = tempfile.mkdtemp(prefix="sbm-tests-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = HOME
+os.makedirs(os.path.join(HOME, "Documents"), exist_ok=True)
+os.environ["SBM_MODEL_DIR"] = os.path.join(HOME, "models")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
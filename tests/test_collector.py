@@ -0,0 +1,108 @@
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+import profiles
+from scoring import EXTENDED_FEATURE_NAMES, scaler_filename
+
+WIDTH = len(EXTENDED_FEATURE_NAMES)
+
+
+@pytest.fixture(scope="module")
+def collector():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SBM", "collector_server.py")
+    spec = importlib.util.spec_from_file_location("collector_server", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["collector_server"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def alice():
+    """A profile with its own model; profiles without one have no model to fall back to here."""
+    import joblib
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    profile = profiles.Profile.from_key("alice@h")
+    X = np.random.default_rng(0).normal(size=(200, WIDTH))
+    scaler = StandardScaler().fit(X)
+    path = profiles.own_model_path(profile)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(IsolationForest(n_estimators=20, random_state=0).fit(scaler.transform(X)), path)
+    joblib.dump(scaler, scaler_filename(path))
+    return profile
+
+
+def rows(n, seed=1):
+    return np.random.default_rng(seed).normal(size=(n, WIDTH)).tolist()
+
+
+def post(collector, payload):
+    body = json.dumps(payload)  # allows NaN, as a buggy agent might send it
+    return collector.app.test_client().post("/score_windows", data=body, content_type="application/json")
+
+
+@pytest.mark.parametrize("features", [
+    [0.0] * 15,
+    [0.0] * (WIDTH - 1) + [float("nan")],
+    [0.0] * (WIDTH - 1) + [float("inf")],
+    [0.0] * (WIDTH - 1) + ["1"],
+    [0.0] * (WIDTH - 1) + [True],
+    "0" * WIDTH,
+])
+def test_malformed_windows_are_rejected(collector, alice, features):
+    response = post(collector, {"profile": alice.key, "windows": [{"start": "s", "features": features}]})
+    assert response.status_code == 400
+    assert not response.get_json()["success"]
+
+
+def test_valid_windows_are_scored(collector, alice):
+    response = post(collector, {"profile": alice.key, "windows": [{"start": "s", "features": row} for row in rows(3)]})
+    assert response.status_code == 200
+    verdicts = response.get_json()["verdicts"]
+    assert len(verdicts) == 3 and all(isinstance(v["score"], float) for v in verdicts)
+
+
+def test_failing_profile_does_not_fail_its_batch(collector, alice):
+    scorer = collector.Scorer(workers=1)
+    try:
+        requests = [(alice.key, rows(4), Future()), ("mallory@h", rows(4, seed=2), Future()),
+                    (alice.key, rows(2, seed=3), Future())]
+        scorer._score_batch(requests, 10)
+        scores, explanations = requests[0][2].result(timeout=0)
+        assert len(scores) == len(explanations) == 4
+        assert len(requests[2][2].result(timeout=0)[0]) == 2
+        with pytest.raises(FileNotFoundError):
+            requests[1][2].result(timeout=0)
+    finally:
+        scorer.shutdown()
+
+
+class BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def test_dispatcher_survives_a_broken_pool(collector, alice):
+    scorer = collector.Scorer(workers=2)
+    try:
+        scorer.pool = BrokenPool()
+        with pytest.raises(BrokenProcessPool):
+            scorer.score(alice.key, rows(collector.POOL_MIN_ROWS))
+        assert scorer.dispatcher.is_alive()
+        assert not isinstance(scorer.pool, BrokenPool)
+        scores, _ = scorer.score(alice.key, rows(2))
+        assert len(scores) == 2
+    finally:
+        scorer.shutdown()
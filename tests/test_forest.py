@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from scoring.forest import CompiledForest
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    X[rng.random(400) < 0.05, 2] = np.nan
+    clf = IsolationForest(n_estimators=25, contamination=0.05, random_state=42).fit(X)
+    return clf, rng
+
+
+def rows(rng, n):
+    X = rng.normal(size=(n, 6)) * 2
+    X[rng.random(n) < 0.05, rng.integers(6)] = np.nan
+    return X
+
+
+@pytest.mark.parametrize("n", [1, CompiledForest.CHUNK_ROWS, CompiledForest.CHUNK_ROWS * 3 + 5])
+def test_bit_identical_to_sklearn(fitted, n):
+    clf, rng = fitted
+    X = rows(rng, n)
+    forest = CompiledForest.from_sklearn(clf)
+    assert np.array_equal(forest.decision_function(X), clf.decision_function(X))
+    assert np.array_equal(forest.predict(X), clf.predict(X))
+
+
+def test_save_load_round_trip(fitted, tmp_path):
+    clf, rng = fitted
+    X = rows(rng, 200)
+    path = str(tmp_path / "model_forest.npz")
+    CompiledForest.from_sklearn(clf).save(path)
+    assert np.array_equal(CompiledForest.load(path).decision_function(X), clf.decision_function(X))
+
+
+def test_rejects_wrong_width(fitted):
+    clf, _ = fitted
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(clf).decision_function(np.zeros((2, 5)))
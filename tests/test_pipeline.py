@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from scoring.pipeline import ScoringPipeline
+
+NAMES = [f"f{i}" for i in range(5)]
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(1)
+    X = rng.normal(loc=[0, 5, -3, 100, 0.5], scale=[1, 2, 0.5, 30, 0.1], size=(300, 5))
+    scaler = StandardScaler().fit(X)
+    clf = IsolationForest(n_estimators=30, contamination=0.05, random_state=42).fit(scaler.transform(X))
+    return scaler, clf, X
+
+
+def test_matches_scaler_and_forest(fitted):
+    scaler, clf, X = fitted
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, NAMES)
+    assert np.array_equal(pipeline.decision_function(X), clf.decision_function(scaler.transform(X)))
+
+
+def test_save_load_round_trip(fitted, tmp_path):
+    scaler, clf, X = fitted
+    path = str(tmp_path / "intrusion_model_pipeline.bin")
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, NAMES)
+    pipeline.save(path)
+
+    loaded = ScoringPipeline.load(path)
+    assert loaded.feature_names == NAMES
+    assert loaded.schema == pipeline.schema
+    assert np.array_equal(loaded.decision_function(X), pipeline.decision_function(X))
+
+
+def test_non_finite_values_score_as_the_mean(fitted):
+    scaler, clf, X = fitted
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, NAMES)
+    row = X[:1].copy()
+    imputed = row.copy()
+    row[0, 1], row[0, 3] = np.nan, np.inf
+    imputed[0, 1], imputed[0, 3] = scaler.mean_[1], scaler.mean_[3]
+    assert np.array_equal(pipeline.decision_function(row), pipeline.decision_function(imputed))
+
+
+def test_check_schema(fitted):
+    scaler, clf, _ = fitted
+    pipeline = ScoringPipeline.from_sklearn(clf, scaler, NAMES)
+    pipeline.check_schema(NAMES)
+    with pytest.raises(ValueError):
+        pipeline.check_schema(NAMES[::-1])
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "model.bin"
+    path.write_bytes(b"not a pipeline at all")
+    with pytest.raises(ValueError):
+        ScoringPipeline.load(str(path))
@@ -0,0 +1,64 @@
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import storage
+
+ORIGINAL_SOFTWARE_DDL = """
+    CREATE TABLE software (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT, title TEXT, key TEXT, key_interval REAL, click_type TEXT, click_interval REAL,
+        position TEXT, scroll_direction TEXT, scroll_speed REAL, scroll_interval REAL, duration REAL,
+        cpu_usage REAL, memory_usage REAL, device_id TEXT, device_type TEXT, timestamp TEXT
+    )
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "migrate.sqlite"))
+    yield conn
+    conn.close()
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_software_migration_adds_columns_and_backfills_epoch(conn):
+    moments = [datetime(2024, 1, 1, 9, 0, 0, 250000), datetime(2024, 3, 31, 23, 59, 59, 999000)]
+    conn.execute(ORIGINAL_SOFTWARE_DDL)
+    conn.executemany("INSERT INTO software (type, key, timestamp) VALUES ('Keyboard', 'a', ?)",
+                     [(m.strftime(storage.TIMESTAMP_FORMAT),) for m in moments])
+
+    storage._create_software(conn.cursor())
+    storage._create_software(conn.cursor())  # a second open migrates nothing
+
+    assert columns(conn, "software") == ["id"] + storage.SOFTWARE_COLUMNS
+    stored = [row[0] for row in conn.execute("SELECT epoch_ms FROM software ORDER BY id")]
+    assert stored == [storage.epoch_ms(m) for m in moments]
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(software)")}
+    assert {"idx_software_epoch", "idx_software_type_epoch"} <= indexes
+
+
+def test_output_migration_moves_single_scale_windows(conn):
+    conn.execute("CREATE TABLE output_summary (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT, "
+                 "model_output TEXT, timestamp TEXT)")
+    conn.execute("CREATE TABLE window_features (start_ms INTEGER PRIMARY KEY, start TEXT, features BLOB, "
+                 "score REAL, events INTEGER)")
+    features = np.arange(4, dtype=np.float64).tobytes()
+    conn.executemany("INSERT INTO window_features VALUES (?, ?, ?, ?, ?)",
+                     [(0, "1970-01-01 00:00:00.000000", features, -0.1, 5),
+                      (30000, "1970-01-01 00:00:30.000000", features, None, 0)])
+
+    storage._create_output(conn.cursor())
+    storage._create_output(conn.cursor())
+
+    assert "explanation" in columns(conn, "output_summary")
+    assert columns(conn, "window_features") == ["scale", "start_ms", "start", "features", "score", "events"]
+    rows = conn.execute("SELECT scale, start_ms, features, score, events FROM window_features "
+                        "ORDER BY start_ms").fetchall()
+    assert rows == [(30, 0, features, -0.1, 5), (30, 30000, features, None, 0)]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'window_features_30s'").fetchone() is None
@@ -0,0 +1,90 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from scoring import EXTENDED_FEATURE_NAMES, FEATURE_NAMES, FeatureContext, MarkovChain, extract_extended_features
+from scoring.windows import WindowAggregate, merge_all
+
+START = datetime(2024, 1, 1, 9, 0, 0)
+APPS = ["Visual Studio Code", "Google Chrome", "Slack"]
+
+
+def timestamp(seconds):
+    return (START + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def events(seconds, seed=0):
+    """One window of every row type SOURCES reads, spread over `seconds`."""
+    rng = random.Random(seed)
+    keyboard, mouse, focus, moves, pc, types = [], [], [], [], [], []
+    t = 0.0
+    while True:
+        t += rng.uniform(0.05, 0.6)
+        if t >= seconds:
+            break
+        press_ns = int(t * 1e9)
+        kind = rng.random()
+        if kind < 0.55:
+            # Released before the next press: no rollover across a boundary
+            keyboard.append((rng.choice(["'a'", "'b'", "Key.space", "Key.backspace", "Key.ctrl_l"]),
+                             0.03, timestamp(t), press_ns, press_ns + 30_000_000))
+            types.append("Keyboard")
+        elif kind < 0.7:
+            mouse.append(("Button.left", rng.uniform(0.05, 2.0), str((rng.randint(0, 800), rng.randint(0, 600))),
+                          timestamp(t)))
+            types.append("Click")
+        elif kind < 0.8:
+            focus.append((rng.choice(APPS), rng.uniform(0.5, 20.0), timestamp(t)))
+            types.append("App in Focus")
+        elif kind < 0.92:
+            points = [[rng.randint(0, 800), rng.randint(0, 600), ms] for ms in (0, 15, 35, 50)]
+            moves.append((json.dumps(points), press_ns, press_ns + 50_000_000))
+        else:
+            pc.append((rng.uniform(0, 100), 50.0, rng.uniform(0, 20), rng.randint(0, 10 ** 6), rng.randint(0, 2), 5.0))
+    return keyboard, mouse, focus, moves, pc, types
+
+
+def split(rows, seconds, parts, time_of):
+    """Bucket one row type into `parts` consecutive windows by its time in seconds."""
+    buckets = [[] for _ in range(parts)]
+    for row in rows:
+        buckets[min(int(time_of(row) // seconds), parts - 1)].append(row)
+    return buckets
+
+
+def context():
+    chain = MarkovChain()
+    chain.update(["Keyboard", "Click", "Keyboard", "App in Focus"] * 10)
+    return FeatureContext(event_chain=chain)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merged_windows_match_extract_features(seed):
+    keyboard, mouse, focus, moves, pc, types = events(30, seed)
+    by_time = {
+        "keyboard": lambda row: row[3] / 1e9,
+        "mouse": lambda row: (datetime.fromisoformat(row[3]) - START).total_seconds(),
+        "focus": lambda row: (datetime.fromisoformat(row[2]) - START).total_seconds(),
+        "moves": lambda row: row[1] / 1e9,
+    }
+    parts = [split(keyboard, 5, 6, by_time["keyboard"]), split(mouse, 5, 6, by_time["mouse"]),
+             split(focus, 5, 6, by_time["focus"]), split(moves, 5, 6, by_time["moves"])]
+    # PC Usage rows and the event type sequence carry no time here; any
+    # contiguous split keeps their order
+    pc_parts = [pc[i * len(pc) // 6:(i + 1) * len(pc) // 6] for i in range(6)]
+    type_parts = [types[i * len(types) // 6:(i + 1) * len(types) // 6] for i in range(6)]
+
+    merged = merge_all(WindowAggregate.from_events(parts[0][i], parts[1][i], parts[2][i], parts[3][i], pc_parts[i],
+                                                   type_parts[i]) for i in range(6))
+    expected = extract_extended_features(keyboard, mouse, focus, 30, moves, pc, types, context())
+
+    assert len(expected) == len(EXTENDED_FEATURE_NAMES)
+    np.testing.assert_allclose(merged.features(30), expected[:len(FEATURE_NAMES)], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(merged.extended_features(30, context()), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_empty_window_features_are_zero():
+    assert WindowAggregate().extended_features(30) == [0.0] * len(EXTENDED_FEATURE_NAMES)
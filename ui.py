@@ -1,64 +1,33 @@
 import sys
 import os
-import sqlite3
+import threading
 import pyotp
-import qrcode
-from datetime import datetime
+from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QWidget, QVBoxLayout, QHBoxLayout,
     QFileDialog, QLabel, QListWidget, QStackedWidget, QMessageBox, QLineEdit,
     QInputDialog, QToolButton, QTableWidget, QTableWidgetItem, QHeaderView,
-    QGridLayout, QSizePolicy, QScrollArea
+    QGridLayout, QSizePolicy, QTableView, QAbstractItemView
 )
 from PyQt6.QtGui import QPixmap, QIcon, QPainter, QColor, QFont, QPen, QBrush
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QRectF, QSize, QMargins
-from PyQt6.QtCharts import QChart, QChartView, QPieSeries, QLineSeries, QDateTimeAxis, QValueAxis
-import activity_monitor
-from file_monitor import FileMonitorThread
+from PyQt6.QtCore import (
+    Qt, QThread, pyqtSignal, QTimer, QRectF, QSize, QMargins,
+    QAbstractTableModel, QModelIndex
+)
 import json
 import time
-import model
+import profiles
+import storage
 
-# Database Path
-DB_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_activity.sqlite")
-TRAINING_PATH = os.path.join(os.path.expanduser("~"), "Documents", "soft_training.sqlite")
-OUTPUT_PATH = os.path.join(os.path.expanduser("~"), "Documents", "output.sqlite")
+# activity_monitor, file_monitor, model (sklearn/joblib, ollama) and PyQt6.QtCharts
+# are imported on first use so that the window can paint before they load.
 
 # Initialize Database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""CREATE TABLE IF NOT EXISTS blocked_items (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT
-                    )""")
-    cursor.execute("""CREATE TABLE IF NOT EXISTS software (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        type TEXT CHECK(type IN (
-                            'Keyboard', 'Click', 'Scroll', 
-                            'AppOpen', 'AppClosed', 'AppInFocus',
-                            'PC Usage', 'ExternalDevice'
-                        )),
-                        title TEXT,
-                        key TEXT,
-                        key_interval REAL,
-                        click_type TEXT,
-                        click_interval REAL,
-                        position TEXT,
-                        scroll_direction TEXT,
-                        scroll_speed REAL,
-                        scroll_interval REAL,
-                        duration REAL,
-                        cpu_usage REAL,
-                        memory_usage REAL,
-                        device_id TEXT,
-                        device_type TEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )""")
-    conn.commit()
-    conn.close()
-
-init_db()
+    # blocked_items lives in the activity database; the History page reads
+    # output_summary before the monitors have started
+    storage.init_schema(storage.ACTIVITY_DB_PATH)
+    storage.init_schema(storage.OUTPUT_DB_PATH)
 
 # Modern Dark Theme
 DARK_THEME = """
@@ -143,27 +112,137 @@ DARK_THEME = """
     }
 """
 
+class HistoryTableModel(QAbstractTableModel):
+    """
+    Lazily paged view over output_summary, newest first.
+
+    Rows are fetched PAGE_SIZE at a time with keyset pagination on
+    (timestamp, id), so opening the page costs one indexed LIMIT query no
+    matter how many verdicts have accumulated.
+    """
+    PAGE_SIZE = 200
+    HEADERS = ["Description", "Timestamp", "Status"]
+
+    def __init__(self, filter_type=None, parent=None):
+        super().__init__(parent)
+        self.filter_type = filter_type
+        self.rows = []
+        self.exhausted = False
+
+    def set_filter(self, filter_type):
+        self.beginResetModel()
+        self.filter_type = filter_type
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+
+    def refresh(self):
+        self.set_filter(self.filter_type)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        _, description, model_output, timestamp, explanation = self.rows[index.row()]
+        safe = (model_output or "").lower() == "true"
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return description
+            if column == 1:
+                return timestamp
+            return "SAFE" if safe else "UNSAFE"
+        if role == Qt.ItemDataRole.ToolTipRole and explanation:
+            return f"Driven by: {explanation}"
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return QBrush(QColor("#2e7d32" if safe else "#d32f2f"))
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QBrush(QColor("white" if column != 1 else "#cccccc"))
+        if role == Qt.ItemDataRole.FontRole and column != 1:
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == Qt.ItemDataRole.TextAlignmentRole and column == 2:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        page = self.fetch_page()
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    def fetch_page(self):
+        """Fetch the next page strictly older than the last loaded (timestamp, id)."""
+        model_output = {"safe": "True", "unsafe": "False"}.get(self.filter_type)
+        after = None
+        if self.rows:
+            last_id, _, _, last_timestamp, _ = self.rows[-1]
+            after = (last_timestamp, last_id)
+        return storage.fetch_summary_page(model_output, after, self.PAGE_SIZE)
+
+
 class MainUI(QMainWindow):
     def __init__(self):
         super().__init__()
+        init_db()
         self.auth_key = self.setup_google_authenticator()
         self.start_time = time.time()
         
         self.nav_buttons = {}
         self.locked_files = self.get_blocked_items()
+        self.monitor_thread = None
+        self.file_monitor_thread = None
+        self.detector = None
+        self.detector_lock = threading.Lock()
+        self.background_started = False
         self.setup_ui()
-        
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.background_started:
+            self.background_started = True
+            # Heavy imports and monitor startup wait until the window has painted once
+            QTimer.singleShot(0, self.start_background_services)
+
+    def start_background_services(self):
+        """Load the model and start the monitors once the window is on screen."""
+        threading.Thread(target=self.get_detector, daemon=True).start()
         self.setup_monitoring()
         self.load_initial_data()
+
+    def get_detector(self):
+        """Return the shared IntrusionDetector, loading the model on first use."""
+        with self.detector_lock:
+            if self.detector is None:
+                import model
+                detector = model.IntrusionDetector()
+                detector.load_model()
+                self.detector = detector
+            return self.detector
     
     def get_blocked_items(self):
         """Get blocked items from database (without UI interaction)"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM blocked_items")
-        locked_files = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return locked_files
+        return storage.blocked_items()
 
     def setup_ui(self):
         self.setWindowTitle("Activity Monitor")
@@ -209,10 +288,11 @@ class MainUI(QMainWindow):
         text_layout.setContentsMargins(0, 0, 0, 0)
         text_layout.setSpacing(2)
         
-        username = QLabel("Aryan Bharuka")
+        profile = profiles.current_profile()
+        username = QLabel(profile.user)
         username.setStyleSheet("font-size: 14px; font-weight: 500; color: white;")
         
-        email = QLabel("aryan.bharuka20@gmail.com")
+        email = QLabel(profile.host)
         email.setStyleSheet("font-size: 12px; color: #888;")
         
         text_layout.addWidget(username)
@@ -266,12 +346,13 @@ class MainUI(QMainWindow):
         stats_layout.addWidget(self.activities_card, 0, 1)
         stats_layout.addWidget(self.blocked_card, 0, 2)
 
-        # Charts
-        self.timeline_chart = QChartView()
-        self.timeline_chart.setMinimumHeight(300)
+        # Charts (the QChartView is created on the first update_charts call)
+        self.timeline_chart = None
+        self.timeline_container = QVBoxLayout()
+        self.timeline_container.setContentsMargins(0, 0, 0, 0)
 
         layout.addLayout(stats_layout)
-        layout.addWidget(self.timeline_chart)
+        layout.addLayout(self.timeline_container, 1)
         self.stack.addWidget(home_page)
 
     def setup_history_page(self):
@@ -299,16 +380,23 @@ class MainUI(QMainWindow):
         filter_layout.addWidget(self.unsafe_filter)
         filter_layout.addStretch()
 
-        # Scroll Area
-        self.history_scroll_area = QScrollArea()
-        self.history_scroll_area.setWidgetResizable(True)
-        self.history_scroll_content = QWidget()
-        self.history_scroll_layout = QVBoxLayout(self.history_scroll_content)
-        self.history_scroll_layout.setSpacing(15)
-        self.history_scroll_area.setWidget(self.history_scroll_content)
+        # Virtualized history list; rows are paged in as the view scrolls
+        self.history_model = HistoryTableModel(parent=self)
+        self.history_view = QTableView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setWordWrap(True)
+        self.history_view.setShowGrid(False)
+        self.history_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.history_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.history_view.verticalHeader().setVisible(False)
+        self.history_view.verticalHeader().setDefaultSectionSize(60)
+        header = self.history_view.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
 
         layout.addWidget(filter_bar)
-        layout.addWidget(self.history_scroll_area)
+        layout.addWidget(self.history_view)
         self.stack.addWidget(self.history_page)
 
     def setup_blocked_page(self):
@@ -417,23 +505,21 @@ class MainUI(QMainWindow):
         return card
 
     def update_charts(self):
+        from PyQt6.QtCharts import QChart, QChartView, QLineSeries, QDateTimeAxis, QValueAxis
+        from scoring.windows import DEFAULT_WINDOW_SECONDS
+
+        if self.timeline_chart is None:
+            self.timeline_chart = QChartView()
+            self.timeline_chart.setMinimumHeight(300)
+            self.timeline_container.addWidget(self.timeline_chart)
+
         usage_series = QLineSeries()
         usage_series.setName("CPU Usage")
         pen = QPen(QColor(0, 170, 255))
         pen.setWidth(3)
         usage_series.setPen(pen)
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT Timestamp, cpu_usage
-            FROM Software 
-            WHERE type = 'PC Usage'
-            ORDER BY Timestamp
-        """)
-        
-        for ts, cpu_usage in cursor.fetchall():
+        for ts, cpu_usage in storage.cpu_usage_series():
             try:
                 timestamp_dt = datetime.fromisoformat(ts)
             except Exception as e:
@@ -441,12 +527,13 @@ class MainUI(QMainWindow):
             timestamp_ms = timestamp_dt.timestamp() * 1000
             usage_series.append(timestamp_ms, cpu_usage)
         
-        conn.close()
-        
         total_duration = time.time() - self.start_time
         hours = int(total_duration // 3600)
         minutes = int((total_duration % 3600) // 60)
         self.screen_time_card.layout().itemAt(1).widget().setText(f"{hours}h {minutes}m")
+        windows, flagged = storage.window_counts(DEFAULT_WINDOW_SECONDS,
+                                                 storage.epoch_ms(datetime.now() - timedelta(days=1)))
+        self.activities_card.layout().itemAt(1).widget().setText(f"{windows} ({flagged} flagged)")
         
         timeline_chart = QChart()
         timeline_chart.addSeries(usage_series)
@@ -495,65 +582,19 @@ class MainUI(QMainWindow):
     def load_blocked_items(self):
         if hasattr(self, 'blocked_list'):
             self.blocked_list.clear()
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM blocked_items")
-            self.blocked_list.addItems([row[0] for row in cursor.fetchall()])
-            conn.close()
+            self.blocked_list.addItems(storage.blocked_items())
             self.blocked_card.layout().itemAt(1).widget().setText(str(self.blocked_list.count()))
     
     def load_history_data(self, filter_type=None):
-        while self.history_scroll_layout.count():
-            child = self.history_scroll_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        conn = sqlite3.connect(OUTPUT_PATH)
-        cursor = conn.cursor()
-        
-        query = "SELECT description, model_output, timestamp FROM output_summary"
-        if filter_type == "safe":
-            query += " WHERE model_output = 'True'"
-        elif filter_type == "unsafe":
-            query += " WHERE model_output = 'False'"
-            
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        for description, model_output, timestamp in rows:
-            widget = QWidget()
-            widget.setMaximumHeight(150)
-            widget.setMaximumWidth(750)
-            widget_layout = QVBoxLayout(widget)
-            widget_layout.setContentsMargins(15, 5, 15, 5)
-            widget_layout.setSpacing(2)
-
-            widget.setStyleSheet(f"""
-                QWidget {{
-                    border-radius: 12px;
-                    padding: 10px;
-                    background-color: {'#2e7d32' if model_output.lower() == 'true' else '#d32f2f'};
-                    color: white;
-                }}
-            """)
-
-            description_label = QLabel(description)
-            description_label.setStyleSheet("font-weight: bold; font-size: 16px;")
-            description_label.setWordWrap(True)
-            widget_layout.addWidget(description_label)
-
-            timestamp_label = QLabel(timestamp)
-            timestamp_label.setStyleSheet("font-size: 12px; color: #cccccc;")
-            timestamp_label.setWordWrap(True)
-            widget_layout.addWidget(timestamp_label)
-
-            status_text = "SAFE" if model_output.lower() == "true" else "UNSAFE"
-            status_label = QLabel(status_text)
-            status_label.setStyleSheet("font-size: 14px; font-weight: bold;")
-            status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            widget_layout.addWidget(status_label)
-
-            self.history_scroll_layout.addWidget(widget)
+        self.history_model.set_filter(filter_type)
+
+    def active_history_filter(self):
+        """The History filter the Safe/Unsafe toggles show: "safe", "unsafe" or None."""
+        if self.safe_filter.isChecked():
+            return "safe"
+        if self.unsafe_filter.isChecked():
+            return "unsafe"
+        return None
 
     def apply_history_filter(self, filter_type):
         self.safe_filter.setChecked(filter_type == "safe")
@@ -586,11 +627,15 @@ class MainUI(QMainWindow):
             if not self.verify_authenticator():
                 QMessageBox.warning(self, "Access Denied", "Invalid OTP!")
                 return
-            self.load_history_data()
+            # Reload with the filter the Safe/Unsafe toggles still show
+            self.load_history_data(self.active_history_filter())
         
         self.stack.setCurrentIndex(list(self.nav_buttons.keys()).index(page_name))
 
     def setup_monitoring(self):
+        import activity_monitor
+        from file_monitor import FileMonitorThread
+
         self.monitor_thread = activity_monitor.ActivityMonitor()
         self.monitor_thread.log_signal.connect(self.update_notifications)
         self.monitor_thread.start()
@@ -610,6 +655,8 @@ class MainUI(QMainWindow):
             with open(key_path, "r") as f:
                 return f.read().strip()
 
+        import qrcode
+
         new_key = pyotp.random_base32()
         totp_uri = pyotp.TOTP(new_key).provisioning_uri(name="ActivityMonitor", issuer_name="SecureApp")
         
@@ -634,9 +681,7 @@ class MainUI(QMainWindow):
             QMessageBox.warning(self, "Invalid OTP", "Please try again")
 
     def verify_authenticator(self):
-        detector = model.IntrusionDetector()
-        model_result = bool(detector.run_inference())
-        print(model_result)
+        model_result = bool(self.get_detector().run_inference())
         if(model_result):
             return True
         totp = pyotp.TOTP(self.auth_key)
@@ -646,30 +691,27 @@ class MainUI(QMainWindow):
     def browse_and_lock(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select File to Lock")
         if path and self.verify_authenticator():
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO blocked_items (name) VALUES (?)", (path,))
-            conn.commit()
-            conn.close()
+            storage.add_blocked_item(path)
             self.update_notifications(f"File locked: {path}")
             self.file_monitor_thread.monitor.restrict_access(path)
 
     def remove_blocked_item(self, item):
         if self.verify_authenticator():
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM blocked_items WHERE name = ?", (item.text(),))
-            conn.commit()
-            conn.close()
+            storage.remove_blocked_item(item.text())
             self.update_notifications(f"File unlocked: {item.text()}")
             self.file_monitor_thread.monitor.allow_access(item.text())
 
     def closeEvent(self, event):
-        self.monitor_thread.stop()
-        self.file_monitor_thread.stop()
+        if self.monitor_thread is not None:
+            self.monitor_thread.stop()
+        if self.file_monitor_thread is not None:
+            self.file_monitor_thread.stop()
         event.accept()
         
 if __name__ == "__main__":
+    import metrics
+    metrics.configure_logging()
+    metrics.start_exporters()
     app = QApplication(sys.argv)
     window = MainUI()
     window.show()
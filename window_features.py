@@ -0,0 +1,325 @@
+"""
+Materialized multi-scale feature windows.
+
+Training and the dashboards used to rebuild every window's feature vector
+from raw events each time they needed it. fill() turns each closed window of
+soft_activity.sqlite into its EXTENDED_FEATURE_NAMES vector and model score once and
+stores it in the window_features table of output.sqlite, keyed by window
+length and start. Windows of each length in WINDOW_SCALES (5s / 30s / 5min
+by default) are aligned to multiples of that length on the epoch_ms clock,
+so the live fill and a backfill of soft_training.sqlite agree on keys.
+
+Only the finest windows are computed from events, with one query per event
+type for the whole range (bucketed by epoch_ms in Python). Every coarser
+window is merged from the WindowAggregates of the next finer scale. Each
+scale is scored by its own model (profiles.model_path(scale=...)); scales
+without a trained model are stored unscored; a model reads the leading
+columns it was trained on. Live windows are also fed to drift_monitoring.
+
+The extra families are scored against a FeatureContext (digraph profile,
+mined patterns, Markov chains): the activity monitor shares its live one
+through use_context(), other processes load the profile's saved references.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import drift_monitoring
+import metrics
+import profiles
+import sequence_mining
+import storage
+from scoring import (
+    EXTENDED_FEATURE_NAMES, USER_EVENT_TYPES, WINDOW_SCALES, DigraphProfile, FeatureContext, MarkovChain,
+    WindowAggregate, decision_scores, digraph_profile_filename, markov_filename, merge_all
+)
+from scoring.windows import DEFAULT_WINDOW_SECONDS, check_scales, model_scale
+
+logger = logging.getLogger(__name__)
+
+CLOSE_GRACE_MS = 2000  # events are stored a little after they happen; wait before closing a window
+
+# Event types and columns WindowAggregate.from_events takes, in its argument order
+SOURCES = {
+    "Keyboard": ["key", "key_interval", "timestamp", "press_ns", "event_ns"],
+    "Click": ["click_type", "click_interval", "position", "timestamp"],
+    "App in Focus": [storage.FOCUS_APP_COLUMN, "duration", "timestamp"],
+    "Mouse Move": ["position", "press_ns", "event_ns"],
+    "PC Usage": ["cpu_usage", "memory_usage", "process_cpu", "io_bytes", "spawned", "duration"],
+}
+
+# _fetch() key of the (type,) rows of USER_EVENT_TYPES, which the Markov features score
+TYPE_SEQUENCE = "types"
+
+WIDTH = len(EXTENDED_FEATURE_NAMES)
+
+FILL_SECONDS = metrics.histogram("sbm_window_fill_seconds", "One incremental window_features fill")
+WINDOWS_STORED = metrics.counter("sbm_windows_stored_total", "Feature windows written to window_features")
+
+
+def window_start(ms, seconds):
+    """Start (epoch ms) of the `seconds`-long window containing ms."""
+    return ms - ms % (seconds * 1000)
+
+
+def _fetch(start_ms, end_ms, path):
+    """
+    {event type: rows of its SOURCES columns followed by epoch_ms} in
+    [start_ms, end_ms), and under TYPE_SEQUENCE (type, epoch_ms) of every
+    USER_EVENT_TYPES event in order.
+    """
+    rows = {event_type: storage.fetch_events_ms(event_type, columns + ["epoch_ms"], start_ms, end_ms, path)
+            for event_type, columns in SOURCES.items()}
+    rows[TYPE_SEQUENCE] = storage.fetch_event_types_ms(USER_EVENT_TYPES, start_ms, end_ms, path)
+    return rows
+
+
+def _window(rows):
+    """WindowAggregate of one window's _fetch() rows, epoch_ms dropped."""
+    return WindowAggregate.from_events(*(rows.get(event_type, []) for event_type in SOURCES),
+                                       event_types=[row[0] for row in rows.get(TYPE_SEQUENCE, [])])
+
+
+def aggregate(start_ms, end_ms, seconds, path=storage.ACTIVITY_DB_PATH):
+    """{window start: WindowAggregate} of the `seconds`-long windows in [start_ms, end_ms) that have events."""
+    buckets = {}
+    for event_type, rows in _fetch(start_ms, end_ms, path).items():
+        for row in rows:
+            buckets.setdefault(window_start(row[-1], seconds), {}).setdefault(event_type, []).append(row[:-1])
+    return {start: _window(events) for start, events in buckets.items()}
+
+
+def window_aggregate(start_ms, end_ms, path=storage.ACTIVITY_DB_PATH):
+    """WindowAggregate of all events in [start_ms, end_ms) as one window, e.g. the last 30 seconds."""
+    return _window({key: [row[:-1] for row in rows] for key, rows in _fetch(start_ms, end_ms, path).items()})
+
+
+_context = None  # FeatureContext windows are scored against; see context()
+
+
+def use_context(context):
+    """Score the extra families against `context` (the activity monitor's live references)."""
+    global _context
+    _context = context
+
+
+def load_context(profile=None):
+    """FeatureContext of the references saved for a profile (default the current one)."""
+    own = profiles.own_model_path(profile)
+    digraphs = digraph_profile_filename(own)
+    chains = [MarkovChain.load(path) if os.path.exists(path) else None
+              for path in (markov_filename(own, "events"), markov_filename(own, "apps"))]
+    return FeatureContext(digraphs=DigraphProfile.load(digraphs) if os.path.exists(digraphs) else None,
+                          patterns=sequence_mining.load(profile), app_ids=storage.app_ids,
+                          event_chain=chains[0], app_chain=chains[1])
+
+
+def context():
+    """The FeatureContext set by use_context(), else the current profile's saved references."""
+    global _context
+    if _context is None:
+        _context = load_context()
+    return _context
+
+
+def _model(scale):
+    try:
+        return profiles.models.get(scale=model_scale(scale))
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Storing {scale}s windows unscored: {e}")
+        return None
+
+
+class WindowPyramid:
+    """
+    Builds the windows of every scale from the finest one up.
+
+    advance(end_ms) aggregates finest-scale windows from events up to end_ms,
+    then closes every window of every scale that ends by end_ms, merging it
+    from the aggregates of the next finer scale. Aggregates are kept only
+    until the next coarser scale has used them.
+    """
+
+    def __init__(self, scales=WINDOW_SCALES):
+        self.scales = tuple(sorted(scales))
+        check_scales(self.scales)
+        self.aggregates = {scale: {} for scale in self.scales}  # scale -> {start_ms: WindowAggregate}
+        self.next_start = {}  # scale -> start of the next window to close
+        self.store_from = {}  # scale -> windows before this start are only merged, not stored
+        self.cursor = None    # start of the next finest window to read from events
+
+    def start(self, first_ms, resume=False):
+        """Begin at the windows containing first_ms (or after the stored ones, when resuming)."""
+        coarser = None
+        for scale in reversed(self.scales):
+            begin = window_start(first_ms, scale)
+            last = storage.last_window_start(scale) if resume else None
+            self.store_from[scale] = max(begin, last + scale * 1000) if last is not None else begin
+            # Finer windows are rebuilt from where the next coarser scale resumes
+            self.next_start[scale] = self.store_from[scale]
+            if coarser is not None:
+                self.next_start[scale] = min(self.next_start[scale], self.next_start[coarser])
+            coarser = scale
+        self.cursor = self.next_start[self.scales[0]]
+
+    def advance(self, end_ms, path=storage.ACTIVITY_DB_PATH):
+        """
+        Close windows ending by end_ms and return {scale: [(start_ms,
+        WindowAggregate)]} of the newly closed windows that should be stored.
+        """
+        base = self.scales[0]
+        base_end = window_start(end_ms, base)
+        if self.cursor < base_end:
+            self.aggregates[base].update(aggregate(self.cursor, base_end, base, path))
+            self.cursor = base_end
+
+        closed = {}
+        finer = None
+        for scale in self.scales:
+            length = scale * 1000
+            windows = []
+            while self.next_start[scale] + length <= base_end:
+                start = self.next_start[scale]
+                if finer is None:
+                    agg = self.aggregates[scale].get(start) or WindowAggregate()
+                else:
+                    parts = self.aggregates[finer]
+                    agg = merge_all(parts.get(s) or WindowAggregate() for s in range(start, start + length, finer * 1000))
+                    self.aggregates[scale][start] = agg
+                if start >= self.store_from[scale]:
+                    windows.append((start, agg))
+                self.next_start[scale] = start + length
+            if finer is not None:
+                # The finer scale's aggregates are merged up to here
+                self._trim(finer, self.next_start[scale])
+            closed[scale] = windows
+            finer = scale
+        self._trim(self.scales[-1], self.next_start[self.scales[-1]])
+        return closed
+
+    def _trim(self, scale, before_ms):
+        aggregates = self.aggregates[scale]
+        for start in [start for start in aggregates if start < before_ms]:
+            del aggregates[start]
+
+
+def _store(closed, live=False):
+    count = 0
+    rows = []
+    for scale, windows in closed.items():
+        if not windows:
+            continue
+        features = [agg.extended_features(scale, context()) for _, agg in windows]
+        clf = _model(scale)
+        scores = decision_scores(clf, features).tolist() if clf is not None else [None] * len(windows)
+        if live:
+            drift_monitoring.observe(scale, features, scores)
+        rows.extend(
+            (scale, start, (storage.EPOCH + timedelta(milliseconds=start)).strftime(storage.TIMESTAMP_FORMAT),
+             np.asarray(vector, dtype=np.float64).tobytes(), score, agg.events)
+            for (start, agg), vector, score in zip(windows, features, scores)
+        )
+        count += len(windows)
+    if rows:
+        storage.insert_windows(rows, replace=live)
+        WINDOWS_STORED.inc(count)
+    return count
+
+
+# The activity monitor's pyramid; created on the first fill()
+_live = None
+_purged = False
+
+
+def _purge_stale():
+    """
+    Once per process, delete windows stored with another vector width (from
+    before a feature family was added); models trained on the current vector
+    cannot score them.
+    """
+    global _purged
+    if not _purged:
+        removed = storage.delete_windows_except_size(WIDTH * 8)
+        if removed:
+            logger.info(f"Deleted {removed} windows stored with an older feature vector")
+        _purged = True
+
+
+def fill(now=None, path=storage.ACTIVITY_DB_PATH):
+    """
+    Store every window of every scale that has closed since the last fill.
+    Returns the number of windows written.
+    """
+    global _live
+    with FILL_SECONDS.time():
+        _purge_stale()
+        if _live is None:
+            first_ms, _ = storage.epoch_range(path)
+            if first_ms is None:
+                return 0
+            _live = WindowPyramid()
+            _live.start(first_ms, resume=True)
+        return _store(_live.advance(storage.epoch_ms(now or datetime.now()) - CLOSE_GRACE_MS, path), live=True)
+
+
+def backfill(path=storage.TRAINING_DB_PATH, scales=WINDOW_SCALES):
+    """
+    Store every closed window of `path`, at every scale, from the window
+    holding its first event to the last one that ends by its last event.
+    The partial window after that is left to the live fill. Returns the
+    number computed.
+    """
+    _purge_stale()
+    first_ms, last_ms = storage.epoch_range(path)
+    if first_ms is None:
+        return 0
+    pyramid = WindowPyramid(scales)
+    pyramid.start(first_ms)
+    return _store(pyramid.advance(last_ms + 1, path))
+
+
+def load(scale=DEFAULT_WINDOW_SECONDS, start=None, end=None):
+    """
+    Stored windows of one scale starting in [start, end) (datetimes, optional)
+    as (start_ms int64 array, features matrix, scores with NaN for unscored).
+    """
+    _purge_stale()
+    rows = storage.fetch_windows(scale, storage.epoch_ms(start) if start else None,
+                                 storage.epoch_ms(end) if end else None)
+    starts = np.array([row[0] for row in rows], dtype=np.int64)
+    features = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float64).reshape(-1, WIDTH)
+    scores = np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=np.float64)
+    return starts, features, scores
+
+
+def load_stacked(scales=WINDOW_SCALES, start=None, end=None):
+    """
+    One row per window of the finest scale, its features followed by those of
+    the enclosing window of each coarser scale (zeros where that window is not
+    stored). Returns (start_ms array, stacked matrix).
+    """
+    starts, stacked, _ = load(scales[0], start, end)
+    blocks = [stacked]
+    for scale in scales[1:]:
+        coarse_starts, coarse, _ = load(scale, start - timedelta(seconds=scale) if start else None, end)
+        block = np.zeros((len(starts), WIDTH))
+        if len(coarse_starts):
+            index = np.searchsorted(coarse_starts, starts - starts % (scale * 1000))
+            found = (index < len(coarse_starts)) & (coarse_starts[np.minimum(index, len(coarse_starts) - 1)]
+                                                     == starts - starts % (scale * 1000))
+            block[found] = coarse[index[found]]
+        blocks.append(block)
+    return starts, np.hstack(blocks)
+
+
+def rescore(clf, scale=DEFAULT_WINDOW_SECONDS, start=None, end=None):
+    """Re-score a scale's stored windows with a new model (e.g. after retraining)."""
+    starts, features, _ = load(scale, start, end)
+    if len(starts):
+        scores = decision_scores(clf, features)
+        storage.update_window_scores(scale, zip(scores.tolist(), starts.tolist()))
+    return len(starts)